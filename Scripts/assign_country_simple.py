@@ -16,8 +16,10 @@ def assign_country_parameters(input_file, output_file):
     # Read the hexagon file
     hexagons = gpd.read_file(input_file)
     
-    # Since we're working with Namibia (NA), assign NA to all hexagons
-    hexagons['country'] = 'NA'
+    # Since we're working with Namibia (NA), assign Namibia to all hexagons.
+    # Later scripts look hexagons up in country_parameters.xlsx by this name,
+    # as they do with the country names assign_country.py writes.
+    hexagons['country'] = 'Namibia'
     
     # Add country-specific parameters from country_parameters.xlsx
     country_params_path = "Parameters/NA/country_parameters.xlsx"
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+Times each installed solver backend on the same sample of hexagon plant
+optimizations, and checks that their objectives agree.
+
+"""
+
+import geopandas as gpd
+import pandas as pd
+import numpy as np
+import time
+from optimize_hydrogen_plant import demand_schedule, feasible_transport, optimize_hydrogen_plant,\
+    PlantTemplate, time_segments
+from cf_store import load_profiles
+from solvers import SOLVER_BACKENDS, solver_settings, backend_available
+
+if __name__ == "__main__":
+    transport_excel_path = str(snakemake.input.transport_parameters)
+    country_excel_path = str(snakemake.input.country_parameters)
+    demand_excel_path = str(snakemake.input.demand_parameters)
+    country_parameters = pd.read_excel(country_excel_path,
+                                        index_col='Country')
+    demand_parameters = pd.read_excel(demand_excel_path,
+                                      index_col='Demand center',
+                                      ).squeeze("columns")
+    demand_centers = demand_parameters.index
+    plant_config = snakemake.config["plant_optimization"]
+
+    weather_year = snakemake.wildcards.weather_year
+    end_weather_year = int(snakemake.wildcards.weather_year)+1
+    start_date = f'{weather_year}-01-01'
+    end_date = f'{end_weather_year}-01-01'
+
+    hexagons = gpd.read_file(str(snakemake.input.hexagons))
+    pv_profile, wind_profile = load_profiles(str(snakemake.input.profiles), hexagons)
+    segments = time_segments(pv_profile, wind_profile, plant_config["time_aggregation"])
+
+    # every installed backend with each engine, with the default solver options
+    templates = {}
+    for engine in ['pypsa', 'sparse']:
+        for backend in SOLVER_BACKENDS:
+            if backend_available(backend, engine):
+                templates[(engine, backend)] = PlantTemplate(wind_profile.time, segments,
+                                                             engine = engine,
+                                                             solver = solver_settings(backend))
+            else:
+                print(f'{backend} is not installed for the {engine} engine, skipping')
+
+    records = []
+    for location in demand_centers:
+        # hexagons without a trucking state have no demand schedule, and no plant
+        # to design, as in the plant optimization
+        feasible = feasible_transport(hexagons, location)
+        candidates = pv_profile.hexagon.data[feasible["trucking"].loc[pv_profile.hexagon.data].values]
+        # same sample of hexagons on every run
+        rng = np.random.default_rng(0)
+        sample = rng.choice(candidates,
+                            size=min(plant_config["benchmark_sample"], len(candidates)),
+                            replace=False)
+        for i in sorted(sample):
+            hydrogen_demand_trucking, hydrogen_demand_pipeline =\
+                demand_schedule(demand_parameters.loc[location,'Annual demand [kg/a]'],
+                                start_date,
+                                end_date,
+                                hexagons.loc[i,f'{location} trucking state'],
+                                transport_excel_path)
+            country_series = country_parameters.loc[hexagons.country[i]]
+            for j, hydrogen_demand in [("trucking", hydrogen_demand_trucking),
+                                       ("pipeline", hydrogen_demand_pipeline)]:
+                if not feasible[j][i]:
+                    continue
+                for (engine, backend), template in templates.items():
+                    start = time.time()
+                    lcoh = optimize_hydrogen_plant(wind_profile.sel(hexagon = i),
+                                                   pv_profile.sel(hexagon = i),
+                                                   wind_profile.time,
+                                                   hydrogen_demand,
+                                                   hexagons.loc[i,'theo_turbines'],
+                                                   hexagons.loc[i,'theo_pv'],
+                                                   country_series,
+                                                   template = template)[0]
+                    records.append({'Engine': engine, 'Backend': backend,
+                                    'Demand center': location, 'Hexagon': i, 'Transport': j,
+                                    'LCOH': lcoh, 'Solve time (s)': time.time() - start})
+
+    solves = pd.DataFrame(records)
+    # objectives are compared with the first backend solving each plant
+    reference = solves.groupby(['Demand center', 'Hexagon', 'Transport'])['LCOH'].transform('first')
+    solves['Relative LCOH difference'] = (solves['LCOH'] - reference)/reference
+    benchmark = solves.groupby(['Engine', 'Backend'], sort=False).agg(
+        **{'Solves': ('LCOH', 'size'),
+           'Median solve time (s)': ('Solve time (s)', 'median'),
+           'Total solve time (s)': ('Solve time (s)', 'sum'),
+           'Maximum relative LCOH difference': ('Relative LCOH difference', lambda x: x.abs().max())})
+    benchmark.to_csv(str(snakemake.output))
+    print(benchmark.to_string())
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+Calculates the hourly solar and wind capacity factors of each hexagon from the
+cutout, or takes them from a local file or the synthetic weather generator, and
+saves them to a capacity factor store for the plant optimization.
+
+Every configured solar panel and wind turbine is converted in one pass over the
+cutout, with a store for each (panel, turbine) pair.
+
+"""
+
+import atlite
+import geopandas as gpd
+from cf_store import indicator_matrix, stream_profiles, write_profiles
+from weather_providers import PROVIDERS, file_profiles, synthetic_profiles, weather_hours
+
+if __name__ == "__main__":
+    hexagons = gpd.read_file(str(snakemake.input.hexagons))
+    profile_config = snakemake.config["renewable_profiles"]
+    provider = profile_config["provider"]
+    weather_year = snakemake.wildcards.weather_year
+    end_weather_year = int(snakemake.wildcards.weather_year)+1
+    start_date = f'{weather_year}-01-01'
+    end_date = f'{end_weather_year}-01-01'
+
+    stores = {str(folder): tuple(profile_set)
+              for folder, profile_set in zip(snakemake.output, snakemake.params.profile_sets)}
+
+    if provider == 'cutout':
+        cutout = atlite.Cutout(str(snakemake.input.cutout))
+        # the cutout also has the first day of the next year
+        times = weather_hours(start_date, end_date)
+        matrix = indicator_matrix(cutout, hexagons, profile_config["matrix_cache"])
+        stats = stream_profiles(cutout, hexagons, stores, matrix = matrix,
+                                chunk_hours = profile_config["chunk_hours"],
+                                chunk_hexagons = profile_config["chunk_hexagons"],
+                                processes = snakemake.threads,
+                                time_range = (times[0], times[-1]))
+        # sizes, times and peak memory of each block, for sizing jobs
+        stats.to_csv(str(snakemake.log), index=False)
+    else:
+        if provider == 'file':
+            pv_profile, wind_profile = file_profiles(str(snakemake.input.weather), hexagons,
+                                                     start_date, end_date)
+        elif provider == 'synthetic':
+            pv_profile, wind_profile = synthetic_profiles(hexagons, start_date, end_date,
+                                                          seed = profile_config["seed"])
+        else:
+            raise ValueError(f'Unknown capacity factor provider {provider}, choose one of {PROVIDERS}.')
+        # these providers don't depend on the panel and turbine
+        for folder, (panel, turbine) in stores.items():
+            write_profiles(folder, pv_profile, wind_profile, hexagons,
+                           {'provider': provider,
+                            'panel': panel,
+                            'orientation': 'latitude_optimal',
+                            'turbine': turbine})
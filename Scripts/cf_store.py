@@ -0,0 +1,483 @@
+# -*- coding: utf-8 -*-
+"""
+On-disk store of per-hexagon hourly capacity factors.
+
+Solar and wind per-unit profiles are calculated from the cutout once per
+country, weather year, panel and turbine, and saved as float32 arrays with one
+contiguous row per hexagon. Downstream scripts memory-map the arrays, so
+selecting a hexagon only reads its own row from disk.
+
+Store layout (one folder per store):
+    pv.npy, wind.npy   float32 arrays of shape (hexagons, timestamps)
+    time.npy           datetime64[ns] timestamps
+    hexagon.npy        hexagon index
+    attributes.json    panel, orientation, turbine and a hash of the hexagon geometries
+
+The sparse matrix of how much of each cutout grid cell overlaps each hexagon
+is also saved, keyed by the hexagon geometries and the cutout grid, so it is
+calculated once and reused for both technologies and every weather year on the
+same grid.
+
+"""
+
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import pandas as pd
+import xarray as xr
+from scipy import sparse
+from solve_cache import hash_inputs
+
+PROFILES = ['pv', 'wind']
+# hexagons converted and written at a time, to limit memory use
+BLOCK_SIZE = 1000
+
+def geometry_hash(hexagons):
+    '''
+    calculates a hash of the hexagon geometries, to check that a store
+    belongs to the hexagons it is used with.
+    '''
+    # rounded bounds, so geometries that went through a GeoJSON file still match
+    return hash_inputs(np.round(np.array([geometry.bounds for geometry in hexagons.geometry]), 6))
+
+def indicator_matrix(cutout, hexagons, folder):
+    '''
+    returns the sparse matrix of the share of each cutout grid cell that lies
+    in each hexagon, loading it from the matrix cache if it was calculated
+    before for the same hexagons and grid.
+
+    Parameters
+    ----------
+    cutout : atlite Cutout
+        weather data covering the hexagons.
+    hexagons : geopandas GeoDataFrame
+        hexagons to aggregate the grid cells to.
+    folder : string
+        folder of the matrix cache, created if it doesn't exist.
+
+    Returns
+    -------
+    matrix : scipy sparse csr_matrix
+        matrix with a row for each hexagon and a column for each grid cell.
+    '''
+    key = hash_inputs(geometry_hash(hexagons),
+                      np.round(cutout.coords['x'].values, 6),
+                      np.round(cutout.coords['y'].values, 6),
+                      str(cutout.crs))
+    path = os.path.join(folder, f'indicator_matrix_{key[:16]}.npz')
+    if os.path.exists(path):
+        return sparse.load_npz(path).tocsr()
+    matrix = sparse.csr_matrix(cutout.indicatormatrix(hexagons))
+    if not os.path.exists(folder):
+        os.makedirs(folder)
+    # written under another name and moved, so jobs running at the same time never read half a file
+    temporary_path = path.replace('.npz', f'_{os.getpid()}.npz')
+    sparse.save_npz(temporary_path, matrix)
+    os.replace(temporary_path, path)
+    return matrix
+
+def renewable_profiles(cutout, hexagons, panel = 'CSi', orientation = 'latitude_optimal',
+                       turbine = 'NREL_ReferenceTurbine_2020ATB_4MW', matrix = None):
+    '''
+    calculates the hourly per-unit solar and wind potential of each hexagon.
+
+    Parameters
+    ----------
+    cutout : atlite Cutout
+        weather data covering the hexagons.
+    hexagons : geopandas GeoDataFrame
+        hexagons to calculate potential for.
+    panel : string
+        atlite solar panel type. Default 'CSi'.
+    orientation : string
+        atlite solar panel orientation. Default 'latitude_optimal'.
+    turbine : string
+        atlite wind turbine type. Default 'NREL_ReferenceTurbine_2020ATB_4MW'.
+    matrix : scipy sparse matrix
+        share of each grid cell in each hexagon, from indicator_matrix. Default
+        is None, which has atlite calculate it from the hexagon shapes for
+        each technology.
+
+    Returns
+    -------
+    pv_profile : xarray DataArray
+        per-unit solar potential with dimensions hexagon and time.
+    wind_profile : xarray DataArray
+        per-unit wind potential with dimensions hexagon and time.
+    '''
+    layout = cutout.uniform_layout()
+    # can add hydro and other generators here
+    pv_profile = convert_pv(cutout, hexagons, panel, orientation, layout, matrix)
+    wind_profile = convert_wind(cutout, hexagons, turbine, layout, matrix)
+    return pv_profile, wind_profile
+
+def aggregation(hexagons, matrix):
+    '''
+    returns the atlite arguments that aggregate grid cells to hexagons, with
+    the cached matrix if there is one.
+    '''
+    if matrix is None:
+        return dict(shapes = hexagons)
+    return dict(matrix = matrix, index = hexagons.index)
+
+def convert_pv(cutout, hexagons, panel, orientation, layout, matrix = None):
+    '''
+    calculates the per-unit solar potential of each hexagon, with dimensions
+    hexagon and time.
+    '''
+    pv_profile = cutout.pv(
+        panel= panel,
+        orientation=orientation,
+        layout = layout,
+        per_unit = True,
+        **aggregation(hexagons, matrix)
+        )
+    return pv_profile.rename(dict(dim_0='hexagon')).transpose('hexagon', 'time')
+
+def convert_wind(cutout, hexagons, turbine, layout, matrix = None):
+    '''
+    calculates the per-unit wind potential of each hexagon, with dimensions
+    hexagon and time.
+    '''
+    wind_profile = cutout.wind(
+        turbine = turbine,
+        layout = layout,
+        per_unit = True,
+        **aggregation(hexagons, matrix)
+        )
+    return wind_profile.rename(dict(dim_0='hexagon')).transpose('hexagon', 'time')
+
+def create_store(folder, hexagons, hexagon_index, times, attributes):
+    '''
+    creates an empty store and returns its solar and wind arrays, memory-mapped
+    for writing.
+
+    Parameters
+    ----------
+    folder : string
+        folder of the store, created if it doesn't exist.
+    hexagons : geopandas GeoDataFrame
+        hexagons the profiles are calculated for.
+    hexagon_index : array
+        hexagon index of the rows of the store.
+    times : array
+        timestamps of the columns of the store.
+    attributes : dictionary
+        settings the profiles are calculated with, e.g. panel and turbine.
+
+    Returns
+    -------
+    arrays : dictionary
+        float32 array of shape (hexagons, timestamps) of each profile, by name.
+    '''
+    if not os.path.exists(folder):
+        os.makedirs(folder)
+    np.save(os.path.join(folder, 'time.npy'), np.asarray(times).astype('datetime64[ns]'))
+    np.save(os.path.join(folder, 'hexagon.npy'), np.asarray(hexagon_index))
+    attributes = dict(attributes, geometry_hash = geometry_hash(hexagons))
+    with open(os.path.join(folder, 'attributes.json'), 'w') as file:
+        json.dump(attributes, file, indent=4)
+    return {name: np.lib.format.open_memmap(os.path.join(folder, f'{name}.npy'), mode='w+',
+                                            dtype=np.float32, shape=(len(hexagon_index), len(times)))
+            for name in PROFILES}
+
+def write_profiles(folder, pv_profile, wind_profile, hexagons, attributes):
+    '''
+    saves solar and wind profiles to a store.
+
+    Parameters
+    ----------
+    folder : string
+        folder of the store, created if it doesn't exist.
+    pv_profile : xarray DataArray
+        per-unit solar potential with dimensions hexagon and time.
+    wind_profile : xarray DataArray
+        per-unit wind potential with dimensions hexagon and time.
+    hexagons : geopandas GeoDataFrame
+        hexagons the profiles were calculated for.
+    attributes : dictionary
+        settings the profiles were calculated with, e.g. panel and turbine.
+    '''
+    arrays = create_store(folder, hexagons, pv_profile.hexagon.values, pv_profile.time.values, attributes)
+    for name, profile in zip(PROFILES, [pv_profile, wind_profile]):
+        profile = profile.transpose('hexagon', 'time')
+        for start in range(0, profile.shape[0], BLOCK_SIZE):
+            arrays[name][start:start+BLOCK_SIZE] = profile.isel(hexagon=slice(start, start+BLOCK_SIZE)).values
+        arrays[name].flush()
+    del arrays
+
+# cutouts opened by this process, by path
+_open_cutouts = {}
+
+def peak_memory():
+    '''
+    returns the peak resident memory of this process in MB, or None where the
+    operating system doesn't report it.
+    '''
+    try:
+        import resource
+    except ImportError:
+        return None
+    # kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/1024
+
+def convert_block(cutout, hexagons, matrix, rows, hours, stores, orientation, time_range = None):
+    '''
+    converts the weather data of a block of hexagons and hours for every panel
+    and turbine, and writes the profiles into the stores.
+
+    Only the grid cells that overlap the hexagons and the hours of the block
+    are read, so memory use is bounded by the size of the block.
+
+    Parameters
+    ----------
+    cutout : atlite Cutout or string
+        weather data covering the hexagons, or the path of the cutout to open
+        in this process.
+    hexagons : geopandas GeoDataFrame
+        hexagons of the block.
+    matrix : scipy sparse csr_matrix
+        rows of the indicator matrix for the hexagons of the block.
+    rows : tuple
+        first and last (excluded) store row of the block.
+    hours : tuple
+        first and last (excluded) timestamp of the block.
+    stores : dictionary
+        (panel, turbine) of each store, by store folder.
+    orientation : string
+        atlite solar panel orientation.
+    time_range : tuple
+        first and last timestamp of the cutout to convert, which hours count
+        from. Default None, which uses every timestamp of the cutout.
+
+    Returns
+    -------
+    stats : dictionary
+        size, weather data read, time taken and peak memory of the process.
+    '''
+    start_time = time.time()
+    if isinstance(cutout, str):
+        if cutout not in _open_cutouts:
+            # only processes converting weather data need atlite
+            import atlite
+            _open_cutouts[cutout] = atlite.Cutout(cutout)
+        cutout = _open_cutouts[cutout]
+    if time_range is not None:
+        cutout = cutout.sel(time=slice(*time_range))
+    x = cutout.data.x.values
+    y = cutout.data.y.values
+    times = cutout.data.time.values
+
+    # smallest box of grid cells covering the hexagons, grid cells are numbered row by row from y
+    columns = np.unique(matrix.indices)
+    # hexagons outside the cutout have no per-unit potential, as with atlite
+    missing = np.full((rows[1]-rows[0], hours[1]-hours[0]), np.nan, dtype=np.float32)
+    size = 0
+    pv_profiles = {}
+    wind_profiles = {}
+    if len(columns) > 0:
+        y_cells, x_cells = np.divmod(columns, len(x))
+        y_range = np.arange(y_cells.min(), y_cells.max()+1)
+        x_range = np.arange(x_cells.min(), x_cells.max()+1)
+        chunk = cutout.sel(x=slice(x[x_range[0]], x[x_range[-1]]),
+                           y=slice(y[y_range[0]], y[y_range[-1]]),
+                           time=slice(times[hours[0]], times[hours[1]-1]))
+        chunk.data.load()
+        size = chunk.data.nbytes
+        matrix = matrix[:, (y_range[:, None]*len(x) + x_range[None, :]).ravel()]
+        layout = chunk.uniform_layout()
+        panels = set(panel for panel, turbine in stores.values())
+        turbines = set(turbine for panel, turbine in stores.values())
+        pv_profiles = {panel: convert_pv(chunk, hexagons, panel, orientation, layout, matrix).values
+                       for panel in panels}
+        wind_profiles = {turbine: convert_wind(chunk, hexagons, turbine, layout, matrix).values
+                         for turbine in turbines}
+
+    # blocks don't overlap, so processes can write to the same stores
+    for folder, (panel, turbine) in stores.items():
+        for name, values in [('pv', pv_profiles.get(panel, missing)),
+                             ('wind', wind_profiles.get(turbine, missing))]:
+            array = np.load(os.path.join(folder, f'{name}.npy'), mmap_mode='r+')
+            array[rows[0]:rows[1], hours[0]:hours[1]] = values
+            array.flush()
+            del array
+    return {'hexagons': rows[1]-rows[0],
+            'hours': hours[1]-hours[0],
+            'weather data (MB)': size/1e6,
+            'time (s)': time.time() - start_time,
+            'peak memory (MB)': peak_memory()}
+
+def stream_profiles(cutout, hexagons, stores, orientation = 'latitude_optimal',
+                    matrix = None, chunk_hours = 744, chunk_hexagons = None, processes = 1,
+                    time_range = None):
+    '''
+    calculates the profiles of several solar panels and wind turbines in one
+    pass over the cutout, and saves them to their stores.
+
+    The cutout is converted in blocks of hours and, optionally, hexagons. Each
+    block of weather data is read once, and every panel and turbine is
+    converted from it before the next block is read. Each panel and turbine is
+    converted once, however many stores use it. Blocks can be converted in
+    parallel processes, with peak memory set by the block size.
+
+    Parameters
+    ----------
+    cutout : atlite Cutout
+        weather data covering the hexagons.
+    hexagons : geopandas GeoDataFrame
+        hexagons to calculate potential for.
+    stores : dictionary
+        (panel, turbine) of each store, by store folder.
+    orientation : string
+        atlite solar panel orientation. Default 'latitude_optimal'.
+    matrix : scipy sparse matrix
+        share of each grid cell in each hexagon, from indicator_matrix. Default
+        is None, which calculates it once here.
+    chunk_hours : integer
+        hours of weather data in a block. Default 744 (31 days).
+    chunk_hexagons : integer
+        hexagons in a block. Default is None, which converts all hexagons
+        together.
+    processes : integer
+        processes converting blocks at the same time. Default 1, which
+        converts them in this process.
+    time_range : tuple
+        first and last timestamp to convert. Default None, which converts
+        every timestamp of the cutout.
+
+    Returns
+    -------
+    stats : pandas DataFrame
+        size, weather data read, time taken and peak memory of each block.
+    '''
+    start_time = time.time()
+    if matrix is None:
+        matrix = sparse.csr_matrix(cutout.indicatormatrix(hexagons))
+    matrix = sparse.csr_matrix(matrix)
+    times = pd.DatetimeIndex(cutout.data.time.values)
+    if time_range is not None:
+        times = times[(times >= time_range[0]) & (times <= time_range[1])]
+    for folder, (panel, turbine) in stores.items():
+        arrays = create_store(folder, hexagons, hexagons.index, times,
+                              {'panel': panel, 'orientation': orientation, 'turbine': turbine})
+        del arrays
+
+    chunk_hexagons = len(hexagons) if chunk_hexagons is None else chunk_hexagons
+    blocks = [((row, min(row + chunk_hexagons, len(hexagons))), (hour, min(hour + chunk_hours, len(times))))
+              for hour in range(0, len(times), chunk_hours)
+              for row in range(0, len(hexagons), chunk_hexagons)]
+    arguments = [(hexagons.iloc[rows[0]:rows[1]], matrix[rows[0]:rows[1]], rows, hours, stores, orientation,
+                  time_range)
+                 for rows, hours in blocks]
+
+    stats = []
+    def report(block_stats):
+        stats.append(block_stats)
+        print(f'converted block {len(stats)} of {len(blocks)} '
+              f'({block_stats["hexagons"]} hexagons, {block_stats["hours"]} hours, '
+              f'{block_stats["weather data (MB)"]:.0f} MB of weather data) '
+              f'in {block_stats["time (s)"]:.1f} s')
+    if processes == 1:
+        for block in arguments:
+            report(convert_block(cutout, *block))
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            # a cutout is opened again from its file in each process, and the time range selected there,
+            # as selecting it here would give a cutout with no file
+            futures = [executor.submit(convert_block, str(cutout.path), *block) for block in arguments]
+            for future in as_completed(futures):
+                report(future.result())
+
+    stats = pd.DataFrame(stats)
+    print(f'converted {len(hexagons)} hexagons and {len(times)} hours for {len(stores)} stores '
+          f'in {time.time() - start_time:.1f} s with {processes} processes, '
+          f'largest block {stats["weather data (MB)"].max():.0f} MB of weather data')
+    if stats['peak memory (MB)'].notna().all():
+        print(f'peak memory {max(stats["peak memory (MB)"].max(), peak_memory()):.0f} MB per process')
+    return stats
+
+def load_profiles(folder, hexagons = None):
+    '''
+    memory-maps the solar and wind profiles of a store.
+
+    Parameters
+    ----------
+    folder : string
+        folder of the store.
+    hexagons : geopandas GeoDataFrame
+        hexagons the profiles will be used with, to check they match those the
+        store was calculated for. Default is None, which skips the check.
+
+    Returns
+    -------
+    pv_profile : xarray DataArray
+        per-unit solar potential with dimensions hexagon and time.
+    wind_profile : xarray DataArray
+        per-unit wind potential with dimensions hexagon and time.
+    '''
+    with open(os.path.join(folder, 'attributes.json')) as file:
+        attributes = json.load(file)
+    if hexagons is not None and geometry_hash(hexagons) != attributes['geometry_hash']:
+        raise ValueError(f'Capacity factors in {folder} were calculated for other hexagons. '
+                         'Rerun the calculate_renewable_profiles rule.')
+    coords = {'hexagon': np.load(os.path.join(folder, 'hexagon.npy')),
+              'time': np.load(os.path.join(folder, 'time.npy'))}
+    # memory-mapped, so only the rows that are used are read from disk
+    return tuple(xr.DataArray(np.load(os.path.join(folder, f'{name}.npy'), mmap_mode='r'),
+                              coords=coords, dims=['hexagon', 'time'], name=name,
+                              attrs=attributes)
+                 for name in PROFILES)
+
+# stores memory-mapped by this process, by folder
+_open_stores = {}
+
+def open_store(folder):
+    '''
+    returns the memory-mapped arrays and timestamps of a store, mapping it on
+    first use in this process.
+    '''
+    if folder not in _open_stores:
+        pv_profile, wind_profile = load_profiles(folder)
+        _open_stores[folder] = {'pv': pv_profile.data,
+                                'wind': wind_profile.data,
+                                'time': pd.DatetimeIndex(pv_profile.time.values)}
+    return _open_stores[folder]
+
+class StoreReference:
+    '''
+    reference to one hexagon's profile, or to the timestamps, in a capacity
+    factor store.
+
+    References are a few bytes to send to worker processes, which read the
+    data from the memory-mapped store themselves. The operating system shares
+    the mapped pages between processes, so each profile is held in memory
+    once however many workers use it.
+
+    Parameters
+    ----------
+    folder : string
+        folder of the store.
+    name : string
+        'pv', 'wind' or 'time'.
+    row : integer
+        row of the hexagon in the store. Not used for 'time'.
+    '''
+    def __init__(self, folder, name, row = None):
+        self.folder = folder
+        self.name = name
+        self.row = row
+
+    def load(self):
+        '''
+        returns the referenced profile without copying it, or the timestamps.
+        '''
+        data = open_store(self.folder)[self.name]
+        return data if self.row is None else data[self.row]
+
+def resolve(args):
+    '''
+    replaces the store references in a tuple of arguments with their data.
+    '''
+    return tuple(arg.load() if isinstance(arg, StoreReference) else arg for arg in args)
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+Checkpoint log of completed hydrogen plant optimizations.
+
+Each result is appended to a JSON lines file as soon as it is known, tagged
+with its work item (demand center, hexagon, transport type) and the input hash
+of its plant LP. A restarted run reuses the logged results whose inputs are
+unchanged and only solves the rest. Counting the lines of the log shows the
+progress of a running job.
+
+"""
+
+import json
+import os
+
+class CheckpointLog:
+    '''
+    append-only log of plant optimization results.
+
+    Parameters
+    ----------
+    path : string
+        path to the log file, created if it doesn't exist.
+    '''
+    def __init__(self, path):
+        folder = os.path.dirname(path)
+        if folder != '' and not os.path.exists(folder):
+            os.makedirs(folder)
+        self.path = path
+        # end a line cut off by a killed run, so new entries start on their own line
+        complete = True
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with open(path, 'rb') as file:
+                file.seek(-1, os.SEEK_END)
+                complete = file.read(1) == b'\n'
+        self.file = open(path, 'a', encoding='utf-8')
+        if not complete:
+            self.file.write('\n')
+
+    def results(self):
+        '''
+        reads the logged results.
+
+        Returns
+        -------
+        results : dictionary
+            (input hash, result) for each (demand center, hexagon, transport
+            type) work item, from its latest entry.
+        '''
+        results = {}
+        self.file.flush()
+        with open(self.path, encoding='utf-8') as file:
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # the last line is incomplete if the run was killed mid-write
+                    continue
+                results[(entry['demand center'], entry['hexagon'], entry['transport'])] =\
+                    (entry['key'], tuple(entry['result']))
+        return results
+
+    def append(self, location, hexagon, transport, key, result):
+        '''
+        logs the result of one work item and flushes it to disk.
+        '''
+        entry = {'demand center': location,
+                 'hexagon': int(hexagon),
+                 'transport': transport,
+                 'key': key,
+                 'result': [float(value) for value in result]}
+        self.file.write(json.dumps(entry) + '\n')
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        self.file.close()
+
+    def remove(self):
+        '''
+        closes and deletes the log, once its results are saved elsewhere.
+        '''
+        self.close()
+        os.remove(self.path)
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""
+Catalogue of the weather cutouts that have already been prepared.
+
+The spatial and temporal extent, grid, module and features of each cutout in
+the cutouts folder are indexed in a JSON file next to them, and only re-read
+from files that changed. When a new cutout is prepared in tiles, tiles that an
+existing cutout covers are read from it instead of being downloaded again, so
+adding a neighbouring country or another weather year only fetches the
+missing data.
+
+"""
+
+import json
+import os
+import numpy as np
+import pandas as pd
+import xarray as xr
+from cutout_tiles import GRID_SPACING, TOLERANCE
+
+def cutout_extent(path):
+    '''
+    reads the extent and features of a cutout file.
+
+    Returns
+    -------
+    entry : dictionary
+        modification time and size of the file, module, 'x', 'y' and 'time'
+        ranges, grid spacing 'dx' and 'dy', and prepared features.
+    '''
+    with xr.open_dataset(path) as data:
+        return {'modified': os.path.getmtime(path),
+                'size': os.path.getsize(path),
+                'module': data.attrs.get('module'),
+                'x': [float(data.x.min()), float(data.x.max())],
+                'y': [float(data.y.min()), float(data.y.max())],
+                'dx': float(np.diff(data.x.values).mean()) if data.x.size > 1 else None,
+                'dy': float(np.diff(data.y.values).mean()) if data.y.size > 1 else None,
+                'time': [str(data.time.values.min()), str(data.time.values.max())],
+                'features': sorted(set(variable.attrs['feature'] for variable in data.data_vars.values()
+                                       if 'feature' in variable.attrs))}
+
+def cutout_catalogue(folder = 'Cutouts', exclude = ()):
+    '''
+    indexes the cutouts in a folder, updating the catalogue file in it.
+
+    Parameters
+    ----------
+    folder : string
+        folder of the cutouts. Default 'Cutouts'.
+    exclude : list of strings
+        cutout paths to leave out, such as the one being prepared.
+
+    Returns
+    -------
+    catalogue : dictionary
+        catalogue entry of each cutout, by path.
+    '''
+    index_path = os.path.join(folder, 'catalogue.json')
+    previous = {}
+    if os.path.exists(index_path):
+        with open(index_path) as file:
+            previous = json.load(file)
+    excluded = [os.path.abspath(path) for path in exclude]
+
+    catalogue = {}
+    if os.path.exists(folder):
+        for name in sorted(os.listdir(folder)):
+            path = os.path.join(folder, name)
+            if not name.endswith('.nc') or os.path.abspath(path) in excluded:
+                continue
+            entry = previous.get(path)
+            if entry is None or entry['modified'] != os.path.getmtime(path)\
+                    or entry['size'] != os.path.getsize(path):
+                try:
+                    entry = cutout_extent(path)
+                except (OSError, ValueError, AttributeError) as error:
+                    print(f'skipping unreadable cutout {path}: {error}')
+                    continue
+            catalogue[path] = entry
+        with open(index_path, 'w') as file:
+            json.dump(catalogue, file, indent=4)
+    return catalogue
+
+def covers(entry, tile, features, module = 'era5'):
+    '''
+    checks whether a catalogued cutout holds all data of a tile.
+    '''
+    if entry['module'] != module or not set(features) <= set(entry['features']):
+        return False
+    # tiles are merged on the ERA5 grid, so the cutout must be on it too
+    for axis, spacing in [('x', 'dx'), ('y', 'dy')]:
+        if entry[spacing] is None or abs(entry[spacing] - GRID_SPACING) > TOLERANCE:
+            return False
+        offset = entry[axis][0]/GRID_SPACING
+        if abs(offset - round(offset)) > TOLERANCE:
+            return False
+        # first and last grid points within the tile
+        start = np.ceil(tile[axis].start/GRID_SPACING - TOLERANCE)*GRID_SPACING
+        stop = np.floor(tile[axis].stop/GRID_SPACING + TOLERANCE)*GRID_SPACING
+        if start < entry[axis][0] - TOLERANCE or stop > entry[axis][1] + TOLERANCE:
+            return False
+    # the tile's days run to the last hour of its last day
+    return pd.Timestamp(entry['time'][0]) <= pd.Timestamp(tile['time'].start)\
+        and pd.Timestamp(entry['time'][1]) >= pd.Timestamp(tile['time'].stop) + pd.Timedelta(hours=23)
+
+def find_source(tile, catalogue, features, module = 'era5'):
+    '''
+    returns the path of a catalogued cutout covering a tile and the features
+    to read from it, or None if no cutout covers it.
+
+    Parameters
+    ----------
+    tile : dictionary
+        tile from cutout_tiles.
+    catalogue : dictionary
+        catalogue from cutout_catalogue.
+    features : list of strings
+        features the tile needs.
+    module : string
+        dataset module of the tile. Default 'era5'.
+    '''
+    for path, entry in catalogue.items():
+        if covers(entry, tile, features, module):
+            return path, list(features)
+    return None
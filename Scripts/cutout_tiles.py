@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+"""
+Tiled preparation of weather cutouts.
+
+The bounding box and time range of a cutout are split into spatial tiles and
+monthly periods. Each tile is prepared on its own, several at a time, and
+logged once it is finished, so a rerun after a failure only prepares the
+missing tiles. Finished tiles are merged into the final cutout.
+
+Preparing a tile is left to a function passed in, such as an ERA5 request
+through atlite, so tiles can also come from a local data source. Tiles that an
+existing cutout already covers are read from it while merging, instead of
+being prepared again.
+
+"""
+
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+# ERA5 grid spacing in degrees, tile edges are placed on grid lines
+GRID_SPACING = 0.25
+# tolerance when comparing coordinates to tile edges
+TOLERANCE = 1e-6
+
+def edges(start, stop, tile_size):
+    '''
+    splits a coordinate range into tiles of at most tile_size degrees with
+    inner edges on grid lines.
+    '''
+    steps = max(1, int(round(tile_size/GRID_SPACING)))
+    first = np.floor(start/GRID_SPACING) + steps
+    inner = [value*GRID_SPACING for value in np.arange(first, stop/GRID_SPACING, steps)]
+    return [start] + inner + [stop]
+
+def cutout_tiles(min_lon, min_lat, max_lon, max_lat, start_date, end_date, tile_size):
+    '''
+    splits a cutout into spatial tiles and monthly periods.
+
+    Parameters
+    ----------
+    min_lon, min_lat, max_lon, max_lat : float
+        bounding box of the cutout.
+    start_date, end_date : string
+        first and last day of the cutout, both included.
+    tile_size : float
+        maximum width and height of a tile in degrees.
+
+    Returns
+    -------
+    tiles : list of dictionaries
+        name, requested 'x', 'y' and 'time' slices, and the 'x_range' and
+        'y_range' of coordinates each tile contributes to the merged cutout.
+        Neighbouring tiles share their edge grid line, which is kept by the
+        tile above or to the right.
+    '''
+    x_edges = edges(min_lon, max_lon, tile_size)
+    y_edges = edges(min_lat, max_lat, tile_size)
+    days = pd.date_range(start_date, end_date, freq='D')
+    periods = [(group.iloc[0].strftime('%Y-%m-%d'), group.iloc[-1].strftime('%Y-%m-%d'))
+               for _, group in pd.Series(days, index=days).groupby(days.to_period('M'))]
+
+    tiles = []
+    for i in range(len(x_edges)-1):
+        for j in range(len(y_edges)-1):
+            for first_day, last_day in periods:
+                tiles.append({'name': f'x{i}_y{j}_{first_day[:7]}',
+                              'x': slice(x_edges[i], x_edges[i+1]),
+                              'y': slice(y_edges[j], y_edges[j+1]),
+                              'time': slice(first_day, last_day),
+                              'x_range': (-np.inf if i == 0 else x_edges[i],
+                                          np.inf if i == len(x_edges)-2 else x_edges[i+1]),
+                              'y_range': (-np.inf if j == 0 else y_edges[j],
+                                          np.inf if j == len(y_edges)-2 else y_edges[j+1])})
+    return tiles
+
+def completed_tiles(folder):
+    '''
+    returns the names of the tiles logged as finished in a tile folder.
+    '''
+    path = os.path.join(folder, 'completed.txt')
+    if not os.path.exists(path):
+        return set()
+    with open(path) as file:
+        return set(line.strip() for line in file if line.endswith('\n'))
+
+def prepare_tiles(tiles, folder, prepare_tile, max_requests = 4):
+    '''
+    prepares the tiles that are not finished yet, several at a time.
+
+    Parameters
+    ----------
+    tiles : list of dictionaries
+        tiles from cutout_tiles. Tiles with a 'source' cutout are skipped.
+    folder : string
+        folder of the tile files and the log of finished tiles, created if it
+        doesn't exist.
+    prepare_tile : function
+        called with a tile and the path of its NetCDF file, and writes the
+        tile's weather data to that file. Each tile is prepared in its own
+        process, as NetCDF files can't be written from several threads, so the
+        function must be picklable.
+    max_requests : integer
+        largest number of tiles prepared at the same time. Default 4.
+    '''
+    if not os.path.exists(folder):
+        os.makedirs(folder)
+    completed = completed_tiles(folder)
+    tiles = [tile for tile in tiles if 'source' not in tile]
+    pending = [tile for tile in tiles if tile['name'] not in completed]
+    print(f'{len(tiles)-len(pending)} of {len(tiles)} cutout tiles already prepared')
+
+    failed = []
+    with open(os.path.join(folder, 'completed.txt'), 'a') as log,\
+            ProcessPoolExecutor(max_workers=max_requests) as executor:
+        futures = {}
+        for tile in pending:
+            path = os.path.join(folder, tile['name'] + '.nc')
+            # left over from a run that stopped while preparing this tile
+            if os.path.exists(path):
+                os.remove(path)
+            futures[executor.submit(prepare_tile, tile, path)] = tile
+        for future in as_completed(futures):
+            tile = futures[future]
+            try:
+                future.result()
+            except Exception as error:
+                print(f'cutout tile {tile["name"]} failed: {error}')
+                failed.append(tile['name'])
+                continue
+            log.write(tile['name'] + '\n')
+            log.flush()
+            os.fsync(log.fileno())
+    if len(failed) > 0:
+        raise RuntimeError(f'{len(failed)} cutout tiles failed ({", ".join(sorted(failed))}). '
+                           'Rerun to prepare only the missing tiles.')
+
+def open_tile(tile, folder):
+    '''
+    lazily opens a tile, from its own file or from the existing cutout that
+    covers it.
+    '''
+    if 'source' not in tile:
+        return xr.open_dataset(os.path.join(folder, tile['name'] + '.nc'), chunks={})
+    source = xr.open_dataset(tile['source'], chunks={})
+    # only the variables a prepared tile would have
+    variables = [name for name, variable in source.data_vars.items()
+                 if variable.attrs.get('feature') in tile['features']]
+    # the grid points a download of the tile would have
+    return source[variables].sel(x=slice(tile['x'].start - TOLERANCE, tile['x'].stop + TOLERANCE),
+                                 y=slice(tile['y'].start - TOLERANCE, tile['y'].stop + TOLERANCE),
+                                 time=tile['time'])
+
+def merge_tiles(tiles, folder, path):
+    '''
+    merges prepared tiles into one cutout file.
+
+    Parameters
+    ----------
+    tiles : list of dictionaries
+        tiles from cutout_tiles, all prepared or with a 'source' cutout.
+    folder : string
+        folder of the tile files.
+    path : string
+        path of the merged cutout.
+    '''
+    spatial_tiles = {}
+    for tile in tiles:
+        spatial_tiles.setdefault((tile['x_range'], tile['y_range']), []).append(tile)
+
+    pieces = []
+    for (x_range, y_range), periods in spatial_tiles.items():
+        # static variables such as height are taken from the first period
+        piece = xr.concat([open_tile(tile, folder)
+                           for tile in sorted(periods, key=lambda tile: tile['time'].start)],
+                          dim='time', data_vars='minimal', coords='minimal', compat='override')
+        piece = piece.sel(x=(piece.x >= x_range[0] - TOLERANCE) & (piece.x < x_range[1] - TOLERANCE),
+                          y=(piece.y >= y_range[0] - TOLERANCE) & (piece.y < y_range[1] - TOLERANCE))
+        pieces.append(piece)
+    cutout = xr.combine_by_coords(pieces, combine_attrs='override')
+    cutout.attrs = pieces[0].attrs
+
+    # written under another name and moved, so a failed merge leaves no cutout behind
+    temporary_path = path + '.part'
+    cutout.to_netcdf(temporary_path)
+    cutout.close()
+    for piece in pieces:
+        piece.close()
+    os.replace(temporary_path, path)
+
+def prepare_tiled_cutout(path, min_lon, min_lat, max_lon, max_lat, start_date, end_date,
+                         prepare_tile, tile_size = 5, max_requests = 4, folder = None,
+                         find_source = None):
+    '''
+    prepares a cutout tile by tile, resuming from the tiles finished by
+    earlier runs, and merges the tiles into the cutout file.
+
+    Parameters
+    ----------
+    path : string
+        path of the cutout file.
+    min_lon, min_lat, max_lon, max_lat : float
+        bounding box of the cutout.
+    start_date, end_date : string
+        first and last day of the cutout, both included.
+    prepare_tile : function
+        called with a tile and the path of its NetCDF file, and writes the
+        tile's weather data to that file.
+    tile_size : float
+        maximum width and height of a tile in degrees. Default 5.
+    max_requests : integer
+        largest number of tiles prepared at the same time. Default 4.
+    folder : string
+        folder of the tile files. Default is a folder named after the cutout in
+        'temp'. It is deleted once the cutout is merged.
+    find_source : function
+        called with a tile, returns the path of an existing cutout covering
+        the tile and the features it provides, or None if the tile has to be
+        prepared. Default is None, which prepares every tile.
+    '''
+    if folder is None:
+        folder = os.path.join('temp', 'tiles_' + os.path.splitext(os.path.basename(path))[0])
+    tiles = cutout_tiles(min_lon, min_lat, max_lon, max_lat, start_date, end_date, tile_size)
+    if find_source is not None:
+        for tile in tiles:
+            source = find_source(tile)
+            if source is not None:
+                tile['source'], tile['features'] = source
+        reused = sum('source' in tile for tile in tiles)
+        print(f'{reused} of {len(tiles)} cutout tiles are read from existing cutouts')
+    prepare_tiles(tiles, folder, prepare_tile, max_requests)
+    merge_tiles(tiles, folder, path)
+    shutil.rmtree(folder)
@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+"""
+Geodesic distances between hexagons and demand centers, and the hexagons that
+demand centers lie in.
+
+Distances are measured from each hexagon's centroid to each demand center on
+the WGS-84 ellipsoid with Karney's algorithm, through pyproj, for all pairs at
+once. This is the same algorithm as geopy's geodesic distance, and the two
+agree to within a micrometre.
+
+With a maximum transport distance, only the hexagons within range of each
+demand center are measured. They are found with a KD-tree of the hexagon
+centroids on the unit sphere, so continental runs with many demand centers
+don't measure every pair. Hexagons out of range get no distance (NaN).
+
+The distance matrix is saved next to the hexagon file it was calculated for,
+keyed by the hexagon centroids, demand center coordinates and maximum
+distances, so the transport stage and later stages reuse it until they change.
+
+"""
+
+import os
+import numpy as np
+import pandas as pd
+from pyproj import Geod
+from scipy.spatial import cKDTree
+from shapely.geometry import Point
+from shapely.strtree import STRtree
+from solve_cache import hash_inputs
+
+# mean radius of the Earth in km, for the KD-tree search on the unit sphere
+EARTH_RADIUS = 6371.0088
+# geodesic distances on the ellipsoid differ from great-circle distances on the
+# mean sphere by less than 0.6%, so the KD-tree search radius is widened by this
+SEARCH_MARGIN = 0.01
+
+def centroid_coordinates(hexagons):
+    '''
+    returns the longitude and latitude of each hexagon's centroid.
+    '''
+    # centroids in degrees, as the transport stage has always used them
+    centroids = [geometry.centroid for geometry in hexagons.geometry]
+    return np.array([point.x for point in centroids]), np.array([point.y for point in centroids])
+
+def geodesic_distances(longitudes, latitudes, demand_longitudes, demand_latitudes):
+    '''
+    calculates the geodesic distance between every site and every demand
+    center.
+
+    Parameters
+    ----------
+    longitudes, latitudes : arrays
+        coordinates of the sites in degrees.
+    demand_longitudes, demand_latitudes : arrays
+        coordinates of the demand centers in degrees.
+
+    Returns
+    -------
+    distances : array
+        distance in km with a row for each site and a column for each demand
+        center.
+    '''
+    longitudes, demand_longitudes = np.broadcast_arrays(np.asarray(longitudes, dtype=float)[:, None],
+                                                        np.asarray(demand_longitudes, dtype=float)[None, :])
+    latitudes, demand_latitudes = np.broadcast_arrays(np.asarray(latitudes, dtype=float)[:, None],
+                                                      np.asarray(demand_latitudes, dtype=float)[None, :])
+    distances = Geod(ellps='WGS84').inv(longitudes.ravel(), latitudes.ravel(),
+                                        demand_longitudes.ravel(), demand_latitudes.ravel())[2]
+    return np.asarray(distances).reshape(longitudes.shape)/1000
+
+def unit_vectors(longitudes, latitudes):
+    '''
+    returns the 3D position of points on the unit sphere.
+    '''
+    longitudes = np.radians(np.asarray(longitudes, dtype=float))
+    latitudes = np.radians(np.asarray(latitudes, dtype=float))
+    return np.column_stack([np.cos(latitudes)*np.cos(longitudes),
+                            np.cos(latitudes)*np.sin(longitudes),
+                            np.sin(latitudes)])
+
+def sites_within(longitudes, latitudes, demand_longitudes, demand_latitudes, max_distances):
+    '''
+    finds the sites within a maximum geodesic distance of each demand center.
+
+    Parameters
+    ----------
+    longitudes, latitudes : arrays
+        coordinates of the sites in degrees.
+    demand_longitudes, demand_latitudes : arrays
+        coordinates of the demand centers in degrees.
+    max_distances : array
+        maximum distance in km from each demand center. Infinite for no limit.
+
+    Returns
+    -------
+    sites : list of arrays
+        positions of the sites within range of each demand center, and their
+        distances in km.
+    '''
+    tree = cKDTree(unit_vectors(longitudes, latitudes))
+    # chord length on the unit sphere of the widened search distance
+    angles = np.minimum(np.asarray(max_distances, dtype=float)*(1 + SEARCH_MARGIN)/EARTH_RADIUS, np.pi)
+    candidates = tree.query_ball_point(unit_vectors(demand_longitudes, demand_latitudes),
+                                       2*np.sin(angles/2) + 1e-12)
+    sites = []
+    for k, positions in enumerate(candidates):
+        positions = np.sort(np.array(positions, dtype=int))
+        distances = geodesic_distances(longitudes[positions], latitudes[positions],
+                                       demand_longitudes[k:k+1], demand_latitudes[k:k+1])[:, 0]
+        within = distances <= max_distances[k]
+        sites.append((positions[within], distances[within]))
+    return sites
+
+def distance_matrix(hexagons, demand_centers, hexagon_path, max_distances = None):
+    '''
+    returns the geodesic distance from each hexagon to each demand center,
+    loading it from next to the hexagon file if it was calculated before for
+    the same hexagons, demand centers and maximum distances.
+
+    Parameters
+    ----------
+    hexagons : geopandas GeoDataFrame
+        hexagons to measure distances from.
+    demand_centers : pandas DataFrame
+        demand centers with 'Lat [deg]' and 'Lon [deg]' columns, indexed by
+        name.
+    hexagon_path : string
+        path of the hexagon file, e.g. 'Resources/hexagons_NA.geojson'. The
+        matrix is saved beside it as 'Resources/hexagons_NA_distances.npz'.
+    max_distances : pandas Series
+        maximum transport distance in km from each demand center, infinite
+        for no limit. Default None, which measures every pair.
+
+    Returns
+    -------
+    distances : pandas DataFrame
+        distance in km with a row for each hexagon and a column for each
+        demand center, NaN for hexagons beyond the maximum distance.
+    '''
+    longitudes, latitudes = centroid_coordinates(hexagons)
+    demand_longitudes = demand_centers['Lon [deg]'].to_numpy(dtype=float)
+    demand_latitudes = demand_centers['Lat [deg]'].to_numpy(dtype=float)
+    limits = np.full(len(demand_centers), np.inf) if max_distances is None\
+        else np.asarray(max_distances, dtype=float)
+    key = hash_inputs(np.round(longitudes, 9), np.round(latitudes, 9),
+                      demand_longitudes, demand_latitudes)
+    if np.isfinite(limits).any():
+        key = hash_inputs(key, limits)
+    path = os.path.splitext(str(hexagon_path))[0] + '_distances.npz'
+
+    distances = None
+    if os.path.exists(path):
+        with np.load(path) as cached:
+            if str(cached['key']) == key:
+                distances = cached['distances']
+    if distances is None:
+        if np.isfinite(limits).any():
+            distances = np.full((len(hexagons), len(demand_centers)), np.nan)
+            for k, (positions, site_distances) in enumerate(sites_within(longitudes, latitudes,
+                                                                         demand_longitudes, demand_latitudes,
+                                                                         limits)):
+                distances[positions, k] = site_distances
+        else:
+            distances = geodesic_distances(longitudes, latitudes, demand_longitudes, demand_latitudes)
+        # written under another name and moved, so jobs running at the same time never read half a file
+        temporary_path = path.replace('.npz', f'_{os.getpid()}.npz')
+        np.savez(temporary_path, key=key, distances=distances)
+        os.replace(temporary_path, path)
+    return pd.DataFrame(distances, index=hexagons.index, columns=demand_centers.index)
+
+def containing_hexagons(hexagons, demand_centers):
+    '''
+    finds the hexagons that each demand center lies in, searching for all
+    demand centers at once instead of testing every hexagon against every
+    demand center.
+
+    With Shapely 2, an STRtree of the hexagons is queried in bulk. Shapely 1.8
+    has no bulk query, so one KD-tree search finds the hexagons whose bounding
+    box could hold each demand center, and only those are tested exactly.
+
+    Parameters
+    ----------
+    hexagons : geopandas GeoDataFrame
+        hexagons to search.
+    demand_centers : pandas DataFrame
+        demand centers with 'Lat [deg]' and 'Lon [deg]' columns, indexed by
+        name.
+
+    Returns
+    -------
+    locations : dictionary
+        positions in hexagons of the hexagons containing each demand center,
+        by demand center name. Demand centers outside all hexagons, or on a
+        hexagon boundary, have none.
+    '''
+    geometries = list(hexagons.geometry)
+    coordinates = np.column_stack([demand_centers['Lon [deg]'].to_numpy(dtype=float),
+                                   demand_centers['Lat [deg]'].to_numpy(dtype=float)])
+    points = [Point(longitude, latitude) for longitude, latitude in coordinates]
+    if len(geometries) == 0 or len(points) == 0:
+        pairs = []
+    elif hasattr(STRtree, 'query_items'):
+        # Shapely 1.8: a point in a hexagon is within half the diagonal of its bounding box from the box centre
+        bounds = np.array([geometry.bounds for geometry in geometries])
+        centres = (bounds[:, :2] + bounds[:, 2:])/2
+        radius = np.hypot(*((bounds[:, 2:] - bounds[:, :2])/2).T).max()
+        candidates = cKDTree(centres).query_ball_point(coordinates, radius + 1e-9)
+        pairs = [(point_index, hexagon_index) for point_index, hexagon_indices in enumerate(candidates)
+                 for hexagon_index in hexagon_indices
+                 if geometries[hexagon_index].contains(points[point_index])]
+    else:
+        # Shapely 2: one bulk query for all demand centers
+        pairs = STRtree(geometries).query(points, predicate='within').T
+    locations = {name: [] for name in demand_centers.index}
+    for point_index, hexagon_index in pairs:
+        locations[demand_centers.index[point_index]].append(int(hexagon_index))
+    return {name: np.sort(np.array(positions, dtype=int)) for name, positions in locations.items()}
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""
+filter_country.py
+
+Keeps only the hexagons of the country being analysed. Hexagons at the edges
+of the hexagon file can be labelled with a neighbouring country, and are left
+out of the transport and plant optimizations.
+
+The GeoJSON file is read and written one feature at a time, so memory use
+doesn't grow with the number of hexagons, and the filtered hexagons are
+written to a new file instead of overwriting the input.
+
+"""
+
+import json
+import os
+import pandas as pd
+
+# characters read from the GeoJSON file at a time
+CHUNK_SIZE = 1 << 20
+
+class JSONStream:
+    '''
+    reads consecutive JSON values from a text file, holding only the part of
+    the file around the current value in memory.
+
+    Parameters
+    ----------
+    file : file object
+        text file to read from.
+    chunk_size : integer
+        characters to read at a time. Default CHUNK_SIZE.
+    '''
+    def __init__(self, file, chunk_size = CHUNK_SIZE):
+        self.file = file
+        self.chunk_size = chunk_size
+        self.buffer = ''
+        self.position = 0
+        self.finished = False
+        self.decoder = json.JSONDecoder()
+
+    def read(self):
+        '''
+        reads the next chunk of the file, dropping what has been parsed.
+        '''
+        chunk = self.file.read(self.chunk_size)
+        self.finished = chunk == ''
+        self.buffer = self.buffer[self.position:] + chunk
+        self.position = 0
+
+    def skip_whitespace(self):
+        '''
+        moves to the next character that isn't whitespace.
+        '''
+        while True:
+            while self.position < len(self.buffer) and self.buffer[self.position].isspace():
+                self.position += 1
+            if self.position < len(self.buffer):
+                return
+            if self.finished:
+                raise ValueError('Unexpected end of GeoJSON file.')
+            self.read()
+
+    def expect(self, characters):
+        '''
+        moves past the next character that isn't whitespace, which must be one
+        of characters, and returns it.
+        '''
+        self.skip_whitespace()
+        character = self.buffer[self.position]
+        if character not in characters:
+            raise ValueError(f'Expected one of {characters!r} in GeoJSON file, found {character!r}.')
+        self.position += 1
+        return character
+
+    def peek(self):
+        '''
+        returns the next character that isn't whitespace, without moving past it.
+        '''
+        self.skip_whitespace()
+        return self.buffer[self.position]
+
+    def value(self):
+        '''
+        returns the next JSON value, reading more of the file until it is
+        complete.
+        '''
+        self.skip_whitespace()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.position)
+                # a number at the end of the buffer may continue in the next chunk
+                if end < len(self.buffer) or self.finished:
+                    self.position = end
+                    return value
+            except json.JSONDecodeError:
+                if self.finished:
+                    raise
+            self.read()
+
+def filter_features(input_path, output_path, keep, chunk_size = CHUNK_SIZE):
+    '''
+    copies a GeoJSON feature collection, keeping only some of its features.
+
+    Parameters
+    ----------
+    input_path : string
+        GeoJSON file to read. It isn't changed.
+    output_path : string
+        GeoJSON file to write the kept features to.
+    keep : function
+        returns whether to keep a feature, given the feature as a dictionary.
+    chunk_size : integer
+        characters to read at a time. Default CHUNK_SIZE.
+
+    Returns
+    -------
+    kept : integer
+        number of features kept.
+    total : integer
+        number of features in the input file.
+    '''
+    kept = 0
+    total = 0
+    # written under another name and moved, so a failed run never leaves a partial output
+    temporary_path = f'{output_path}.part'
+    with open(input_path, encoding='utf-8') as source, open(temporary_path, 'w', encoding='utf-8') as target:
+        stream = JSONStream(source, chunk_size)
+        stream.expect('{')
+        target.write('{')
+        separator = ''
+        # members other than the features, such as the CRS, are copied as they are
+        while stream.peek() != '}':
+            key = stream.value()
+            stream.expect(':')
+            target.write(f'{separator}{json.dumps(key)}: ')
+            separator = ', '
+            if key == 'features':
+                stream.expect('[')
+                target.write('[')
+                feature_separator = ''
+                while stream.peek() != ']':
+                    feature = stream.value()
+                    total += 1
+                    if keep(feature):
+                        target.write(feature_separator + json.dumps(feature))
+                        feature_separator = ',\n'
+                        kept += 1
+                    if stream.peek() != ']':
+                        stream.expect(',')
+                stream.expect(']')
+                target.write(']')
+            else:
+                json.dump(stream.value(), target)
+            if stream.peek() != '}':
+                stream.expect(',')
+        stream.expect('}')
+        target.write('}\n')
+    os.replace(temporary_path, output_path)
+    return kept, total
+
+if __name__ == "__main__":
+    country_parameters = pd.read_excel(str(snakemake.input.country_parameters),
+                                       index_col='Country')
+    # hexagons labelled with a country we aren't analyzing are left out
+    country = country_parameters.index.values[0]
+
+    output_folder = os.path.dirname(str(snakemake.output))
+    if output_folder and not os.path.exists(output_folder):
+        os.makedirs(output_folder)
+    kept, total = filter_features(str(snakemake.input.hexagons), str(snakemake.output),
+                                  lambda feature: feature['properties']['country'] == country)
+    if kept == 0:
+        os.remove(str(snakemake.output))
+        raise ValueError(f'None of the {total} hexagons are labelled {country}. Hexagon countries must '
+                         f'match the country names in {snakemake.input.country_parameters}.')
+    print(f'{kept} of {total} hexagons kept in {country}')
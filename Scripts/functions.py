@@ -1,6 +1,6 @@
 
-import pandas as pd
 import numpy as np
+from parameter_registry import parameter_sheet
 
 def CRF(interest,lifetime):
     '''
@@ -8,22 +8,23 @@ def CRF(interest,lifetime):
 
     Parameters
     ----------
-    interest : float
+    interest : float or array
         interest rate.
-    lifetime : float or integer
+    lifetime : float, integer or array
         lifetime of asset.
 
     Returns
     -------
-    CRF : float
+    CRF : float or array
         present value factor.
 
     '''
-    interest = float(interest)
-    lifetime = float(lifetime)
+    interest = np.asarray(interest, dtype=float)
+    lifetime = np.asarray(lifetime, dtype=float)
 
     CRF = (((1+interest)**lifetime)*interest)/(((1+interest)**lifetime)-1)
-    return CRF
+    # plain float for scalar inputs, as before arrays were supported
+    return float(CRF) if np.ndim(CRF) == 0 else CRF
 
 def trucking_costs(transport_state, distance, quantity, interest, transport_excel_path):
     '''
@@ -33,26 +34,24 @@ def trucking_costs(transport_state, distance, quantity, interest, transport_exce
     ----------
     transport_state : string
         state hydrogen is transported in, one of '500 bar', 'LH2', 'LOHC', or 'NH3'.
-    distance : float
+    distance : float or array
         distance between hydrogen production site and demand site.
     quantity : float
         annual amount of hydrogen to transport.
-    interest : float
+    interest : float or array
         interest rate on capital investments.
-    excel_path : string
-        path to transport_parameters.xlsx file
+    transport_excel_path : Workbook or string
+        loaded transport_parameters.xlsx workbook, or path to it.
         
     Returns
     -------
-    annual_costs : float
-        annual cost of hydrogen transport with specified method.
+    annual_costs : float or array
+        annual cost of hydrogen transport with specified method, for each
+        distance and interest rate if given arrays.
     '''
     daily_quantity = quantity/365
 
-    transport_parameters = pd.read_excel(transport_excel_path,
-                                         sheet_name = transport_state,
-                                         index_col = 'Parameter'
-                                         ).squeeze('columns')
+    transport_parameters = parameter_sheet(transport_excel_path, transport_state)
 
     average_truck_speed = transport_parameters['Average truck speed (km/h)']
     working_hours = transport_parameters['Working hours (h/day)']
@@ -75,12 +74,13 @@ def trucking_costs(transport_state, distance, quantity, interest, transport_exce
 
     amount_deliveries_needed = daily_quantity/net_capacity
     deliveries_per_truck = working_hours/(loading_unloading_time+(2*distance/average_truck_speed))
-    trailors_needed = round((amount_deliveries_needed/deliveries_per_truck)+0.5,0)
-    total_drives_day = round(amount_deliveries_needed+0.5,0) # not in ammonia calculation
+    # numpy rounding, like round, rounds halves to even and works on arrays
+    trailors_needed = np.round((amount_deliveries_needed/deliveries_per_truck)+0.5,0)
+    total_drives_day = np.round(amount_deliveries_needed+0.5,0) # not in ammonia calculation
     if transport_state == 'NH3':
         trucks_needed = trailors_needed
     else:
-        trucks_needed = max(round((total_drives_day*2*distance*working_days/max_driving_dist)+0.5,0),trailors_needed)
+        trucks_needed = np.maximum(np.round((total_drives_day*2*distance*working_days/max_driving_dist)+0.5,0),trailors_needed)
 
     capex_trucks = trucks_needed * spec_capex_truck
     capex_trailor = trailors_needed * spec_capex_trailor
@@ -89,8 +89,8 @@ def trucking_costs(transport_state, distance, quantity, interest, transport_exce
         wages = amount_deliveries_needed * ((distance/average_truck_speed)*2+loading_unloading_time) * working_days * costs_for_driver
     
     else:
-        fuel_costs = (round(amount_deliveries_needed+0.5)*2*distance*365/100)*diesel_consumption*diesel_price
-        wages = round(amount_deliveries_needed+0.5) * ((distance/average_truck_speed)*2+loading_unloading_time) * working_days * costs_for_driver
+        fuel_costs = (np.round(amount_deliveries_needed+0.5)*2*distance*365/100)*diesel_consumption*diesel_price
+        wages = np.round(amount_deliveries_needed+0.5) * ((distance/average_truck_speed)*2+loading_unloading_time) * working_days * costs_for_driver
 
     annual_costs = (capex_trucks*CRF(interest,truck_lifetime)+capex_trailor*CRF(interest,trailor_lifetime))\
         + capex_trucks*spec_opex_truck + capex_trailor*spec_opex_trailor + fuel_costs + wages
@@ -110,14 +110,14 @@ def h2_conversion_stand(final_state, quantity, electricity_costs, heat_costs, in
         'LH2', 'LOHC_load', 'LOHC_unload', 'NH3_load', or 'NH3_unload'.
     quantity : float
         annual quantity of hydrogen to convert in kg.
-    electricity_costs : float
+    electricity_costs : float or array
         unit price for electricity.
-    heat_costs : float
+    heat_costs : float or array
         unit costs for heat.
-    interest : float
+    interest : float or array
         interest rate applicable to hydrogen converter investments.
-    conversion_excel_path: string
-        path to conversion parameters excel sheet.
+    conversion_excel_path: Workbook or string
+        loaded conversion parameters workbook, or path to it.
 
     Returns
     -------
@@ -125,18 +125,16 @@ def h2_conversion_stand(final_state, quantity, electricity_costs, heat_costs, in
         annual electricity demand.
     heat_demand : float
         annual heat demand.
-    annual_costs : float
-        annual hydrogen conversion costs.
+    annual_costs : float or array
+        annual hydrogen conversion costs, for each price and interest rate if
+        given arrays.
 
     '''
     
     daily_throughput = quantity/365
     
     if final_state != 'standard condition':
-        conversion_parameters = pd.read_excel(conversion_excel_path,
-                                             sheet_name = final_state,
-                                             index_col = 'Parameter'
-                                             ).squeeze('columns')
+        conversion_parameters = parameter_sheet(conversion_excel_path, final_state)
 
     if final_state == 'standard condition':
         elec_demand = 0 
@@ -271,6 +269,109 @@ def h2_conversion_stand(final_state, quantity, electricity_costs, heat_costs, in
     else:
         raise NotImplementedError(f'Conversion costs for {final_state} not currently supported.')
 
+def conversion_costs(final_states, quantity, electricity_costs, heat_costs, interest,
+                     conversion_excel_path):
+    '''
+    calculates the annual cost of converting hydrogen to each of several
+    states, once for each distinct set of prices and interest rate.
+
+    Conversion costs do not depend on transport distance, so the many
+    production sites in a country, which share its prices and interest rate,
+    are costed together.
+
+    Parameters
+    ----------
+    final_states : list of strings
+        states to convert hydrogen to, as for h2_conversion_stand.
+    quantity : float
+        annual quantity of hydrogen to convert in kg.
+    electricity_costs : float or array
+        unit price for electricity.
+    heat_costs : float or array
+        unit costs for heat.
+    interest : float or array
+        interest rate applicable to hydrogen converter investments.
+    conversion_excel_path: Workbook or string
+        loaded conversion parameters workbook, or path to it.
+
+    Returns
+    -------
+    costs : dictionary
+        annual hydrogen conversion costs to each state, the same as
+        h2_conversion_stand, for each price and interest rate if given arrays.
+    '''
+    prices = np.broadcast_arrays(electricity_costs, heat_costs, interest)
+    shape = prices[0].shape
+    price_sets, inverse = np.unique(np.stack([price.ravel() for price in prices], axis=1),
+                                    axis=0, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    costs = {}
+    for final_state in dict.fromkeys(final_states):
+        annual_costs = h2_conversion_stand(final_state, quantity, price_sets[:, 0], price_sets[:, 1],
+                                           price_sets[:, 2], conversion_excel_path)[2]
+        annual_costs = np.broadcast_to(annual_costs, len(price_sets))[inverse].reshape(shape)
+        costs[final_state] = float(annual_costs) if shape == () else annual_costs
+    return costs
+
+def trucking_strategy_costs(final_state, quantity, distance,
+                            elec_costs, heat_costs, interest,
+                            conversion_excel_path, transport_excel_path,
+                            elec_costs_demand):
+    '''
+    calculates the annual cost of trucking hydrogen in each transport state,
+    including conversion to and from that state.
+
+    Parameters are as for cheapest_trucking_strategy, and distance, prices and
+    interest can be arrays with a value for each production site.
+
+    Returns
+    -------
+    costs : dictionary
+        annual storage, conversion, and transport costs of each transport
+        state, '500 bar', 'LH2', 'LOHC' and 'NH3', in that order.
+    '''
+    # conversion at the production site, with its electricity price, and at the demand site
+    if final_state == 'NH3':
+        supply = conversion_costs(['500 bar', 'NH3_load', 'LOHC_load'], quantity,
+                                  elec_costs, heat_costs, interest, conversion_excel_path)
+        demand = conversion_costs(['LOHC_unload', 'NH3_load'], quantity,
+                                  elec_costs_demand, heat_costs, interest, conversion_excel_path)
+        trucking = {state: trucking_costs(state, distance, quantity, interest, transport_excel_path)
+                    for state in ['500 bar', 'NH3', 'LOHC']}
+    else:
+        # the 500 bar route converts to the final state at the production site
+        supply = conversion_costs(['500 bar', 'LH2', 'NH3_load', 'LOHC_load', final_state], quantity,
+                                  elec_costs, heat_costs, interest, conversion_excel_path)
+        demand = conversion_costs(['NH3_unload', 'LOHC_unload', final_state], quantity,
+                                  elec_costs_demand, heat_costs, interest, conversion_excel_path)
+        trucking = {state: trucking_costs(state, distance, quantity, interest, transport_excel_path)
+                    for state in ['500 bar', 'LH2', 'NH3', 'LOHC']}
+
+    if final_state == '500 bar':
+        dist_costs_500bar = supply['500 bar'] + trucking['500 bar']
+    elif final_state == 'NH3':
+        dist_costs_500bar = supply['500 bar'] + trucking['500 bar'] + supply['NH3_load']
+    else:
+        dist_costs_500bar = supply['500 bar'] + trucking['500 bar'] + supply[final_state]
+    if final_state == 'LH2':
+        dist_costs_lh2 = supply['LH2'] + trucking['LH2']
+    elif final_state == 'NH3':
+        # hydrogen for ammonia demand is not liquefied, so this is the same as 500 bar
+        dist_costs_lh2 = dist_costs_500bar
+    else:
+        dist_costs_lh2 = supply['LH2'] + trucking['LH2'] + demand[final_state]
+    if final_state == 'NH3':
+        dist_costs_nh3 = supply['NH3_load'] + trucking['NH3']
+        dist_costs_lohc = supply['LOHC_load'] + trucking['LOHC'] + demand['LOHC_unload'] + demand['NH3_load']
+    else:
+        dist_costs_nh3 = supply['NH3_load'] + trucking['NH3'] + demand['NH3_unload'] + demand[final_state]
+        dist_costs_lohc = supply['LOHC_load'] + trucking['LOHC'] + demand['LOHC_unload'] + demand[final_state]
+
+    return {'500 bar': dist_costs_500bar,
+            'LH2': dist_costs_lh2,
+            'LOHC': dist_costs_lohc,
+            'NH3': dist_costs_nh3}
+
 def cheapest_trucking_strategy(final_state, quantity, distance, 
                                 elec_costs, heat_costs, interest,
                                 conversion_excel_path, transport_excel_path,
@@ -292,8 +393,8 @@ def cheapest_trucking_strategy(final_state, quantity, distance,
         cost per kWh of heat.
     interest : float
         interest on conversion and trucking capital investments (not including roads).
-    conversion_excel_path: string
-        path to conversion parameters excel sheet.
+    conversion_excel_path: Workbook or string
+        loaded conversion parameters workbook, or path to it.
     elec_costs_demand : float
         cost per kWh of electricity at hydrogen demand site.
     elec_cost_grid : float
@@ -308,44 +409,14 @@ def cheapest_trucking_strategy(final_state, quantity, distance,
 
     '''
 
-    if final_state == '500 bar':
-        dist_costs_500bar = h2_conversion_stand('500 bar', quantity, elec_costs, heat_costs, interest, conversion_excel_path)[2]\
-                + trucking_costs('500 bar',distance,quantity,interest,transport_excel_path)
-    elif final_state == 'NH3':
-        dist_costs_500bar = h2_conversion_stand('500 bar', quantity, elec_costs, heat_costs, interest, conversion_excel_path)[2]\
-                + trucking_costs('500 bar',distance,quantity,interest,transport_excel_path)\
-                    + h2_conversion_stand(final_state+'_load', quantity, elec_costs, heat_costs, interest, conversion_excel_path)[2]
-    else:  
-        dist_costs_500bar = h2_conversion_stand('500 bar', quantity, elec_costs, heat_costs, interest, conversion_excel_path)[2]\
-                + trucking_costs('500 bar',distance,quantity,interest,transport_excel_path)\
-                    + h2_conversion_stand(final_state, quantity, elec_costs, heat_costs, interest, conversion_excel_path)[2]
-    if final_state == 'LH2':
-        dist_costs_lh2 = h2_conversion_stand('LH2', quantity, elec_costs, heat_costs, interest, conversion_excel_path)[2]\
-                + trucking_costs('LH2',distance, quantity,interest,transport_excel_path) 
-    elif final_state == 'NH3':
-        dist_costs_lh2 = h2_conversion_stand('500 bar', quantity, elec_costs, heat_costs, interest, conversion_excel_path)[2]\
-                + trucking_costs('500 bar',distance,quantity,interest,transport_excel_path)\
-                    + h2_conversion_stand(final_state+'_load', quantity, elec_costs, heat_costs, interest, conversion_excel_path)[2]
-    else:
-        dist_costs_lh2 = h2_conversion_stand('LH2', quantity, elec_costs, heat_costs, interest, conversion_excel_path)[2]\
-                + trucking_costs('LH2',distance, quantity,interest,transport_excel_path)\
-                    + h2_conversion_stand(final_state, quantity, elec_costs_demand, heat_costs, interest, conversion_excel_path)[2]
-    if final_state == 'NH3':
-        dist_costs_nh3 = h2_conversion_stand('NH3_load', quantity, elec_costs, heat_costs, interest, conversion_excel_path)[2]\
-                + trucking_costs('NH3',distance, quantity, interest,transport_excel_path)
-        dist_costs_lohc = h2_conversion_stand('LOHC_load', quantity, elec_costs, heat_costs, interest, conversion_excel_path)[2]\
-                + trucking_costs('LOHC',distance, quantity, interest,transport_excel_path)\
-                    + h2_conversion_stand('LOHC_unload', quantity, elec_costs_demand, heat_costs, interest, conversion_excel_path)[2]\
-                        + h2_conversion_stand('NH3_load', quantity, elec_costs_demand, heat_costs, interest, conversion_excel_path)[2]
-    else:
-        dist_costs_nh3 = h2_conversion_stand('NH3_load', quantity, elec_costs, heat_costs, interest, conversion_excel_path)[2]\
-                + trucking_costs('NH3',distance, quantity,interest,transport_excel_path)\
-                    + h2_conversion_stand('NH3_unload', quantity, elec_costs_demand, heat_costs, interest, conversion_excel_path)[2]\
-                        + h2_conversion_stand(final_state, quantity, elec_costs_demand, heat_costs, interest, conversion_excel_path)[2]
-        dist_costs_lohc = h2_conversion_stand('LOHC_load', quantity, elec_costs, heat_costs, interest, conversion_excel_path)[2]\
-                + trucking_costs('LOHC',distance, quantity,interest,transport_excel_path)\
-                    + h2_conversion_stand('LOHC_unload', quantity, elec_costs_demand, heat_costs, interest, conversion_excel_path)[2]\
-                        + h2_conversion_stand(final_state, quantity, elec_costs_demand, heat_costs, interest, conversion_excel_path)[2]
+    costs = trucking_strategy_costs(final_state, quantity, distance,
+                                    elec_costs, heat_costs, interest,
+                                    conversion_excel_path, transport_excel_path,
+                                    elec_costs_demand)
+    dist_costs_500bar = costs['500 bar']
+    dist_costs_lh2 = costs['LH2']
+    dist_costs_lohc = costs['LOHC']
+    dist_costs_nh3 = costs['NH3']
 
     lowest_cost = np.nanmin([dist_costs_500bar, dist_costs_lh2, dist_costs_lohc, dist_costs_nh3])
     
@@ -364,6 +435,62 @@ def cheapest_trucking_strategy(final_state, quantity, distance,
 
     
     
+def cheapest_trucking_strategies(final_state, quantity, distance,
+                                 elec_costs, heat_costs, interest,
+                                 conversion_excel_path, transport_excel_path,
+                                 elec_costs_demand, elec_cost_grid = 0.):
+    '''
+    calculates the lowest-cost state to transport hydrogen by truck from many
+    production sites at once.
+
+    Parameters
+    ----------
+    final_state : string
+        final state for hydrogen demand.
+    quantity : float
+        annual demand for hydrogen in kg.
+    distance : array
+        distance to transport hydrogen from each production site.
+    elec_costs : float or array
+        cost per kWh of electricity at each hydrogen production site.
+    heat_costs : float or array
+        cost per kWh of heat at each hydrogen production site.
+    interest : float or array
+        interest on conversion and trucking capital investments (not including roads).
+    conversion_excel_path: Workbook or string
+        loaded conversion parameters workbook, or path to it.
+    transport_excel_path: Workbook or string
+        loaded transport parameters workbook, or path to it.
+    elec_costs_demand : float
+        cost per kWh of electricity at hydrogen demand site.
+    elec_cost_grid : float
+        grid electricity costs that pipeline compressors pay. Default 0.
+
+    Returns
+    -------
+    costs_per_unit : array
+        storage, conversion, and transport costs for the cheapest trucking
+        option from each site, the same as cheapest_trucking_strategy.
+    cheapest_options : array
+        the lowest-cost state in which to transport hydrogen by truck from
+        each site, picked in the same order as cheapest_trucking_strategy on ties.
+    '''
+    costs = trucking_strategy_costs(final_state, quantity, distance,
+                                    elec_costs, heat_costs, interest,
+                                    conversion_excel_path, transport_excel_path,
+                                    elec_costs_demand)
+    costs = np.vstack(np.broadcast_arrays(*costs.values(), distance)[:-1])
+    # sites without a distance have no cost in any state
+    lowest_cost = np.full(costs.shape[1], np.nan)
+    costed = ~np.isnan(costs).all(axis=0)
+    lowest_cost[costed] = np.nanmin(costs[:, costed], axis=0)
+    cheapest_options = np.select(list(costs == lowest_cost), ['500 bar', 'LH2', 'LOHC', 'NH3'],
+                                 default='nan')
+
+    costs_per_unit = lowest_cost/quantity
+
+    return costs_per_unit, cheapest_options
+
 def cheapest_pipeline_strategy(final_state, quantity, distance, 
                                 elec_costs, heat_costs,interest, 
                                 conversion_excel_path,
@@ -387,8 +514,8 @@ def cheapest_pipeline_strategy(final_state, quantity, distance,
         cost per kWh of heat.
     interest : float
         interest on pipeline capital investments.
-    conversion_excel_path: string
-        path to conversion parameters excel sheet.
+    conversion_excel_path: Workbook or string
+        loaded conversion parameters workbook, or path to it.
     elec_costs_demand : float
         cost per kWh of electricity at hydrogen demand site.
     elec_cost_grid : float
@@ -403,18 +530,84 @@ def cheapest_pipeline_strategy(final_state, quantity, distance,
 
     '''
 
+    annual_costs, cheapest_option = pipeline_costs(distance, quantity, elec_cost_grid, pipeline_excel_path, interest)
     if final_state == 'NH3':
-        dist_costs_pipeline = pipeline_costs(distance,quantity,elec_cost_grid, pipeline_excel_path, interest)[0]\
+        dist_costs_pipeline = annual_costs\
                 + h2_conversion_stand(final_state+'_load', quantity, elec_costs_demand, heat_costs, interest, conversion_excel_path)[2]  
     else:
-        dist_costs_pipeline = pipeline_costs(distance,quantity,elec_cost_grid,pipeline_excel_path,interest)[0]\
+        dist_costs_pipeline = annual_costs\
                 + h2_conversion_stand(final_state, quantity, elec_costs_demand, heat_costs, interest, conversion_excel_path)[2]
 
     costs_per_unit = dist_costs_pipeline/quantity
-    cheapest_option = pipeline_costs(distance, quantity, elec_cost_grid, pipeline_excel_path, interest)[1] 
 
     return costs_per_unit, cheapest_option
 
+def cheapest_pipeline_strategies(final_state, quantity, distance,
+                                 elec_costs, heat_costs, interest,
+                                 conversion_excel_path,
+                                 pipeline_excel_path,
+                                 elec_costs_demand,
+                                 elec_cost_grid = 0.):
+    '''
+    calculates the cost of transporting hydrogen via pipeline from many
+    production sites at once.
+
+    Parameters are as for cheapest_pipeline_strategy, and distance and
+    interest can be arrays with a value for each production site.
+
+    Returns
+    -------
+    costs_per_unit : array
+        storage, conversion, and transport costs from each site, the same as
+        cheapest_pipeline_strategy.
+    cheapest_options : array
+        size of pipeline to build from each site.
+    '''
+    annual_costs, pipeline_type = pipeline_costs(distance, quantity, elec_cost_grid, pipeline_excel_path, interest)
+    demand_state = final_state+'_load' if final_state == 'NH3' else final_state
+    dist_costs_pipeline = annual_costs\
+            + conversion_costs([demand_state], quantity, elec_costs_demand, heat_costs, interest, conversion_excel_path)[demand_state]
+
+    costs_per_unit = np.broadcast_to(dist_costs_pipeline/quantity, np.shape(distance)).copy()
+    cheapest_options = np.full(np.shape(distance), pipeline_type)
+
+    return costs_per_unit, cheapest_options
+
+
+def pipeline_size(quantity, pipeline_excel_path):
+    '''
+    finds the smallest pipeline that can carry a quantity of hydrogen.
+
+    Parameters
+    ----------
+    quantity : float
+        annual quantity of hydrogen demanded in kg.
+    pipeline_excel_path: Workbook or string
+        loaded pipeline parameters workbook, or path to it.
+
+    Returns
+    -------
+    pipeline_type : string
+        size of pipeline to build, 'Small', 'Medium' or 'Large', or None if no
+        pipeline is big enough.
+    '''
+    all_parameters = parameter_sheet(pipeline_excel_path, 'All')
+    availability = all_parameters['Availability']
+    max_capacity_big = all_parameters['Large pipeline max capacity (GW)']
+    max_capacity_med = all_parameters['Medium pipeline max capacity (GW)']
+    max_capacity_sml = all_parameters['Small pipeline max capcity (GW)']
+
+    max_throughput_big = (((max_capacity_big*(10**6))/33.333))*8760*availability
+    max_throughput_med = (((max_capacity_med*(10**6))/33.333))*8760*availability
+    max_throughput_sml = (((max_capacity_sml*(10**6))/33.333))*8760*availability
+
+    if quantity <= max_throughput_sml:
+        return 'Small'
+    elif quantity > max_throughput_sml and quantity <= max_throughput_med:
+        return 'Medium'
+    elif quantity > max_throughput_med and quantity <= max_throughput_big:
+        return 'Large'
+    return None
 
 #Only new pipelines
 def pipeline_costs(distance, quantity, elec_cost, pipeline_excel_path, interest):
@@ -429,8 +622,8 @@ def pipeline_costs(distance, quantity, elec_cost, pipeline_excel_path, interest)
         annual quantity of hydrogen demanded in kg.
     elec_cost : float
         price of electricity along pipeline in euros.
-    pipeline_excel_path: string
-        path to conversion parameters excel sheet.
+    pipeline_excel_path: Workbook or string
+        loaded pipeline parameters workbook, or path to it.
     interest : float
         interest rate on capital investments.
 
@@ -442,39 +635,17 @@ def pipeline_costs(distance, quantity, elec_cost, pipeline_excel_path, interest)
         size of pipeline to build
 
     '''
-    all_parameters = pd.read_excel(pipeline_excel_path,
-                                   sheet_name='All',
-                                    index_col = 'Parameter'
-                                    ).squeeze('columns')
+    all_parameters = parameter_sheet(pipeline_excel_path, 'All')
     opex = all_parameters['Opex (% of capex)']
-    availability = all_parameters['Availability']
     lifetime_pipeline = all_parameters['Pipeline lifetime (a)']
     lifetime_compressors = all_parameters['Compressor lifetime (a)']
     electricity_demand = all_parameters['Electricity demand (kWh/kg*km)']
-    max_capacity_big = all_parameters['Large pipeline max capacity (GW)']
-    max_capacity_med = all_parameters['Medium pipeline max capacity (GW)']
-    max_capacity_sml = all_parameters['Small pipeline max capcity (GW)']
-
-    max_throughput_big = (((max_capacity_big*(10**6))/33.333))*8760*availability
-    max_throughput_med = (((max_capacity_med*(10**6))/33.333))*8760*availability
-    max_throughput_sml = (((max_capacity_sml*(10**6))/33.333))*8760*availability
 
-    if quantity <= max_throughput_sml:
-        pipeline_type = 'Small'
-        
-    elif quantity > max_throughput_sml and quantity <= max_throughput_med:
-        pipeline_type = 'Medium'
-    
-    elif quantity > max_throughput_med and quantity <= max_throughput_big:
-        pipeline_type = 'Large'
-
-    else:
+    pipeline_type = pipeline_size(quantity, pipeline_excel_path)
+    if pipeline_type is None:
         return np.nan,'No Pipeline big enough'
     
-    pipeline_parameters = pd.read_excel(pipeline_excel_path,
-                                   sheet_name=pipeline_type,
-                                    index_col = 'Parameter'
-                                    ).squeeze('columns')
+    pipeline_parameters = parameter_sheet(pipeline_excel_path, pipeline_type)
     capex_pipeline = pipeline_parameters['Pipeline capex (euros)']
     capex_compressor = pipeline_parameters['Compressor capex (euros)']
     
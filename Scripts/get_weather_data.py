@@ -21,6 +21,23 @@ import logging
 import atlite
 import geopandas as gpd
 import os
+from functools import partial
+from cutout_tiles import prepare_tiled_cutout
+from cutout_catalogue import cutout_catalogue, find_source
+
+def prepare_era5_tile(tile, path, tmpdir = 'temp'):
+    '''
+    downloads and prepares the ERA5 data of one cutout tile.
+    '''
+    cutout = atlite.Cutout(
+        path=path,
+        module="era5",
+        x=tile['x'],
+        y=tile['y'],
+        time=tile['time'],
+    )
+    cutout.prepare(tmpdir=tmpdir)
+
 if __name__ == "__main__":
     
     logging.basicConfig(level=logging.INFO)
@@ -43,12 +60,29 @@ if __name__ == "__main__":
     if not os.path.exists('temp'):
         os.makedirs('temp')
     
-    cutout = atlite.Cutout(
-        path=str(snakemake.output),
-        module="era5",
-        x=slice(min_lon, max_lon),
-        y=slice(min_lat, max_lat),
-        time=slice(start_date, end_date),
-    )
-    
-    cutout.prepare(tmpdir="temp") # TEMPDIR DEFINITION IS NEW TO FIX ERROR
\ No newline at end of file
+    weather_config = snakemake.config["weather_data"]
+    if weather_config["tiled"] or weather_config["reuse_cutouts"]:
+        # tiles already covered by other cutouts are read from them instead of downloaded
+        source = None
+        if weather_config["reuse_cutouts"]:
+            catalogue = cutout_catalogue('Cutouts', exclude = [str(snakemake.output)])
+            source = partial(find_source, catalogue = catalogue,
+                             features = list(atlite.datasets.era5.features))
+        # spatial and monthly tiles, prepared in parallel and resumed after a failure
+        prepare_tiled_cutout(str(snakemake.output),
+                             min_lon, min_lat, max_lon, max_lat,
+                             start_date, end_date,
+                             partial(prepare_era5_tile, tmpdir="temp"),
+                             tile_size = weather_config["tile_size"],
+                             max_requests = weather_config["max_requests"],
+                             find_source = source)
+    else:
+        cutout = atlite.Cutout(
+            path=str(snakemake.output),
+            module="era5",
+            x=slice(min_lon, max_lon),
+            y=slice(min_lat, max_lat),
+            time=slice(start_date, end_date),
+        )
+
+        cutout.prepare(tmpdir="temp") # TEMPDIR DEFINITION IS NEW TO FIX ERROR
\ No newline at end of file
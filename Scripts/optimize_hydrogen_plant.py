@@ -9,18 +9,30 @@ hydrogen plant capacity.
 
 """
 
-import atlite
 import geopandas as gpd
 import pypsa
 import pandas as pd
 import p_H2_aux as aux
 from functions import CRF
+from parameter_registry import load_workbook, parameter_sheet
+from solve_cache import SolveCache, hash_inputs, hash_folder
+from time_aggregation import segment_snapshots, segment_weights, segment_starts, aggregate
+from plant_lp import PlantLP
+from solvers import solver_settings
+from checkpoint import CheckpointLog
+from cf_store import load_profiles, StoreReference, resolve
 import numpy as np
 import logging
 import time
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import partial
 
 logging.basicConfig(level=logging.ERROR)
 
+# solvers that PyPSA can pass a stored simplex basis to for a warm start
+WARMSTART_SOLVERS = ['gurobi', 'cplex', 'xpress', 'glpk', 'cbc']
+
 def demand_schedule(quantity, start_date, end_date, transport_state, transport_excel_path):
     '''
     calculates hourly hydrogen demand for truck shipment and pipeline transport.
@@ -35,8 +47,8 @@ def demand_schedule(quantity, start_date, end_date, transport_state, transport_e
         end date for demand schedule in the format YYYY-MM-DD.
     transport_state : string
         state hydrogen is transported in, one of '500 bar', 'LH2', 'LOHC', or 'NH3'.
-    transport_excel_path : string
-        path to transport_parameters.xlsx file
+    transport_excel_path : Workbook or string
+        loaded transport_parameters.xlsx workbook, or path to it.
 
     Returns
     -------
@@ -61,10 +73,7 @@ def demand_schedule(quantity, start_date, end_date, transport_state, transport_e
 
         return trucking_hourly_demand_schedule, pipeline_hourly_demand_schedule
     else:
-        transport_parameters = pd.read_excel(transport_excel_path,
-                                            sheet_name = transport_state,
-                                            index_col = 'Parameter'
-                                            ).squeeze('columns')
+        transport_parameters = parameter_sheet(transport_excel_path, transport_state)
 
         truck_capacity = transport_parameters['Net capacity (kg H2)']
 
@@ -77,10 +86,296 @@ def demand_schedule(quantity, start_date, end_date, transport_state, transport_e
 
     return trucking_hourly_demand_schedule, pipeline_hourly_demand_schedule
 
+class PlantTemplate:
+    '''
+    hydrogen plant network that is built once and re-parameterised for each
+    hexagon, so each solve avoids rebuilding the network and re-reading the
+    plant CSVs.
+
+    Parameters
+    ----------
+    times : xarray DataArray
+        1D dataarray with timestamps for wind and solar potential.
+    segments : numpy array
+        segment number of each timestamp from time_aggregation.segment_snapshots,
+        to solve on one weighted snapshot per segment. Default is None, which
+        solves every timestamp.
+    plant_path : string
+        folder with the hydrogen plant design CSVs. Default "Parameters/Basic_H2_plant".
+    engine : string
+        'pypsa' to solve the plant network with PyPSA, or 'sparse' to assemble
+        the plant LP directly with plant_lp. Default 'pypsa'.
+    solver : dictionary
+        solver backend settings from solvers.solver_settings. Default is None,
+        which uses the default backend.
+    '''
+    def __init__(self, times, segments = None, plant_path = "Parameters/Basic_H2_plant",
+                 engine = 'pypsa', solver = None):
+        if engine not in ['pypsa', 'sparse']:
+            raise NotImplementedError(f'Plant optimization engine {engine} not currently supported.')
+        self.times = pd.DatetimeIndex(times)
+        self.segments = segments
+        self.engine = engine
+        self.solver = solver if solver is not None else solver_settings()
+        # Import a generic network
+        n = pypsa.Network(override_component_attrs=aux.create_override_components())
+        # Set the time values for the network
+        if segments is None:
+            n.set_snapshots(times)
+        else:
+            # each segment is represented by its first timestamp, weighted
+            # by the number of hours it covers
+            n.set_snapshots(self.times[segment_starts(segments)])
+            for weighting in n.snapshot_weightings.columns:
+                n.snapshot_weightings[weighting] = segment_weights(segments)
+        # Import the design of the H2 plant into the network
+        n.import_from_csv_folder(plant_path)
+        # demand profile is replaced for every solve
+        n.add('Load',
+              'Hydrogen demand',
+              bus = 'Hydrogen',
+              p_set = pd.Series(0., index=n.snapshots),
+              )
+        self.network = n
+        # the sparse engine shares the network's snapshots, weightings and costs
+        self.lp = PlantLP(n.snapshot_weightings.generators.values, plant_path,
+                          self.solver['linprog_method'], self.solver['linprog_options'])\
+            if engine == 'sparse' else None
+        # plant design, to tell cached results of other plant designs apart
+        self.plant_hash = hash_folder(plant_path)
+        # capital costs before annualisation
+        self.capital_costs = {
+            'generators': n.generators.capital_cost.copy(),
+            'links': n.links.capital_cost.copy(),
+            'stores': n.stores.capital_cost.copy(),
+            'storage_units': n.storage_units.capital_cost.copy(),
+            }
+        self._annualised_costs = {}
+        # basis of the previous solve, used to warm start the next one
+        self.basis_fn = None
+        # (solve time in seconds, whether the solve was warm started) for each solve
+        self.solve_stats = []
+
+    def matches(self, times, segments = None, engine = 'pypsa', solver = None):
+        '''
+        checks whether the template was built for the given timestamps,
+        segments, engine and solver.
+        '''
+        if self.engine != engine:
+            return False
+        if self.solver != (solver if solver is not None else solver_settings()):
+            return False
+        if (self.segments is None) != (segments is None):
+            return False
+        if segments is not None and not np.array_equal(self.segments, segments):
+            return False
+        return self.times.equals(pd.DatetimeIndex(times))
+
+    def aggregate(self, values):
+        '''
+        averages an hourly time series over the template's segments.
+        '''
+        if self.segments is None:
+            return values
+        return aggregate(values, self.segments)
+
+    def annualised_costs(self, country_series):
+        '''
+        returns capital costs annualised with the country's interest rates and
+        lifetimes, calculated once per set of financial parameters.
+        '''
+        key = (country_series['Wind interest rate'], country_series['Wind lifetime (years)'],
+               country_series['Solar interest rate'], country_series['Solar lifetime (years)'],
+               country_series['Plant interest rate'], country_series['Plant lifetime (years)'])
+        if key not in self._annualised_costs:
+            generators = self.capital_costs['generators'].copy()
+            # specify technology-specific and country-specific WACC and lifetime here
+            generators['Wind'] = generators['Wind']\
+                * CRF(country_series['Wind interest rate'], country_series['Wind lifetime (years)'])
+            generators['Solar'] = generators['Solar']\
+                * CRF(country_series['Solar interest rate'], country_series['Solar lifetime (years)'])
+            plant_crf = CRF(country_series['Plant interest rate'],country_series['Plant lifetime (years)'])
+            self._annualised_costs[key] = {
+                'generators': generators,
+                'links': self.capital_costs['links'] * plant_crf,
+                'stores': self.capital_costs['stores'] * plant_crf,
+                'storage_units': self.capital_costs['storage_units'] * plant_crf,
+                }
+        return self._annualised_costs[key]
+
+    def demand(self, demand_profile):
+        '''
+        returns the hydrogen demand in MW for each snapshot.
+        '''
+        # Note: All flows are in MW or MWh, conversions for hydrogen done using HHVs. Hydrogen HHV = 39.4 MWh/t
+        return self.aggregate(demand_profile['Demand'].reindex(self.times).to_numpy()/1000*39.4)
+
+    def update(self, wind_potential, pv_potential, demand_profile,
+               wind_max_capacity, pv_max_capacity, country_series):
+        '''
+        sets the hexagon-specific inputs on the template network and returns it.
+        See optimize_hydrogen_plant for the parameters.
+        '''
+        n = self.network
+        # Import demand profile
+        if self.segments is None:
+            # Note: All flows are in MW or MWh, conversions for hydrogen done using HHVs. Hydrogen HHV = 39.4 MWh/t
+            n.loads_t.p_set['Hydrogen demand'] = demand_profile['Demand']/1000*39.4
+        else:
+            n.loads_t.p_set['Hydrogen demand'] = self.demand(demand_profile)
+
+        # Send the weather data to the model
+        n.generators_t.p_max_pu['Wind'] = self.aggregate(wind_potential)
+        n.generators_t.p_max_pu['Solar'] = self.aggregate(pv_potential)
+
+        # specify maximum capacity based on land use
+        n.generators.loc['Wind','p_nom_max'] = wind_max_capacity*4
+        n.generators.loc['Solar','p_nom_max'] = pv_max_capacity
+
+        for component, capital_cost in self.annualised_costs(country_series).items():
+            getattr(n, component)['capital_cost'] = capital_cost
+        return n
+
+    def sparse_problem(self, wind_potential, pv_potential, demand_profile,
+                       wind_max_capacity, pv_max_capacity, country_series):
+        '''
+        returns the arguments of PlantLP.optimize for the hexagon-specific
+        inputs. See optimize_hydrogen_plant for the parameters.
+        '''
+        return (self.aggregate(wind_potential),
+                self.aggregate(pv_potential),
+                self.demand(demand_profile),
+                wind_max_capacity*4,
+                pv_max_capacity,
+                self.annualised_costs(country_series))
+
+    def lcoh_lower_bound(self, wind_potential, pv_potential, demand_profile,
+                         wind_max_capacity, pv_max_capacity, country_series):
+        '''
+        calculates a lower bound on the levelized cost of hydrogen without
+        solving the plant LP. See optimize_hydrogen_plant for the parameters.
+
+        The electrolyzer must be at least as large as its average load, and
+        the electricity it uses costs at least as much as the generators with
+        the lowest annualised cost per MWh of their yearly yield could produce
+        it for within their capacity limits. Storage, compression and
+        curtailment only add to these costs.
+
+        Returns
+        -------
+        float
+            lower bound in currency per kg of hydrogen, or infinity if the
+            generators can't meet the demand.
+        '''
+        n = self.network
+        weights = n.snapshot_weightings.generators.values
+        costs = self.annualised_costs(country_series)
+        # hydrogen demand in MWh and the electricity needed to produce it
+        demand = np.dot(weights, self.demand(demand_profile))
+        efficiency = n.links.efficiency['Electrolysis']
+        electricity = demand/efficiency
+        cost = costs['links']['Electrolysis']*electricity/weights.sum()
+        # yearly MWh per MW of each generator and the most it can produce
+        yields = {'Wind': np.dot(weights, self.aggregate(np.asarray(wind_potential, dtype=float))),
+                  'Solar': np.dot(weights, self.aggregate(np.asarray(pv_potential, dtype=float)))}
+        limits = {'Wind': wind_max_capacity*4, 'Solar': pv_max_capacity}
+        for generator in sorted(yields, key=lambda g: costs['generators'][g]/max(yields[g], 1e-12)):
+            if electricity <= 0:
+                break
+            if yields[generator] <= 0:
+                continue
+            energy = min(electricity, limits[generator]*yields[generator])
+            cost += costs['generators'][generator]*energy/yields[generator]
+            electricity -= energy
+        if electricity > 1e-9*demand/efficiency:
+            return np.inf
+        return cost/(demand/39.4*1000) # convert back to kg H2
+
+    def inputs_key(self, wind_potential, pv_potential, demand_profile,
+                   wind_max_capacity, pv_max_capacity, country_series):
+        '''
+        calculates a hash of everything that defines the plant LP for these
+        inputs, for use as a solve cache key. See optimize_hydrogen_plant for
+        the parameters.
+        '''
+        n = self.network
+        # segments and engine only enter the hash when not the defaults, so
+        # full-resolution PyPSA keys stay the same
+        aggregation = [] if self.segments is None else [self.segments]
+        engine = [] if self.engine == 'pypsa' else\
+            [self.engine, self.solver['linprog_method'], self.solver['linprog_options']]
+        return hash_inputs(self.plant_hash,
+                           *aggregation,
+                           *engine,
+                           n.snapshots,
+                           np.asarray(wind_potential, dtype=float),
+                           np.asarray(pv_potential, dtype=float),
+                           # the demand the LP is solved with, averaged over segments if aggregated
+                           np.asarray(self.demand(demand_profile), dtype=float),
+                           float(wind_max_capacity*4),
+                           float(pv_max_capacity),
+                           self.annualised_costs(country_series),
+                           self.solver['solver_name'],
+                           self.solver['solver_options'])
+
+    def store_basis(self, basis_fn):
+        '''
+        keeps the basis file of the latest solve and removes the one it replaces.
+        '''
+        if self.basis_fn is not None and self.basis_fn != basis_fn and os.path.exists(self.basis_fn):
+            os.remove(self.basis_fn)
+        self.basis_fn = basis_fn if basis_fn is not None and os.path.exists(basis_fn) else None
+
+def enough_water(demand_profile, water_limit):
+    '''
+    checks if hydrogen demand can be met based on hexagon water availability.
+
+    Parameters
+    ----------
+    demand_profile : pandas DataFrame
+        hourly dataframe of hydrogen demand in kg.
+    water_limit : float
+        annual limit on water available for electrolysis in hexagon, in cubic
+        meters, or None if water is not limited.
+
+    Returns
+    -------
+    boolean
+        whether there is enough water.
+    '''
+    if water_limit == None:
+        return True
+    # total hydrogen demand in kg
+    total_hydrogen_demand = demand_profile['Demand'].sum()
+    return total_hydrogen_demand <= water_limit * 111.57 # kg H2 per cubic meter of water
+
+def feasible_transport(hexagons, location, transport_types = ("trucking", "pipeline")):
+    '''
+    finds the hexagons that can supply a demand center by each transport type.
+
+    Parameters
+    ----------
+    hexagons : geopandas GeoDataFrame
+        hexagons with the transport and conversion costs to the demand center.
+    location : string
+        name of the demand center.
+    transport_types : list of strings
+        transport types to check. Default trucking and pipeline.
+
+    Returns
+    -------
+    feasible : dictionary
+        boolean pandas Series by transport type, True for hexagons with a
+        transport cost. Hexagons out of range or without a road have none.
+    '''
+    return {j: hexagons[f'{location} {j} transport and conversion costs'].notna()
+            for j in transport_types}
+
 # in the future, may want to make hexagons a class with different features
 def optimize_hydrogen_plant(wind_potential, pv_potential, times, demand_profile,
                             wind_max_capacity, pv_max_capacity, 
-                            country_series, water_limit = None):
+                            country_series, water_limit = None, template = None,
+                            warm_start = False):
     '''
    Optimizes the size of green hydrogen plant components based on renewable potential, hydrogen demand, and country parameters. 
 
@@ -98,6 +393,12 @@ def optimize_hydrogen_plant(wind_potential, pv_potential, times, demand_profile,
         interest rate and lifetime information.
     water_limit : float
         annual limit on water available for electrolysis in hexagon, in cubic meters. Default is None.
+    template : PlantTemplate
+        plant network to re-parameterise for this solve. Default is None,
+        which builds a new template.
+    warm_start : boolean
+        whether to start the solver from the basis of the template's previous
+        solve, if the solver supports it. Default is False.
 
     Returns
     -------
@@ -117,66 +418,53 @@ def optimize_hydrogen_plant(wind_potential, pv_potential, times, demand_profile,
     '''
 
     # if a water limit is given, check if hydrogen demand can be met
-    if water_limit != None:
-        # total hydrogen demand in kg
-        total_hydrogen_demand = demand_profile['Demand'].sum()
-        # check if hydrogen demand can be met based on hexagon water availability
-        water_constraint =  total_hydrogen_demand <= water_limit * 111.57 # kg H2 per cubic meter of water
-        if water_constraint == False:
-            print('Not enough water to meet hydrogen demand!')
-            # return null values
-            lcoh = np.nan
-            wind_capacity = np.nan
-            solar_capacity = np.nan
-            electrolyzer_capacity = np.nan
-            battery_capacity = np.nan
-            h2_storage = np.nan
-            return lcoh, wind_capacity, solar_capacity, electrolyzer_capacity, battery_capacity, h2_storage
+    if enough_water(demand_profile, water_limit) == False:
+        print('Not enough water to meet hydrogen demand!')
+        # return null values
+        lcoh = np.nan
+        wind_capacity = np.nan
+        solar_capacity = np.nan
+        electrolyzer_capacity = np.nan
+        battery_capacity = np.nan
+        h2_storage = np.nan
+        return lcoh, wind_capacity, solar_capacity, electrolyzer_capacity, battery_capacity, h2_storage
 
     # Set up network
-    # Import a generic network
-    n = pypsa.Network(override_component_attrs=aux.create_override_components())
-
-    # Set the time values for the network
-    n.set_snapshots(times)
-
-    # Import the design of the H2 plant into the network
-    n.import_from_csv_folder("Parameters/Basic_H2_plant")
-
-    # Import demand profile
-    # Note: All flows are in MW or MWh, conversions for hydrogen done using HHVs. Hydrogen HHV = 39.4 MWh/t
-    n.add('Load',
-          'Hydrogen demand',
-          bus = 'Hydrogen',
-          p_set = demand_profile['Demand']/1000*39.4,
-          )
-
-    # Send the weather data to the model
-    n.generators_t.p_max_pu['Wind'] = wind_potential
-    n.generators_t.p_max_pu['Solar'] = pv_potential
-
-    # specify maximum capacity based on land use
-    n.generators.loc['Wind','p_nom_max'] = wind_max_capacity*4
-    n.generators.loc['Solar','p_nom_max'] = pv_max_capacity
-
-    # specify technology-specific and country-specific WACC and lifetime here
-    n.generators.loc['Wind','capital_cost'] = n.generators.loc['Wind','capital_cost']\
-        * CRF(country_series['Wind interest rate'], country_series['Wind lifetime (years)'])
-    n.generators.loc['Solar','capital_cost'] = n.generators.loc['Solar','capital_cost']\
-        * CRF(country_series['Solar interest rate'], country_series['Solar lifetime (years)'])
-    for item in [n.links, n.stores,n.storage_units]:
-        item.capital_cost = item.capital_cost * CRF(country_series['Plant interest rate'],country_series['Plant lifetime (years)'])
+    if template is None:
+        template = PlantTemplate(times)
+    if template.engine == 'sparse':
+        start = time.time()
+        results = template.lp.optimize(*template.sparse_problem(wind_potential, pv_potential,
+                                                                demand_profile, wind_max_capacity,
+                                                                pv_max_capacity, country_series))
+        template.solve_stats.append((time.time() - start, False))
+        print(results[0])
+        return results
+    n = template.update(wind_potential, pv_potential, demand_profile,
+                        wind_max_capacity, pv_max_capacity, country_series)
 
     # Solve the model
-    solver = 'gurobi'
+    solver = template.solver['solver_name']
+    warm_start = warm_start and solver in WARMSTART_SOLVERS
+    warm_started = warm_start and template.basis_fn is not None
+    start = time.time()
     n.lopf(solver_name=solver,
-           solver_options = {'LogToConsole':0, 'OutputFlag':0},
+           solver_options = template.solver['solver_options'],
            pyomo=False,
            extra_functionality=aux.extra_functionalities,
+           warmstart = template.basis_fn if warm_started else False,
+           store_basis = warm_start,
            )
+    solve_time = time.time() - start
+    template.solve_stats.append((solve_time, warm_started))
+    if warm_start:
+        template.store_basis(getattr(n, 'basis_fn', None))
+        print(f'solved in {solve_time:.2f} s ({"warm" if warm_started else "cold"} start)')
     # Output results
 
-    lcoh = n.objective/(n.loads_t.p_set.sum()[0]/39.4*1000) # convert back to kg H2
+    # weight each snapshot by the hours it represents
+    demand = n.loads_t.p_set.multiply(n.snapshot_weightings.generators, axis=0)
+    lcoh = n.objective/(demand.sum()[0]/39.4*1000) # convert back to kg H2
     wind_capacity = n.generators.p_nom_opt['Wind']
     solar_capacity = n.generators.p_nom_opt['Solar']
     electrolyzer_capacity = n.links.p_nom_opt['Electrolysis']
@@ -185,9 +473,386 @@ def optimize_hydrogen_plant(wind_potential, pv_potential, times, demand_profile,
     print(lcoh)
     return lcoh, wind_capacity, solar_capacity, electrolyzer_capacity, battery_capacity, h2_storage
 
+def optimize_hydrogen_plant_batch(tasks, template):
+    '''
+    optimizes several hydrogen plants in one solver call, by stacking their
+    LPs into one block-diagonal LP. Only the sparse engine supports batches.
+
+    Parameters
+    ----------
+    tasks : list of tuples
+        positional arguments for optimize_hydrogen_plant, one tuple per plant.
+    template : PlantTemplate
+        sparse engine plant template for the solves.
+
+    Returns
+    -------
+    results : list of tuples
+        outputs of optimize_hydrogen_plant, in the same order as tasks.
+    '''
+    if template.engine != 'sparse':
+        raise ValueError('Batched plant optimization requires the sparse engine.')
+    results = [None]*len(tasks)
+    batch = []
+    for k, args in enumerate(tasks):
+        water_limit = args[7] if len(args) > 7 else None
+        if enough_water(args[3], water_limit) == False:
+            print('Not enough water to meet hydrogen demand!')
+            results[k] = (np.nan,)*6
+        else:
+            batch.append(k)
+    start = time.time()
+    solved = template.lp.optimize_batch([template.sparse_problem(*tasks[k][:2], *tasks[k][3:7])
+                                         for k in batch])
+    # share the solve time of the batch out over its plants
+    solve_time = (time.time() - start)/max(len(batch), 1)
+    for k, result in zip(batch, solved):
+        results[k] = result
+        template.solve_stats.append((solve_time, False))
+        print(result[0])
+    return results
+
+# plant template shared by all solves in this process
+_plant_template = None
+
+def get_plant_template(times, segments = None, engine = 'pypsa', solver = None):
+    '''
+    returns the plant template for this process, building it on first use or
+    when the timestamps, segments, engine or solver change.
+    '''
+    global _plant_template
+    if _plant_template is None or not _plant_template.matches(times, segments, engine, solver):
+        _plant_template = PlantTemplate(times, segments, engine = engine, solver = solver)
+    return _plant_template
+
+
+def solve_plant(args, warm_start = False, segments = None, engine = 'pypsa', solver = None):
+    '''
+    unpacks one set of positional arguments for optimize_hydrogen_plant so it
+    can be mapped over a process pool. Each process reuses one plant template.
+    Arguments can be StoreReferences, which are read from the capacity factor
+    store in the process that solves the plant.
+
+    Returns the optimize_hydrogen_plant outputs and the (solve time, warm
+    started) statistics of the solve.
+    '''
+    args = resolve(args)
+    times = args[2]
+    template = get_plant_template(times, segments, engine, solver)
+    solves = len(template.solve_stats)
+    result = optimize_hydrogen_plant(*args, template = template, warm_start = warm_start)
+    # plants without enough water are not solved
+    stats = template.solve_stats[-1] if len(template.solve_stats) > solves else None
+    return result, stats
+
+def solve_plant_batch(batch, segments = None, engine = 'sparse', solver = None):
+    '''
+    solves a batch of optimize_hydrogen_plant argument tuples in one solver
+    call, so batches can be mapped over a process pool.
+
+    Returns a list of the optimize_hydrogen_plant outputs and (here empty)
+    warm start statistics of each solve, as solve_plant does.
+    '''
+    batch = [resolve(args) for args in batch]
+    template = get_plant_template(batch[0][2], segments, engine, solver)
+    return [(result, None) for result in optimize_hydrogen_plant_batch(batch, template)]
+
+def solve_chunk(jobs, solve):
+    '''
+    solves a contiguous chunk of jobs in one worker process.
+    '''
+    return [solve(job) for job in jobs]
+
+def report_warm_start(stats):
+    '''
+    prints how much solve time warm starting saved, comparing warm-started
+    solves with the cold-started ones.
+    '''
+    cold = [t for t, warm in stats if not warm]
+    warm = [t for t, warm in stats if warm]
+    if len(cold) == 0 or len(warm) == 0:
+        return
+    saving = np.mean(cold) - np.mean(warm)
+    print(f'{len(warm)} warm-started solves averaged {np.mean(warm):.2f} s against '
+          f'{np.mean(cold):.2f} s for {len(cold)} cold starts, saving {saving:.2f} s per solve '
+          f'({saving*len(warm):.0f} s in total)')
+
+def hilbert_order(x, y, bits = 16):
+    '''
+    orders points along a Hilbert space-filling curve, so that points which
+    follow each other in the order are also close in space.
+
+    Parameters
+    ----------
+    x : numpy array
+        x coordinates of the points, e.g. longitudes.
+    y : numpy array
+        y coordinates of the points, e.g. latitudes.
+    bits : integer
+        resolution of the curve; coordinates are snapped to a grid of 2**bits cells per side.
+
+    Returns
+    -------
+    order : numpy array
+        indices that sort the points along the curve.
+    '''
+    side = 2**bits
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    # snap coordinates onto the integer grid of the curve
+    xi = np.round((x - x.min())/max(np.ptp(x), 1e-12)*(side-1)).astype(np.int64)
+    yi = np.round((y - y.min())/max(np.ptp(y), 1e-12)*(side-1)).astype(np.int64)
+    distance = np.zeros(len(x), dtype=np.int64)
+    s = side//2
+    while s > 0:
+        rx = ((xi & s) > 0).astype(np.int64)
+        ry = ((yi & s) > 0).astype(np.int64)
+        distance += s*s*((3*rx) ^ ry)
+        # rotate the quadrant so the curve stays continuous
+        flip = (ry == 0) & (rx == 1)
+        xi = np.where(flip, side-1-xi, xi)
+        yi = np.where(flip, side-1-yi, yi)
+        swap = ry == 0
+        xi, yi = np.where(swap, yi, xi), np.where(swap, xi, yi)
+        s //= 2
+    return np.argsort(distance, kind='stable')
+
+def run_plant_optimizations(tasks, processes = 1, warm_start = False, segments = None,
+                            engine = 'pypsa', batch_size = 1, solver = None, callback = None):
+    '''
+    solves a list of hydrogen plant optimizations, in parallel if requested.
+
+    Parameters
+    ----------
+    tasks : list of tuples
+        positional arguments for optimize_hydrogen_plant, one tuple per solve.
+    processes : int
+        number of worker processes to use. Default 1 solves serially in the
+        current process.
+    warm_start : boolean
+        whether to warm start each solve from the previous solve in the same
+        process. Tasks should be ordered so that neighbouring tasks are similar.
+        Default is False.
+    segments : numpy array
+        segment number of each timestamp, to solve time-aggregated plants.
+        Default is None, which solves at full resolution.
+    engine : string
+        'pypsa' or 'sparse', see PlantTemplate. Default 'pypsa'.
+    batch_size : int
+        number of plants to solve together in one block-diagonal LP. Default 1
+        solves each plant on its own. Batches need the sparse engine.
+    solver : dictionary
+        solver backend settings from solvers.solver_settings. Default is None,
+        which uses the default backend.
+    callback : function
+        called with the task index and result of each task as soon as its
+        chunk of work finishes, e.g. to checkpoint results. Default is None.
+
+    Returns
+    -------
+    results : list of tuples
+        outputs of optimize_hydrogen_plant, in the same order as tasks.
+    '''
+    if batch_size > 1:
+        # each batch is one unit of work, and its outputs are flattened below
+        solve = partial(solve_plant_batch, segments = segments, engine = engine, solver = solver)
+        jobs = [tasks[start:start+batch_size] for start in range(0, len(tasks), batch_size)]
+    else:
+        solve = partial(solve_plant, warm_start = warm_start, segments = segments,
+                        engine = engine, solver = solver)
+        jobs = tasks
+    outputs = [None]*len(tasks)
+
+    def collect(start, chunk_outputs):
+        # put the outputs of the chunk of jobs beginning at start in task order
+        if batch_size > 1:
+            chunk_outputs = [output for batch in chunk_outputs for output in batch]
+        for k, output in enumerate(chunk_outputs):
+            outputs[start*batch_size + k] = output
+            if callback is not None:
+                callback(start*batch_size + k, output[0])
+
+    if processes <= 1 or len(jobs) <= 1:
+        for start in range(len(jobs)):
+            collect(start, solve_chunk(jobs[start:start+1], solve))
+    else:
+        # hand each worker a few contiguous chunks to keep scheduling overhead
+        # low and so warm starts follow on from similar problems
+        chunksize = max(1, len(jobs)//(processes*4))
+        with ProcessPoolExecutor(max_workers = processes) as executor:
+            futures = {executor.submit(solve_chunk, jobs[start:start+chunksize], solve): start
+                       for start in range(0, len(jobs), chunksize)}
+            # collect chunks as they finish; outputs stay in task order
+            for future in as_completed(futures):
+                collect(futures[future], future.result())
+    if warm_start:
+        report_warm_start([stats for result, stats in outputs if stats is not None])
+    return [result for result, stats in outputs]
+
+
+def time_segments(pv_profile, wind_profile, aggregation_config):
+    '''
+    segments the year for time-aggregated plant optimization, based on the
+    average wind and solar potential over all hexagons.
+
+    Parameters
+    ----------
+    pv_profile : xarray DataArray
+        per-unit solar potential with dimensions hexagon and time.
+    wind_profile : xarray DataArray
+        per-unit wind potential with dimensions hexagon and time.
+    aggregation_config : dictionary
+        time_aggregation section of the config file.
+
+    Returns
+    -------
+    segments : numpy array
+        segment number of each timestamp, or None if aggregation is off.
+    '''
+    if aggregation_config["method"] == 'none':
+        return None
+    features = np.column_stack([pv_profile.mean('hexagon').values,
+                                wind_profile.mean('hexagon').values])
+    return segment_snapshots(features, aggregation_config["segments"],
+                             aggregation_config["method"])
+
+def run_screened_plant_optimizations(lower_bounds, other_costs, solve, margin = 0.1,
+                                     round_size = 200, known = None):
+    '''
+    solves plant optimizations in ascending order of a lower bound on their
+    total cost, skipping those whose lower bound is more than a margin above
+    the best exact total cost found so far. Every task whose lower bound is
+    within the margin of the final best total cost is solved.
+
+    Parameters
+    ----------
+    lower_bounds : numpy array
+        lower bound on the levelized cost of hydrogen of each task.
+    other_costs : numpy array
+        cost per kg of hydrogen of each task that doesn't depend on the plant,
+        such as transport and water costs.
+    solve : function
+        solves a list of task indices and returns their optimize_hydrogen_plant
+        outputs.
+    margin : float
+        relative margin over the best total cost within which tasks are still
+        solved. Default 0.1.
+    round_size : int
+        number of tasks to solve between updates of the best total cost.
+        Default 200.
+    known : dictionary
+        optimize_hydrogen_plant outputs of tasks solved before, by task index.
+        Default is None.
+
+    Returns
+    -------
+    results : list
+        optimize_hydrogen_plant outputs in task order, with None for the
+        tasks that were screened out.
+    '''
+    known = known or {}
+    other_costs = np.asarray(other_costs, dtype=float)
+    lower_totals = np.asarray(lower_bounds, dtype=float) + other_costs
+    # tasks without a total cost bound can't be screened, so solve them first
+    lower_totals = np.where(np.isnan(lower_totals), -np.inf, lower_totals)
+    results = [known.get(index) for index in range(len(lower_totals))]
+    best = np.inf
+
+    def update_best(index, result):
+        total = result[0] + other_costs[index]
+        return min(best, total) if not np.isnan(total) else best
+
+    for index, result in known.items():
+        best = update_best(index, result)
+    order = [index for index in np.argsort(lower_totals, kind='stable') if index not in known]
+    solved = 0
+    for start in range(0, len(order), round_size):
+        threshold = (1 + margin)*best
+        # keep task order within a round, so warm starts follow similar tasks
+        round_tasks = sorted(index for index in order[start:start+round_size]
+                             if lower_totals[index] <= threshold)
+        if len(round_tasks) == 0:
+            # tasks are in ascending order, so the remaining bounds are higher still
+            break
+        for index, result in zip(round_tasks, solve(round_tasks)):
+            results[index] = result
+            best = update_best(index, result)
+        solved += len(round_tasks)
+    print(f'{solved} plant optimizations solved after screening, '
+          f'{len(order) - solved} screened out by their lower bound')
+    return results
+
+def run_cached_plant_optimizations(tasks, keys, cache = None, processes = 1,
+                                   warm_start = False, segments = None, engine = 'pypsa',
+                                   batch_size = 1, solver = None, callback = None):
+    '''
+    solves a list of hydrogen plant optimizations, solving each distinct
+    problem once and reusing cached results where available.
+
+    Parameters
+    ----------
+    tasks : list of tuples
+        positional arguments for optimize_hydrogen_plant, one tuple per solve.
+    keys : list of strings
+        input hash of each task, from PlantTemplate.inputs_key.
+    cache : SolveCache
+        persistent store of earlier results. Default is None, which only
+        removes duplicate problems within tasks.
+    processes : int
+        number of worker processes to use. Default 1.
+    warm_start : boolean
+        whether to warm start solves. Default is False.
+    segments : numpy array
+        segment number of each timestamp, to solve time-aggregated plants.
+        Default is None.
+    engine : string
+        'pypsa' or 'sparse', see PlantTemplate. Default 'pypsa'.
+    batch_size : int
+        number of plants to solve in one LP. Default 1.
+    solver : dictionary
+        solver backend settings. Default is None.
+    callback : function
+        called with the task index and result of each task once it is known,
+        see run_plant_optimizations. Default is None.
+
+    Returns
+    -------
+    results : list of tuples
+        outputs of optimize_hydrogen_plant, in the same order as tasks.
+    '''
+    known = cache.get_many(keys) if cache is not None else {}
+    # first task for each problem that still needs solving, in task order
+    unsolved = {}
+    # indices of the tasks sharing each key
+    positions = {}
+    for index, (task, key) in enumerate(zip(tasks, keys)):
+        positions.setdefault(key, []).append(index)
+        if key not in known and key not in unsolved:
+            unsolved[key] = task
+    if callback is not None:
+        for key, result in known.items():
+            for index in positions[key]:
+                callback(index, result)
+    unsolved_keys = list(unsolved.keys())
+
+    def store(k, result):
+        # store each new result as soon as it is solved, so it survives a crash
+        if cache is not None:
+            cache.put(unsolved_keys[k], result)
+        if callback is not None:
+            for index in positions[unsolved_keys[k]]:
+                callback(index, result)
+
+    solved = run_plant_optimizations(list(unsolved.values()), processes, warm_start,
+                                     segments, engine, batch_size, solver, store)
+    known.update(zip(unsolved_keys, solved))
+    print(f'{len(tasks)} plant optimizations: {len(solved)} solved, '
+          f'{len(tasks)-len(solved)} reused from the cache or duplicate inputs')
+    return [known[key] for key in keys]
+
 
 if __name__ == "__main__":
-    transport_excel_path = str(snakemake.input.transport_parameters)
+    transport_workbook = load_workbook(str(snakemake.input.transport_parameters))
     country_excel_path = str(snakemake.input.country_parameters)
     demand_excel_path = str(snakemake.input.demand_parameters)
     country_parameters = pd.read_excel(country_excel_path,
@@ -203,26 +868,44 @@ if __name__ == "__main__":
     end_date = f'{end_weather_year}-01-01'
     
     hexagons = gpd.read_file(str(snakemake.input.hexagons))
-    cutout = atlite.Cutout(f'Cutouts/{snakemake.wildcards.country}_{snakemake.wildcards.weather_year}.nc')
-    layout = cutout.uniform_layout()
-
-    # can add hydro and other generators here
-    pv_profile = cutout.pv(
-        panel= 'CSi',
-        orientation='latitude_optimal',
-        layout = layout,
-        shapes = hexagons,
-        per_unit = True
-        )
-    pv_profile = pv_profile.rename(dict(dim_0='hexagon'))
-    
-    wind_profile = cutout.wind(
-        turbine = 'NREL_ReferenceTurbine_2020ATB_4MW',
-        layout = layout,
-        shapes = hexagons,
-        per_unit = True
-        )
-    wind_profile = wind_profile.rename(dict(dim_0='hexagon'))
+    profiles_folder = str(snakemake.input.profiles)
+    pv_profile, wind_profile = load_profiles(profiles_folder, hexagons)
+    # tasks refer to rows of the store, so workers read profiles from the
+    # shared memory-mapped store instead of receiving copies
+    profile_rows = {hexagon: row for row, hexagon in enumerate(pv_profile.hexagon.data)}
+    times_reference = StoreReference(profiles_folder, 'time')
+
+    # worker processes for plant optimization, set by the rule's threads
+    processes = snakemake.threads
+    warm_start = snakemake.config["plant_optimization"]["warm_start"]
+    cache_config = snakemake.config["plant_optimization"]["cache"]
+    cache = None
+    if cache_config["enable"]:
+        cache = SolveCache(cache_config["path"], cache_config["max_entries"])
+    segments = time_segments(pv_profile, wind_profile,
+                             snakemake.config["plant_optimization"]["time_aggregation"])
+    engine = snakemake.config["plant_optimization"]["engine"]
+    batch_size = snakemake.config["plant_optimization"]["batch_size"]
+    if batch_size > 1 and engine != 'sparse':
+        raise ValueError('Set the plant optimization engine to sparse to solve plants in batches.')
+    # template for hashing the plant inputs of each task
+    solver_config = snakemake.config["plant_optimization"]["solver"]
+    solver = solver_settings(solver_config["name"], solver_config["options"])
+    template = get_plant_template(wind_profile.time, segments, engine, solver)
+    screening_config = snakemake.config["plant_optimization"]["screening"]
+    # results of an earlier, interrupted run of this job
+    checkpoint = None
+    logged = {}
+    if snakemake.config["plant_optimization"]["checkpoint"]:
+        checkpoint = CheckpointLog(str(snakemake.params.checkpoint))
+        logged = checkpoint.results()
+    transport_types = ["trucking", "pipeline"]
+    hexagon_order = pv_profile.hexagon.data
+    if warm_start:
+        # solve neighbouring hexagons one after another so each warm start
+        # begins from a similar problem
+        centroids = hexagons.geometry.centroid
+        hexagon_order = hexagon_order[hilbert_order(centroids.x.values, centroids.y.values)]
 
     for location in demand_centers:
         # trucking variables
@@ -232,6 +915,8 @@ if __name__ == "__main__":
         t_electrolyzer_capacities= np.zeros(len(pv_profile.hexagon))
         t_battery_capacities = np.zeros(len(pv_profile.hexagon))
         t_h2_storages= np.zeros(len(pv_profile.hexagon))
+        t_screened_out = np.zeros(len(pv_profile.hexagon), dtype=bool)
+        t_lower_bounds = np.zeros(len(pv_profile.hexagon))
         
         # pipeline variables
         lcohs_pipeline = np.zeros(len(pv_profile.hexagon))
@@ -240,50 +925,142 @@ if __name__ == "__main__":
         p_electrolyzer_capacities= np.zeros(len(pv_profile.hexagon))
         p_battery_capacities = np.zeros(len(pv_profile.hexagon))
         p_h2_storages= np.zeros(len(pv_profile.hexagon))
+        p_screened_out = np.zeros(len(pv_profile.hexagon), dtype=bool)
+        p_lower_bounds = np.zeros(len(pv_profile.hexagon))
 
-        # function
-        for i in pv_profile.hexagon.data:
-            hydrogen_demand_trucking, hydrogen_demand_pipeline =\
-                demand_schedule(demand_parameters.loc[location,'Annual demand [kg/a]'],
-                                start_date,
-                                end_date,
-                                hexagons.loc[i,f'{location} trucking state'],
-                                transport_excel_path)
-            
-            country_series = country_parameters.loc[hexagons.country[i]]
+        # collect the plant optimization for each hexagon and transport type
+        tasks = []
+        task_keys = []
+        task_index = []
+        # hexagons with the same trucking state and country share one demand
+        # schedule and one country series, so each is sent to the workers once
+        # per chunk of tasks
+        demand_schedules = {}
+        country_series_by_country = {}
+        # hexagons out of range or without a road have no transport cost, and no plant to design
+        feasible = feasible_transport(hexagons, location, transport_types)
+        infeasible = []
+        for i in hexagon_order:
+            trucking_state = hexagons.loc[i,f'{location} trucking state']
+            if not feasible["trucking"][i]:
+                # the pipeline schedule is the same for any trucking state
+                trucking_state = "None"
+            if trucking_state not in demand_schedules:
+                demand_schedules[trucking_state] =\
+                    demand_schedule(demand_parameters.loc[location,'Annual demand [kg/a]'],
+                                    start_date,
+                                    end_date,
+                                    trucking_state,
+                                    transport_workbook)
+            hydrogen_demand_trucking, hydrogen_demand_pipeline = demand_schedules[trucking_state]
+
+            if hexagons.country[i] not in country_series_by_country:
+                country_series_by_country[hexagons.country[i]] = country_parameters.loc[hexagons.country[i]]
+            country_series = country_series_by_country[hexagons.country[i]]
             
-            transport_types = ["trucking", "pipeline"]
             for j in transport_types:
+                if not feasible[j][i]:
+                    infeasible.append((i, j))
+                    continue
                 if j == "trucking":
                     hydrogen_demand = hydrogen_demand_trucking
                 else:
                     hydrogen_demand = hydrogen_demand_pipeline
 
-                lcoh, wind_capacity, solar_capacity, electrolyzer_capacity, battery_capacity, h2_storage =\
-                    optimize_hydrogen_plant(wind_profile.sel(hexagon = i),
-                                            pv_profile.sel(hexagon = i),
-                                            wind_profile.time,
-                                            hydrogen_demand,
-                                            hexagons.loc[i,'theo_turbines'],
-                                            hexagons.loc[i,'theo_pv'],
-                                            country_series,
-                                            # water_limit = hexagons.loc[hexagon,'delta_water_m3']
-                                            )
-            
-                if j == "trucking":
-                    lcohs_trucking[i] = lcoh
-                    t_solar_capacities[i] = solar_capacity
-                    t_wind_capacities[i] = wind_capacity
-                    t_electrolyzer_capacities[i] = electrolyzer_capacity
-                    t_battery_capacities[i] = battery_capacity
-                    t_h2_storages[i] = h2_storage
-                else:
-                    lcohs_pipeline[i]=lcoh
-                    p_solar_capacities[i] = solar_capacity
-                    p_wind_capacities[i] = wind_capacity
-                    p_electrolyzer_capacities[i] = electrolyzer_capacity
-                    p_battery_capacities[i] = battery_capacity
-                    p_h2_storages[i] = h2_storage
+                wind_potential = wind_profile.sel(hexagon = i)
+                pv_potential = pv_profile.sel(hexagon = i)
+                tasks.append((StoreReference(profiles_folder, 'wind', profile_rows[i]),
+                              StoreReference(profiles_folder, 'pv', profile_rows[i]),
+                              times_reference,
+                              hydrogen_demand,
+                              hexagons.loc[i,'theo_turbines'],
+                              hexagons.loc[i,'theo_pv'],
+                              country_series,
+                              # water_limit = hexagons.loc[hexagon,'delta_water_m3']
+                              ))
+                task_keys.append(template.inputs_key(wind_potential,
+                                                     pv_potential,
+                                                     hydrogen_demand,
+                                                     hexagons.loc[i,'theo_turbines'],
+                                                     hexagons.loc[i,'theo_pv'],
+                                                     country_series))
+                task_index.append((i, j))
+
+        # work items logged with the same inputs are already solved
+        resumed = {k: logged[(location, int(i), j)][1]
+                   for k, ((i, j), key) in enumerate(zip(task_index, task_keys))
+                   if logged.get((location, int(i), j), (None,))[0] == key}
+        if checkpoint is not None:
+            print(f'{len(resumed)} of {len(tasks)} plant optimizations '
+                  f'for {location} resumed from the checkpoint log')
+        if infeasible:
+            print(f'{len(infeasible)} plant optimizations for {location} skipped '
+                  f'without feasible transport')
+
+        def solve_tasks(indices):
+            def log_result(k, result):
+                i, j = task_index[indices[k]]
+                checkpoint.append(location, i, j, task_keys[indices[k]], result)
+
+            return run_cached_plant_optimizations([tasks[k] for k in indices],
+                                                  [task_keys[k] for k in indices],
+                                                  cache, processes,
+                                                  warm_start, segments, engine, batch_size,
+                                                  solver,
+                                                  log_result if checkpoint is not None else None)
+
+        if screening_config["enable"]:
+            lower_bounds = np.array([template.lcoh_lower_bound(*resolve(task[:2]), *task[3:7])
+                                     for task in tasks])
+            # transport, conversion and water costs add to the production cost
+            other_costs = np.array([
+                hexagons.loc[i,f'{location} road construction costs']
+                + hexagons.loc[i,f'{location} trucking transport and conversion costs']
+                + hexagons.loc[i,'Lowest water cost'] if j == "trucking" else
+                hexagons.loc[i,f'{location} pipeline transport and conversion costs']
+                + hexagons.loc[i,'Lowest water cost']
+                for i, j in task_index])
+            results = run_screened_plant_optimizations(lower_bounds, other_costs, solve_tasks,
+                                                       screening_config["margin"],
+                                                       screening_config["round_size"],
+                                                       resumed)
+        else:
+            pending = [k for k in range(len(tasks)) if k not in resumed]
+            results = [resumed.get(k) for k in range(len(tasks))]
+            for k, result in zip(pending, solve_tasks(pending)):
+                results[k] = result
+        if checkpoint is not None:
+            # assemble the results from the log, which now holds every solved work item
+            logged = checkpoint.results()
+            results = [logged[(location, int(i), j)][1] if result is not None else None
+                       for (i, j), result in zip(task_index, results)]
+
+        # plants without feasible transport get empty results, like screened out ones
+        for k, ((i, j), result) in enumerate(zip(task_index + infeasible,
+                                                 results + [(np.nan,)*6]*len(infeasible))):
+            screened_out = result is None
+            if screened_out:
+                # plants screened out by their lower bound aren't solved
+                result = (np.nan,)*6
+            lcoh, wind_capacity, solar_capacity, electrolyzer_capacity, battery_capacity, h2_storage = result
+            if j == "trucking":
+                lcohs_trucking[i] = lcoh
+                t_solar_capacities[i] = solar_capacity
+                t_wind_capacities[i] = wind_capacity
+                t_electrolyzer_capacities[i] = electrolyzer_capacity
+                t_battery_capacities[i] = battery_capacity
+                t_h2_storages[i] = h2_storage
+                t_screened_out[i] = screened_out
+                t_lower_bounds[i] = lower_bounds[k] if screening_config["enable"] and k < len(tasks) else np.nan
+            else:
+                lcohs_pipeline[i]=lcoh
+                p_solar_capacities[i] = solar_capacity
+                p_wind_capacities[i] = wind_capacity
+                p_electrolyzer_capacities[i] = electrolyzer_capacity
+                p_battery_capacities[i] = battery_capacity
+                p_h2_storages[i] = h2_storage
+                p_screened_out[i] = screened_out
+                p_lower_bounds[i] = lower_bounds[k] if screening_config["enable"] and k < len(tasks) else np.nan
 
         # updating trucking hexagons
         hexagons[f'{location} trucking solar capacity'] = t_solar_capacities
@@ -293,6 +1070,9 @@ if __name__ == "__main__":
         hexagons[f'{location} trucking H2 storage capacity'] = t_h2_storages
         # save trucking LCOH
         hexagons[f'{location} trucking production cost'] = lcohs_trucking            
+        if screening_config["enable"]:
+            hexagons[f'{location} trucking screened out'] = t_screened_out
+            hexagons[f'{location} trucking production cost lower bound'] = t_lower_bounds
 
         # updating pipeline hexagons
         hexagons[f'{location} pipeline solar capacity'] = p_solar_capacities
@@ -303,5 +1083,14 @@ if __name__ == "__main__":
 
         # add optimal LCOH for each hexagon to hexagon file
         hexagons[f'{location} pipeline production cost'] = lcohs_pipeline
+        if screening_config["enable"]:
+            hexagons[f'{location} pipeline screened out'] = p_screened_out
+            hexagons[f'{location} pipeline production cost lower bound'] = p_lower_bounds
+
+    if cache is not None:
+        cache.close()
 
     hexagons.to_file(str(snakemake.output), driver='GeoJSON', encoding='utf-8')
+    # the results are saved, so the next run starts afresh
+    if checkpoint is not None:
+        checkpoint.remove()
@@ -17,13 +17,10 @@ Calculate cost of pipeline transport and demand profile based on optimal size
 import geopandas as gpd
 import numpy as np
 import pandas as pd
-from functions import CRF, cheapest_trucking_strategy, h2_conversion_stand, cheapest_pipeline_strategy
-from shapely.geometry import Point
-import shapely.geometry
-import shapely.wkt
-import geopy.distance
+from functions import CRF, cheapest_trucking_strategies, h2_conversion_stand, cheapest_pipeline_strategies
+from parameter_registry import load_workbook
+from distances import distance_matrix, containing_hexagons
 import os
-import json
 
 #%% Data Input
 
@@ -31,9 +28,10 @@ import json
 technology_parameters = str(snakemake.input.technology_parameters)
 demand_parameters = str(snakemake.input.demand_parameters)
 country_parameters = str(snakemake.input.country_parameters)
-conversion_parameters = str(snakemake.input.conversion_parameters)
-transport_parameters = str(snakemake.input.transport_parameters)
-pipeline_parameters = str(snakemake.input.pipeline_parameters)
+# cost parameter workbooks, parsed once and shared by all cost calculations
+conversion_parameters = load_workbook(str(snakemake.input.conversion_parameters))
+transport_parameters = load_workbook(str(snakemake.input.transport_parameters))
+pipeline_parameters = load_workbook(str(snakemake.input.pipeline_parameters))
 
 #%% load data from technology parameters Excel file
 
@@ -55,28 +53,19 @@ country_parameters = pd.read_excel(country_parameters,
 
 pipeline_construction = snakemake.config["transport"]["pipeline_construction"]
 road_construction = snakemake.config["transport"]["road_construction"]
+# maximum transport distance from each demand center, from the demand center list or the config
+max_distance = snakemake.config["transport"]["max_distance"]
+max_distances = pd.Series(np.inf if max_distance is None else float(max_distance),
+                          index=demand_center_list.index)
+if 'Max transport distance [km]' in demand_center_list.columns:
+    max_distances = demand_center_list['Max transport distance [km]'].astype(float).fillna(max_distances)
 
 road_capex_long = infra_data.at['Long road','CAPEX']
 road_capex_short = infra_data.at['Short road','CAPEX']
 road_opex = infra_data.at['Short road','OPEX']
 
-#%% Handle any hexagons at edges in the geojson which are labelled with a country we aren't analyzing
+# hexagons of the country being analyzed, from the filter_country_hexagons rule
 hexagon_path = str(snakemake.input.hexagons)
-# Read the GeoJSON file
-with open(hexagon_path, 'r') as file:
-    data = json.load(file)
-
-copied_list = data["features"].copy()
-
-# iterates through hexagons and removes ones that have a different country than the one we want
-for feature in copied_list:
-    # Access and modify properties
-    if feature['properties']['country'] != country_parameters.index.values[0]:
-        data['features'].remove(feature)
-
-# Write the modified GeoJSON back to the file
-with open(hexagon_path, 'w') as file:
-    json.dump(data, file)
 
 # Now, load the Hexagon file in geopandas
 hexagon = gpd.read_file(hexagon_path)
@@ -86,132 +75,96 @@ if not os.path.exists('Resources'):
     os.makedirs('Resources')
 
 #%% calculate cost of hydrogen state conversion and transportation for demand
-# loop through all demand centers-- limit this on continential scale
+# prices, interest rates and road distances of all hexagons, to cost them all at once
+electricity_prices = country_parameters.loc[hexagon['country'], 'Electricity price (euros/kWh)'].to_numpy()
+heat_prices = country_parameters.loc[hexagon['country'], 'Heat price (euros/kWh)'].to_numpy()
+plant_interest = country_parameters.loc[hexagon['country'], 'Plant interest rate'].to_numpy()
+infrastructure_interest = country_parameters.loc[hexagon['country'], 'Infrastructure interest rate'].to_numpy()
+infrastructure_lifetime = country_parameters.loc[hexagon['country'], 'Infrastructure lifetime (years)'].to_numpy()
+road_dist = hexagon['road_dist'].to_numpy()
+# geodesic distance from each hexagon to each demand center, reused from earlier runs if unchanged,
+# and NaN for hexagons beyond the demand center's maximum transport distance
+distances = distance_matrix(hexagon, demand_center_list, hexagon_path, max_distances)
+# hexagons each demand center lies in, found for all demand centers at once
+demand_hexagons = containing_hexagons(hexagon, demand_center_list)
+
+# loop through all demand centers, costing only the hexagons within range of each
 for d in demand_center_list.index:
-    demand_location = Point(demand_center_list.loc[d,'Lon [deg]'], demand_center_list.loc[d,'Lat [deg]'])
-    distance_to_demand = np.empty(len(hexagon))
     hydrogen_quantity = demand_center_list.loc[d,'Annual demand [kg/a]']
-    road_construction_costs = np.empty(len(hexagon))
-    trucking_states = np.empty(len(hexagon),dtype='<U10')
-    trucking_costs = np.empty(len(hexagon))
-    pipeline_costs = np.empty(len(hexagon))
     demand_state = demand_center_list.loc[d,'Demand state']
     demand_fid = 0
     if demand_state not in ['500 bar','LH2','NH3']:
         raise NotImplementedError(f'{demand_state} demand not supported.')
 
-    for i in range(len(hexagon)):
-        # calculate distance to demand for each hexagon
-        poly = shapely.wkt.loads(str(hexagon['geometry'][i]))
-        center = poly.centroid
-        demand_coords = (demand_center_list.loc[d,'Lat [deg]'], demand_center_list.loc[d,'Lon [deg]'])
-        hexagon_coords = (center.y, center.x)
-        dist = geopy.distance.geodesic(demand_coords, hexagon_coords).km
-        
-        distance_to_demand[i] = dist
-
-        #!!! maybe this is the place to set a restriction based on distance to demand center-- for all hexagons with a distance below some cutoff point
-        # label demand location under consideration
-        if hexagon['geometry'][i].contains(demand_location) == True:
-            ## label demand location under consideration
-            #demand_fid = i
-
-            # calculate cost of converting hydrogen to ammonia for local demand (i.e. no transport)
-            if demand_state == 'NH3':
-                local_conversion_cost =\
-                    h2_conversion_stand(demand_state+'_load',
-                                        hydrogen_quantity,
-                                        country_parameters.loc[hexagon['country'][i], 'Electricity price (euros/kWh)'],
-                                        country_parameters.loc[hexagon['country'][i], 'Heat price (euros/kWh)'],
-                                        country_parameters.loc[hexagon['country'][i],'Plant interest rate'],
-                                        conversion_parameters
-                                        )[2]/hydrogen_quantity
-
-                trucking_costs[i] = local_conversion_cost
-                pipeline_costs[i] = local_conversion_cost
-                trucking_states[i] = "None"
-                road_construction_costs[i] = 0.
-                continue
-            else:
-                local_conversion_cost =\
-                    h2_conversion_stand(demand_state,
-                                        hydrogen_quantity,
-                                        country_parameters.loc[hexagon['country'][i], 'Electricity price (euros/kWh)'],
-                                        country_parameters.loc[hexagon['country'][i], 'Heat price (euros/kWh)'],
-                                        country_parameters.loc[hexagon['country'][i],'Plant interest rate'],
-                                        conversion_parameters
-                                        )[2]/hydrogen_quantity
-                trucking_costs[i] = local_conversion_cost
-                pipeline_costs[i] = local_conversion_cost
-                trucking_states[i] = "None"
-                road_construction_costs[i] = 0.
-                continue
-        # determine elec_cost at demand to determine potential energy costs
-        # calculate cost of constructing a road to each hexagon
-        if road_construction == True:
-            if hexagon['road_dist'][i]==0:
-                road_construction_costs[i] = 0.
-            elif hexagon['road_dist'][i]!=0 and hexagon['road_dist'][i]<10:
-                road_construction_costs[i] = hexagon['road_dist'][i]\
-                    *road_capex_short*CRF(
-                        country_parameters.loc[hexagon['country'][i],'Infrastructure interest rate'],
-                        country_parameters.loc[hexagon['country'][i],'Infrastructure lifetime (years)'])\
-                    +hexagon['road_dist'][i]*road_opex
-            else:
-                road_construction_costs[i] = hexagon['road_dist'][i]*road_capex_long*CRF(
-                    country_parameters.loc[hexagon['country'][i],'Infrastructure interest rate'],
-                    country_parameters.loc[hexagon['country'][i],'Infrastructure lifetime (years)'])\
-                +hexagon['road_dist'][i]*road_opex
-                
-            trucking_cost, trucking_state =\
-                cheapest_trucking_strategy(demand_state,
-                                            hydrogen_quantity,
-                                            distance_to_demand[i],
-                                            country_parameters.loc[hexagon.country[i],'Electricity price (euros/kWh)'],
-                                            country_parameters.loc[hexagon.country[i],'Heat price (euros/kWh)'],
-                                            country_parameters.loc[hexagon['country'][i],'Infrastructure interest rate'],
-                                            conversion_parameters,
-                                            transport_parameters,
-                                            country_parameters.loc[hexagon.country[demand_fid],'Electricity price (euros/kWh)'],
-                                            )
-            trucking_costs[i] = trucking_cost
-            trucking_states[i] = trucking_state
-
-        elif hexagon['road_dist'][i]==0:
-            trucking_cost, trucking_state =\
-                cheapest_trucking_strategy(demand_state,
-                                            hydrogen_quantity,
-                                            distance_to_demand[i],
-                                            country_parameters.loc[hexagon.country[i],'Electricity price (euros/kWh)'],
-                                            country_parameters.loc[hexagon.country[i],'Heat price (euros/kWh)'],
-                                            country_parameters.loc[hexagon['country'][i],'Infrastructure interest rate'],
-                                            conversion_parameters,
-                                            transport_parameters,
-                                            country_parameters.loc[hexagon.country[demand_fid],'Electricity price (euros/kWh)'],
-                                            )
-            trucking_costs[i] = trucking_cost
-            trucking_states[i] = trucking_state
-
-        elif hexagon['road_dist'][i]>0: 
-            trucking_costs[i] = np.nan
-            trucking_states[i] = np.nan
-        # pipeline costs
-        if pipeline_construction== True:
-        
-            pipeline_cost, pipeline_type =\
-                cheapest_pipeline_strategy(demand_state,
-                                          hydrogen_quantity,
-                                          distance_to_demand[i],
-                                        country_parameters.loc[hexagon.country[i],'Electricity price (euros/kWh)'],
-                                        country_parameters.loc[hexagon.country[i],'Heat price (euros/kWh)'],
-                                        country_parameters.loc[hexagon['country'][i],'Infrastructure interest rate'],
-                                        conversion_parameters,
-                                        pipeline_parameters,
-                                        country_parameters.loc[hexagon.country[demand_fid],'Electricity price (euros/kWh)'],
-                                          )
-            pipeline_costs[i] = pipeline_cost
-        else:
-            pipeline_costs[i] = np.nan
+    distance_to_demand = distances[d].to_numpy()
+    # hexagons beyond the maximum transport distance can't supply this demand center
+    in_range = np.flatnonzero(~np.isnan(distance_to_demand))
+    # label demand location under consideration
+    local_demand = demand_hexagons[d]
+
+    # determine elec_cost at demand to determine potential energy costs
+    elec_costs_demand = electricity_prices[demand_fid]
+
+    # calculate cost of constructing a road to each hexagon
+    if road_construction == True:
+        road_capex = np.where(road_dist < 10, road_capex_short, road_capex_long)
+        road_construction_costs = np.where(road_dist == 0, 0.,
+                                           road_dist*road_capex*CRF(infrastructure_interest,
+                                                                    infrastructure_lifetime)
+                                           + road_dist*road_opex)
+    else:
+        road_construction_costs = np.zeros(len(hexagon))
+    road_construction_costs[np.isnan(distance_to_demand)] = np.nan
+
+    trucking_costs = np.full(len(hexagon), np.nan)
+    trucking_states = np.full(len(hexagon), 'nan', dtype='<U10')
+    if in_range.size > 0:
+        trucking_costs[in_range], trucking_states[in_range] =\
+            cheapest_trucking_strategies(demand_state,
+                                         hydrogen_quantity,
+                                         distance_to_demand[in_range],
+                                         electricity_prices[in_range],
+                                         heat_prices[in_range],
+                                         infrastructure_interest[in_range],
+                                         conversion_parameters,
+                                         transport_parameters,
+                                         elec_costs_demand,
+                                         )
+    # without road construction, only hexagons on a road can truck hydrogen
+    if road_construction != True:
+        trucking_costs[road_dist > 0] = np.nan
+        trucking_states[road_dist > 0] = np.nan
+
+    # pipeline costs
+    pipeline_costs = np.full(len(hexagon), np.nan)
+    if pipeline_construction== True and in_range.size > 0:
+        pipeline_costs[in_range] =\
+            cheapest_pipeline_strategies(demand_state,
+                                         hydrogen_quantity,
+                                         distance_to_demand[in_range],
+                                         electricity_prices[in_range],
+                                         heat_prices[in_range],
+                                         infrastructure_interest[in_range],
+                                         conversion_parameters,
+                                         pipeline_parameters,
+                                         elec_costs_demand,
+                                         )[0]
+
+    # calculate cost of converting hydrogen for local demand (i.e. no transport)
+    if local_demand.size > 0:
+        local_state = demand_state+'_load' if demand_state == 'NH3' else demand_state
+        local_conversion_cost =\
+            h2_conversion_stand(local_state,
+                                hydrogen_quantity,
+                                electricity_prices[local_demand],
+                                heat_prices[local_demand],
+                                plant_interest[local_demand],
+                                conversion_parameters
+                                )[2]/hydrogen_quantity
+        trucking_costs[local_demand] = local_conversion_cost
+        pipeline_costs[local_demand] = local_conversion_cost
+        trucking_states[local_demand] = "None"
+        road_construction_costs[local_demand] = 0.
 
     # variables to save for each demand scenario
     hexagon[f'{d} road construction costs'] = road_construction_costs/hydrogen_quantity
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+Registry of the parameter workbooks in Parameters/{country}.
+
+Each workbook is parsed once per process, the first time it is used, and kept
+in memory. Sheets listing one value per 'Parameter' become read-only
+ParameterSheet records, so cost functions can look up parameters without
+parsing Excel files on every call. Other sheets, such as the tables of
+demand centers and countries, are kept as DataFrames.
+
+Cost functions accept either a loaded workbook or the path to it. Paths are
+loaded through the same memoised loader, and reloaded if the file changes.
+
+"""
+
+import os
+from collections.abc import Mapping
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+
+class ParameterSheet(Mapping):
+    '''
+    read-only parameters of one workbook sheet, by parameter name. Numbers
+    are stored as floats and everything else as strings.
+
+    Parameters
+    ----------
+    name : string
+        name of the sheet.
+    values : pandas Series
+        value of each parameter, indexed by parameter name.
+    '''
+    def __init__(self, name, values):
+        self._name = name
+        self._values = {str(parameter): float(value) if isinstance(value, (int, float, np.number))
+                        and not isinstance(value, bool) else str(value)
+                        for parameter, value in values.items()}
+
+    @property
+    def name(self):
+        return self._name
+
+    def __getitem__(self, parameter):
+        return self._values[parameter]
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def __len__(self):
+        return len(self._values)
+
+    def __repr__(self):
+        return f'ParameterSheet({self._name!r}, {self._values!r})'
+
+class Workbook(Mapping):
+    '''
+    read-only sheets of one parameter workbook, by sheet name.
+
+    Parameters
+    ----------
+    path : string
+        path the workbook was loaded from.
+    sheets : dictionary
+        ParameterSheet or pandas DataFrame of each sheet, by sheet name.
+    '''
+    def __init__(self, path, sheets):
+        self._path = path
+        self._sheets = dict(sheets)
+
+    @property
+    def path(self):
+        return self._path
+
+    def __getitem__(self, sheet):
+        return self._sheets[sheet]
+
+    def __iter__(self):
+        return iter(self._sheets)
+
+    def __len__(self):
+        return len(self._sheets)
+
+    def __repr__(self):
+        return f'Workbook({self._path!r}, sheets={list(self._sheets)!r})'
+
+@lru_cache(maxsize=None)
+def _read_workbook(path, modified):
+    '''
+    parses every sheet of a workbook. Cached by path and modification time.
+    '''
+    sheets = {}
+    for name, table in pd.read_excel(path, sheet_name=None).items():
+        if 'Parameter' in table.columns and table.shape[1] == 2:
+            sheets[name] = ParameterSheet(name, table.set_index('Parameter').squeeze('columns'))
+        else:
+            sheets[name] = table
+    return Workbook(path, sheets)
+
+def load_workbook(path):
+    '''
+    returns the parsed sheets of a parameter workbook, parsing it only the
+    first time it is used in this process or when it has changed since.
+
+    Parameters
+    ----------
+    path : string
+        path to the workbook, e.g. 'Parameters/NA/transport_parameters.xlsx'.
+
+    Returns
+    -------
+    workbook : Workbook
+        read-only sheets of the workbook, by sheet name.
+    '''
+    path = os.path.normpath(str(path))
+    return _read_workbook(path, os.path.getmtime(path))
+
+def parameter_sheet(workbook, sheet):
+    '''
+    returns the parameters of one sheet of a workbook.
+
+    Parameters
+    ----------
+    workbook : Workbook or string
+        loaded workbook, or path to the workbook.
+    sheet : string
+        name of the sheet.
+
+    Returns
+    -------
+    parameters : ParameterSheet
+        read-only value of each parameter on the sheet, by parameter name.
+    '''
+    if not isinstance(workbook, Workbook):
+        workbook = load_workbook(workbook)
+    return workbook[sheet]
+
+def parameter_registry(folder):
+    '''
+    loads every parameter workbook in a folder.
+
+    Parameters
+    ----------
+    folder : string
+        folder of the workbooks, e.g. 'Parameters/NA'.
+
+    Returns
+    -------
+    registry : dictionary
+        Workbook of each workbook in the folder, by file name without the
+        extension, e.g. 'transport_parameters'.
+    '''
+    return {os.path.splitext(name)[0]: load_workbook(os.path.join(folder, name))
+            for name in sorted(os.listdir(folder))
+            if name.endswith('.xlsx') and not name.startswith('~$')}
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+Checks that the sparse plant LP engine gives the same results as the PyPSA
+engine, on a random sample of hexagons.
+
+"""
+
+import geopandas as gpd
+import pandas as pd
+import numpy as np
+import time
+from optimize_hydrogen_plant import demand_schedule, feasible_transport, optimize_hydrogen_plant,\
+    PlantTemplate, time_segments
+from cf_store import load_profiles
+from solvers import solver_settings
+
+OUTPUTS = ['LCOH', 'wind capacity', 'solar capacity', 'electrolyzer capacity',
+           'battery capacity', 'H2 storage capacity']
+
+if __name__ == "__main__":
+    transport_excel_path = str(snakemake.input.transport_parameters)
+    country_excel_path = str(snakemake.input.country_parameters)
+    demand_excel_path = str(snakemake.input.demand_parameters)
+    country_parameters = pd.read_excel(country_excel_path,
+                                        index_col='Country')
+    demand_parameters = pd.read_excel(demand_excel_path,
+                                      index_col='Demand center',
+                                      ).squeeze("columns")
+    demand_centers = demand_parameters.index
+    plant_config = snakemake.config["plant_optimization"]
+
+    weather_year = snakemake.wildcards.weather_year
+    end_weather_year = int(snakemake.wildcards.weather_year)+1
+    start_date = f'{weather_year}-01-01'
+    end_date = f'{end_weather_year}-01-01'
+
+    hexagons = gpd.read_file(str(snakemake.input.hexagons))
+    pv_profile, wind_profile = load_profiles(str(snakemake.input.profiles), hexagons)
+
+    # compare the engines at the configured time resolution
+    segments = time_segments(pv_profile, wind_profile, plant_config["time_aggregation"])
+    solver = solver_settings(plant_config["solver"]["name"], plant_config["solver"]["options"])
+    templates = {engine: PlantTemplate(wind_profile.time, segments, engine = engine, solver = solver)
+                 for engine in ['pypsa', 'sparse']}
+
+    records = []
+    for location in demand_centers:
+        # hexagons without a trucking state have no demand schedule, and no plant
+        # to design, as in the plant optimization
+        feasible = feasible_transport(hexagons, location)
+        candidates = pv_profile.hexagon.data[feasible["trucking"].loc[pv_profile.hexagon.data].values]
+        # same sample of hexagons on every run
+        rng = np.random.default_rng(0)
+        sample = rng.choice(candidates,
+                            size=min(plant_config["engine_report_sample"], len(candidates)),
+                            replace=False)
+        for i in sorted(sample):
+            hydrogen_demand_trucking, hydrogen_demand_pipeline =\
+                demand_schedule(demand_parameters.loc[location,'Annual demand [kg/a]'],
+                                start_date,
+                                end_date,
+                                hexagons.loc[i,f'{location} trucking state'],
+                                transport_excel_path)
+            country_series = country_parameters.loc[hexagons.country[i]]
+            for j, hydrogen_demand in [("trucking", hydrogen_demand_trucking),
+                                       ("pipeline", hydrogen_demand_pipeline)]:
+                if not feasible[j][i]:
+                    continue
+                record = {'Demand center': location, 'Hexagon': i, 'Transport': j}
+                for engine, template in templates.items():
+                    start = time.time()
+                    results = optimize_hydrogen_plant(wind_profile.sel(hexagon = i),
+                                                      pv_profile.sel(hexagon = i),
+                                                      wind_profile.time,
+                                                      hydrogen_demand,
+                                                      hexagons.loc[i,'theo_turbines'],
+                                                      hexagons.loc[i,'theo_pv'],
+                                                      country_series,
+                                                      template = template)
+                    for output, value in zip(OUTPUTS, results):
+                        record[f'{engine} {output}'] = value
+                    record[f'{engine} solve time (s)'] = time.time() - start
+                records.append(record)
+
+    report = pd.DataFrame(records)
+    report['Relative LCOH difference'] = (report['sparse LCOH'] - report['pypsa LCOH'])/report['pypsa LCOH']
+    report['Speedup'] = report['pypsa solve time (s)']/report['sparse solve time (s)']
+    report.to_csv(str(snakemake.output), index=False)
+
+    # capacities can differ between equally cheap plants, so only LCOH is checked
+    difference = report['Relative LCOH difference'].abs().max()
+    print(f"maximum relative LCOH difference between engines {difference:.2e}")
+    print(f"median speedup of the sparse engine {report['Speedup'].median():.1f}x")
+    if not difference <= 1e-6:
+        raise ValueError(f'Sparse and PyPSA plant engines differ by up to {difference:.2e} in LCOH.')
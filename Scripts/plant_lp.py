@@ -0,0 +1,431 @@
+# -*- coding: utf-8 -*-
+"""
+Hydrogen plant linear program assembled directly as sparse matrices.
+
+An alternative to building the plant with PyPSA for every solve. The plant
+components are read from the same CSVs in `Parameters/Basic_H2_plant` and the
+LP is built with the same formulation as PyPSA's linear optimal power flow,
+vectorised over snapshots, then passed straight to the HiGHS solver.
+
+"""
+
+import os
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.optimize import linprog
+
+# PyPSA defaults for the component attributes used in the plant LP
+COMPONENT_DEFAULTS = {
+    'generators': {'p_nom': 0., 'p_nom_extendable': False, 'p_nom_min': 0., 'p_nom_max': np.inf,
+                   'p_min_pu': 0., 'p_max_pu': 1., 'capital_cost': 0., 'marginal_cost': 0.},
+    'links': {'p_nom': 0., 'p_nom_extendable': False, 'p_nom_min': 0., 'p_nom_max': np.inf,
+              'p_min_pu': 0., 'p_max_pu': 1., 'capital_cost': 0., 'marginal_cost': 0.,
+              'efficiency': 1., 'bus2': np.nan, 'efficiency2': 1.},
+    'storage_units': {'p_nom': 0., 'p_nom_extendable': False, 'p_nom_min': 0., 'p_nom_max': np.inf,
+                      'p_min_pu': -1., 'p_max_pu': 1., 'capital_cost': 0., 'marginal_cost': 0.,
+                      'max_hours': 1., 'efficiency_store': 1., 'efficiency_dispatch': 1.,
+                      'standing_loss': 0., 'cyclic_state_of_charge': False,
+                      'state_of_charge_initial': 0.},
+    'stores': {'e_nom': 0., 'e_nom_extendable': False, 'e_nom_min': 0., 'e_nom_max': np.inf,
+               'e_min_pu': 0., 'e_max_pu': 1., 'capital_cost': 0., 'marginal_cost': 0.,
+               'standing_loss': 0., 'e_cyclic': False, 'e_initial': 0.},
+    }
+
+def read_plant_components(plant_path = "Parameters/Basic_H2_plant"):
+    '''
+    reads the hydrogen plant design CSVs, filling in PyPSA's default values.
+
+    Parameters
+    ----------
+    plant_path : string
+        folder with the hydrogen plant design CSVs.
+
+    Returns
+    -------
+    components : dictionary
+        pandas DataFrame of each component type, indexed by component name.
+    '''
+    components = {}
+    for component, defaults in COMPONENT_DEFAULTS.items():
+        path = os.path.join(plant_path, f'{component}.csv')
+        if os.path.exists(path):
+            # some CSVs are saved with a byte order mark
+            df = pd.read_csv(path, index_col='name', encoding='utf-8-sig')
+        else:
+            df = pd.DataFrame(index=pd.Index([], name='name'))
+        for attribute, default in defaults.items():
+            if attribute not in df.columns:
+                df[attribute] = default
+            elif not isinstance(default, (bool, str)) and default == default:
+                df[attribute] = df[attribute].fillna(default)
+        components[component] = df
+    return components
+
+class LinearProgram:
+    '''
+    collects variables and constraints of a linear program in sparse
+    coordinate form.
+    '''
+    def __init__(self):
+        self.size = 0
+        self.lower = []
+        self.upper = []
+        self.cost = []
+        self.rows = {'eq': 0, 'ub': 0}
+        self.entries = {'eq': ([], [], []), 'ub': ([], [], [])}
+        self.rhs = {'eq': [], 'ub': []}
+
+    def add_variables(self, size, lower = 0., upper = np.inf, cost = 0.):
+        '''
+        adds a block of variables and returns their indices.
+        '''
+        index = np.arange(self.size, self.size + size)
+        self.size += size
+        self.lower.append(np.broadcast_to(np.asarray(lower, dtype=float), (size,)))
+        self.upper.append(np.broadcast_to(np.asarray(upper, dtype=float), (size,)))
+        self.cost.append(np.broadcast_to(np.asarray(cost, dtype=float), (size,)))
+        return index
+
+    def add_constraints(self, sense, terms, rhs):
+        '''
+        adds a block of constraints, sum of coefficient * variable over the
+        terms == rhs (sense 'eq') or <= rhs (sense 'ub').
+
+        Parameters
+        ----------
+        sense : string
+            'eq' or 'ub'.
+        terms : list of tuples
+            (coefficients, variable indices) pairs. Each broadcasts to one
+            entry per constraint in the block.
+        rhs : numpy array
+            right-hand side of each constraint.
+        '''
+        rhs = np.atleast_1d(np.asarray(rhs, dtype=float))
+        size = len(rhs)
+        rows = np.arange(self.rows[sense], self.rows[sense] + size)
+        row_entries, column_entries, value_entries = self.entries[sense]
+        for coefficients, variables in terms:
+            coefficients = np.broadcast_to(np.asarray(coefficients, dtype=float), (size,))
+            variables = np.broadcast_to(variables, (size,))
+            nonzero = coefficients != 0
+            row_entries.append(rows[nonzero])
+            column_entries.append(variables[nonzero])
+            value_entries.append(coefficients[nonzero])
+        self.rhs[sense].append(rhs)
+        self.rows[sense] += size
+
+    def matrices(self):
+        '''
+        returns the cost vector, variable bounds and the constraint matrices
+        in CSR format with their right-hand sides.
+        '''
+        def matrix(sense):
+            rows, columns, values = (np.concatenate(entries) if len(entries) > 0 else np.array([])
+                                     for entries in self.entries[sense])
+            shape = (self.rows[sense], self.size)
+            return sparse.csr_matrix((values, (rows.astype(int), columns.astype(int))), shape=shape),\
+                np.concatenate(self.rhs[sense]) if len(self.rhs[sense]) > 0 else np.array([])
+        A_eq, b_eq = matrix('eq')
+        A_ub, b_ub = matrix('ub')
+        return (np.concatenate(self.cost), np.concatenate(self.lower), np.concatenate(self.upper),
+                A_ub, b_ub, A_eq, b_eq)
+
+def build_plant_lp(components, p_max_pu, loads, capital_costs, weights):
+    '''
+    assembles the hydrogen plant LP with PyPSA's formulation.
+
+    Parameters
+    ----------
+    components : dictionary
+        plant components from read_plant_components, with any hexagon-specific
+        nominal limits already applied.
+    p_max_pu : dictionary
+        per-unit availability time series of generators, by generator name.
+    loads : dictionary
+        demand time series in MW, by bus name.
+    capital_costs : dictionary
+        annualised capital cost of each component type, pandas Series by component name.
+    weights : numpy array
+        hours represented by each snapshot.
+
+    Returns
+    -------
+    lp : LinearProgram
+        assembled linear program.
+    nominal : dictionary
+        variable index of the optimal capacity of each (component type, name).
+    '''
+    lp = LinearProgram()
+    weights = np.asarray(weights, dtype=float)
+    snapshots = len(weights)
+    # terms of the energy balance at each bus
+    balance = {}
+
+    def inject(bus, coefficients, variables):
+        balance.setdefault(bus, []).append((coefficients, variables))
+
+    def nominal_variable(df, name, attribute, cost):
+        if df.at[name, f'{attribute}_extendable']:
+            return lp.add_variables(1, df.at[name, f'{attribute}_min'],
+                                    df.at[name, f'{attribute}_max'], cost)[0]
+        # capacity is fixed and not part of the objective
+        return lp.add_variables(1, df.at[name, attribute], df.at[name, attribute])[0]
+
+    def dispatch_limits(df, name, p, nom, p_min_pu, p_max_pu):
+        # p <= p_max_pu * p_nom and p >= p_min_pu * p_nom
+        lp.add_constraints('ub', [(1., p), (-np.asarray(p_max_pu), nom)], np.zeros(snapshots))
+        if np.any(np.asarray(p_min_pu) != 0):
+            lp.add_constraints('ub', [(-1., p), (np.asarray(p_min_pu), nom)], np.zeros(snapshots))
+
+    def previous(variables, cyclic):
+        # state in the snapshot before; the first snapshot wraps around when cyclic
+        return np.roll(variables, 1), np.r_[float(cyclic), np.ones(snapshots-1)]
+
+    nominal = {}
+    df = components['generators']
+    for name in df.index:
+        nom = nominal_variable(df, name, 'p_nom', capital_costs['generators'][name])
+        p_min_pu = df.at[name, 'p_min_pu']
+        p = lp.add_variables(snapshots, -np.inf if p_min_pu < 0 else 0.,
+                             cost=df.at[name, 'marginal_cost']*weights)
+        dispatch_limits(df, name, p, nom, p_min_pu, p_max_pu.get(name, df.at[name, 'p_max_pu']))
+        inject(df.at[name, 'bus'], 1., p)
+        nominal[('generators', name)] = nom
+
+    df = components['links']
+    for name in df.index:
+        nom = nominal_variable(df, name, 'p_nom', capital_costs['links'][name])
+        p_min_pu = df.at[name, 'p_min_pu']
+        p = lp.add_variables(snapshots, -np.inf if p_min_pu < 0 else 0.,
+                             cost=df.at[name, 'marginal_cost']*weights)
+        dispatch_limits(df, name, p, nom, p_min_pu, df.at[name, 'p_max_pu'])
+        inject(df.at[name, 'bus0'], -1., p)
+        inject(df.at[name, 'bus1'], df.at[name, 'efficiency'], p)
+        if isinstance(df.at[name, 'bus2'], str) and df.at[name, 'bus2'] != '':
+            inject(df.at[name, 'bus2'], df.at[name, 'efficiency2'], p)
+        nominal[('links', name)] = nom
+
+    df = components['storage_units']
+    for name in df.index:
+        nom = nominal_variable(df, name, 'p_nom', capital_costs['storage_units'][name])
+        dispatch = lp.add_variables(snapshots, cost=df.at[name, 'marginal_cost']*weights)
+        store = lp.add_variables(snapshots)
+        soc = lp.add_variables(snapshots)
+        lp.add_constraints('ub', [(1., dispatch), (-df.at[name, 'p_max_pu'], nom)], np.zeros(snapshots))
+        lp.add_constraints('ub', [(1., store), (df.at[name, 'p_min_pu'], nom)], np.zeros(snapshots))
+        lp.add_constraints('ub', [(1., soc), (-df.at[name, 'max_hours'], nom)], np.zeros(snapshots))
+        # soc = standing efficiency * previous soc + stored - dispatched energy
+        standing = (1 - df.at[name, 'standing_loss'])**weights
+        previous_soc, has_previous = previous(soc, df.at[name, 'cyclic_state_of_charge'])
+        rhs = np.zeros(snapshots)
+        rhs[0] = (1 - has_previous[0])*standing[0]*df.at[name, 'state_of_charge_initial']
+        lp.add_constraints('eq', [(1., soc),
+                                  (-standing*has_previous, previous_soc),
+                                  (-weights*df.at[name, 'efficiency_store'], store),
+                                  (weights/df.at[name, 'efficiency_dispatch'], dispatch)],
+                           rhs)
+        inject(df.at[name, 'bus'], 1., dispatch)
+        inject(df.at[name, 'bus'], -1., store)
+        nominal[('storage_units', name)] = nom
+
+    df = components['stores']
+    for name in df.index:
+        nom = nominal_variable(df, name, 'e_nom', capital_costs['stores'][name])
+        p = lp.add_variables(snapshots, -np.inf, np.inf, cost=df.at[name, 'marginal_cost']*weights)
+        e = lp.add_variables(snapshots, -np.inf if df.at[name, 'e_min_pu'] < 0 else 0.)
+        dispatch_limits(df, name, e, nom, df.at[name, 'e_min_pu'], df.at[name, 'e_max_pu'])
+        # e = standing efficiency * previous e - dispatched energy
+        standing = (1 - df.at[name, 'standing_loss'])**weights
+        previous_e, has_previous = previous(e, df.at[name, 'e_cyclic'])
+        rhs = np.zeros(snapshots)
+        rhs[0] = (1 - has_previous[0])*standing[0]*df.at[name, 'e_initial']
+        lp.add_constraints('eq', [(1., e), (-standing*has_previous, previous_e), (weights, p)], rhs)
+        inject(df.at[name, 'bus'], 1., p)
+        nominal[('stores', name)] = nom
+
+    for bus, terms in balance.items():
+        lp.add_constraints('eq', terms, loads.get(bus, np.zeros(snapshots)))
+    return lp, nominal
+
+def solve_lp(lp, method = 'highs', options = None):
+    '''
+    solves a linear program with HiGHS.
+
+    Parameters
+    ----------
+    lp : LinearProgram
+        problem to solve.
+    method : string
+        SciPy linprog HiGHS method: 'highs' (HiGHS chooses), 'highs-ds' (dual
+        simplex) or 'highs-ipm' (interior point). Default 'highs'.
+    options : dictionary
+        linprog options for the method. Default is None.
+
+    Returns
+    -------
+    x : numpy array
+        optimal variable values, or None if no optimum was found.
+    objective : float
+        optimal objective value, or NaN if no optimum was found.
+    '''
+    c, lower, upper, A_ub, b_ub, A_eq, b_eq = lp.matrices()
+    result = linprog(c, A_ub=A_ub, b_ub=b_ub, A_eq=A_eq, b_eq=b_eq,
+                     bounds=np.column_stack([lower, upper]), method=method, options=options)
+    if result.status != 0:
+        print(f'Plant LP not solved: {result.message}')
+        return None, np.nan
+    return result.x, result.fun
+
+def solve_lp_batch(lps, method = 'highs', options = None):
+    '''
+    solves independent linear programs in one solver call by stacking them
+    into a block-diagonal LP.
+
+    Parameters
+    ----------
+    lps : list of LinearProgram
+        problems to solve.
+    method : string
+        SciPy linprog HiGHS method, see solve_lp. Default 'highs'.
+    options : dictionary
+        linprog options for the method. Default is None.
+
+    Returns
+    -------
+    solutions : list of tuples
+        (x, objective) of each problem, as returned by solve_lp.
+    '''
+    if len(lps) == 1:
+        return [solve_lp(lps[0], method, options)]
+    parts = [lp.matrices() for lp in lps]
+    c, lower, upper, b_ub, b_eq = (np.concatenate([part[k] for part in parts])
+                                   for k in [0, 1, 2, 4, 6])
+    A_ub = sparse.block_diag([part[3] for part in parts], format='csr')
+    A_eq = sparse.block_diag([part[5] for part in parts], format='csr')
+    result = linprog(c, A_ub=A_ub, b_ub=b_ub, A_eq=A_eq, b_eq=b_eq,
+                     bounds=np.column_stack([lower, upper]), method=method, options=options)
+    if result.status != 0:
+        # one infeasible problem fails the whole batch, so solve them
+        # separately to keep the solutions of the others
+        return [solve_lp(lp, method, options) for lp in lps]
+    offsets = np.cumsum([0] + [lp.size for lp in lps])
+    solutions = []
+    for k in range(len(lps)):
+        x = result.x[offsets[k]:offsets[k+1]]
+        solutions.append((x, np.dot(c[offsets[k]:offsets[k+1]], x)))
+    return solutions
+
+class PlantLP:
+    '''
+    hydrogen plant LP engine built from the plant design CSVs once and solved
+    for each hexagon without PyPSA.
+
+    Parameters
+    ----------
+    weights : numpy array
+        hours represented by each snapshot.
+    plant_path : string
+        folder with the hydrogen plant design CSVs. Default "Parameters/Basic_H2_plant".
+    method : string
+        SciPy linprog HiGHS method, see solve_lp. Default 'highs'.
+    options : dictionary
+        linprog options for the method. Default is None.
+    '''
+    def __init__(self, weights, plant_path = "Parameters/Basic_H2_plant",
+                 method = 'highs', options = None):
+        self.weights = np.asarray(weights, dtype=float)
+        self.components = read_plant_components(plant_path)
+        self.method = method
+        self.options = options
+
+    def build(self, wind_potential, pv_potential, demand, wind_max_capacity,
+              pv_max_capacity, capital_costs):
+        '''
+        assembles the LP for one hexagon.
+
+        Parameters
+        ----------
+        wind_potential : numpy array
+            per-unit wind potential for each snapshot.
+        pv_potential : numpy array
+            per-unit solar potential for each snapshot.
+        demand : numpy array
+            hydrogen demand in MW for each snapshot.
+        wind_max_capacity : float
+            maximum wind capacity in MW.
+        pv_max_capacity : float
+            maximum solar capacity in MW.
+        capital_costs : dictionary
+            annualised capital cost of each component type.
+
+        Returns
+        -------
+        lp : LinearProgram
+            assembled linear program.
+        nominal : dictionary
+            variable index of the optimal capacity of each (component type, name).
+        '''
+        components = dict(self.components)
+        generators = components['generators'].copy()
+        # specify maximum capacity based on land use
+        generators.loc['Wind','p_nom_max'] = wind_max_capacity
+        generators.loc['Solar','p_nom_max'] = pv_max_capacity
+        components['generators'] = generators
+        return build_plant_lp(components,
+                              {'Wind': np.asarray(wind_potential, dtype=float),
+                               'Solar': np.asarray(pv_potential, dtype=float)},
+                              {'Hydrogen': np.asarray(demand, dtype=float)},
+                              capital_costs,
+                              self.weights)
+
+    def results(self, x, objective, nominal, demand):
+        '''
+        converts an LP solution into the outputs of optimize_hydrogen_plant.
+        '''
+        if x is None:
+            return (np.nan,)*6
+        # weight each snapshot by the hours it represents
+        lcoh = objective/(np.dot(self.weights, demand)/39.4*1000) # convert back to kg H2
+        return (lcoh,
+                x[nominal[('generators', 'Wind')]],
+                x[nominal[('generators', 'Solar')]],
+                x[nominal[('links', 'Electrolysis')]],
+                x[nominal[('storage_units', 'Battery')]],
+                x[nominal[('stores', 'Compressed H2 Store')]])
+
+    def optimize(self, wind_potential, pv_potential, demand, wind_max_capacity,
+                 pv_max_capacity, capital_costs):
+        '''
+        solves the plant LP for one hexagon. See build for the parameters.
+
+        Returns
+        -------
+        tuple
+            lcoh, wind_capacity, solar_capacity, electrolyzer_capacity,
+            battery_capacity and h2_storage as in optimize_hydrogen_plant.
+        '''
+        lp, nominal = self.build(wind_potential, pv_potential, demand, wind_max_capacity,
+                                 pv_max_capacity, capital_costs)
+        x, objective = solve_lp(lp, self.method, self.options)
+        return self.results(x, objective, nominal, demand)
+
+    def optimize_batch(self, problems):
+        '''
+        solves the plant LPs of several hexagons in one solver call.
+
+        Parameters
+        ----------
+        problems : list of tuples
+            positional arguments of optimize for each hexagon.
+
+        Returns
+        -------
+        results : list of tuples
+            outputs of optimize for each hexagon, in the same order.
+        '''
+        built = [self.build(*problem) for problem in problems]
+        solutions = solve_lp_batch([lp for lp, nominal in built], self.method, self.options)
+        return [self.results(x, objective, nominal, problem[2])
+                for (x, objective), (lp, nominal), problem in zip(solutions, built, problems)]
@@ -13,7 +13,6 @@ hydrogen plant capacity.
 
 """
 
-import atlite
 import geopandas as gpd
 import pypsa
 import matplotlib.pyplot as plt
@@ -21,6 +20,7 @@ import pandas as pd
 import cartopy.crs as ccrs
 import p_H2_aux as aux
 from functions import CRF
+from cf_store import load_profiles
 import numpy as np
 import logging
 import time
@@ -204,28 +204,10 @@ weather_parameters = pd.read_excel(weather_excel_path,
 weather_filename = weather_parameters['Filename']
 
 hexagons = gpd.read_file('Resources/hex_transport.geojson')
-# !!! change to name of cutout in weather
-cutout = atlite.Cutout('Cutouts/' + weather_filename +'.nc')
-layout = cutout.uniform_layout()
-
-pv_profile = cutout.pv(
-    panel= 'CSi',
-    orientation='latitude_optimal',
-    layout = layout,
-    shapes = hexagons,
-    per_unit = True
-    )
-pv_profile = pv_profile.rename(dict(dim_0='hexagon'))
-
-wind_profile = cutout.wind(
-    # Changed turbine type - was Vestas_V80_2MW_gridstreamer in first run
-    # Other option being explored: NREL_ReferenceTurbine_2020ATB_4MW, Enercon_E126_7500kW
-    turbine = 'NREL_ReferenceTurbine_2020ATB_4MW',
-    layout = layout,
-    shapes = hexagons,
-    per_unit = True
-    )
-wind_profile = wind_profile.rename(dict(dim_0='hexagon'))
+# !!! change to the capacity factor store of the cutout in weather, written by the
+# calculate_renewable_profiles rule
+pv_profile, wind_profile = load_profiles('Resources/profiles_' + weather_filename
+                                         + '_CSi_NREL_ReferenceTurbine_2020ATB_4MW', hexagons)
 # %%
 for location in demand_centers:
     for hexagon in hexagon_list:
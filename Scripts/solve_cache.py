@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""
+Persistent cache of hydrogen plant optimization results.
+
+Results are stored in an SQLite file and keyed by a hash of the exact inputs
+of each plant LP, so a rerun only solves the hexagons whose inputs changed and
+identical problems within a run are solved once. The least recently used
+entries are evicted once the cache holds more than a set number of results.
+
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+import numpy as np
+import pandas as pd
+
+# bump when the plant formulation changes so old results are not reused
+CACHE_VERSION = 1
+
+def hash_inputs(*items):
+    '''
+    calculates a content hash of plant optimization inputs.
+
+    Parameters
+    ----------
+    *items : numpy arrays, pandas objects, dicts, lists, strings or numbers
+        inputs to hash. Arrays are hashed by dtype, shape and values, so equal
+        inputs give equal hashes regardless of where they came from.
+
+    Returns
+    -------
+    string
+        hexadecimal SHA-256 digest.
+    '''
+    digest = hashlib.sha256()
+
+    def update(item):
+        if isinstance(item, dict):
+            for key in sorted(item):
+                update(str(key))
+                update(item[key])
+        elif isinstance(item, (list, tuple)):
+            digest.update(f'sequence{len(item)}'.encode())
+            for value in item:
+                update(value)
+        elif isinstance(item, (pd.Series, pd.DataFrame)):
+            update(item.index.astype(str).tolist())
+            update(item.to_numpy())
+        elif isinstance(item, pd.Index):
+            update(np.asarray(item.asi8 if isinstance(item, pd.DatetimeIndex) else item.astype(str)))
+        elif isinstance(item, np.ndarray):
+            if item.dtype == object:
+                update(item.astype(str).tolist())
+            else:
+                array = np.ascontiguousarray(item)
+                digest.update(f'{array.dtype.str}{array.shape}'.encode())
+                digest.update(array.tobytes())
+        elif isinstance(item, bytes):
+            digest.update(item)
+        else:
+            digest.update(repr(item).encode())
+
+    update(CACHE_VERSION)
+    for item in items:
+        update(item)
+    return digest.hexdigest()
+
+def hash_folder(path):
+    '''
+    calculates a content hash of all files in a folder, such as the hydrogen
+    plant design CSVs.
+    '''
+    contents = []
+    for name in sorted(os.listdir(path)):
+        with open(os.path.join(path, name), 'rb') as file:
+            contents.append((name, file.read()))
+    return hash_inputs(contents)
+
+class SolveCache:
+    '''
+    on-disk least-recently-used store of plant optimization results.
+
+    Parameters
+    ----------
+    path : string
+        path to the SQLite cache file, created if it doesn't exist.
+    max_entries : integer
+        maximum number of results to keep. Default 500000.
+    '''
+    def __init__(self, path, max_entries = 500000):
+        folder = os.path.dirname(path)
+        if folder != '' and not os.path.exists(folder):
+            os.makedirs(folder)
+        self.max_entries = max_entries
+        # other Snakemake jobs may share the cache, so wait for their writes
+        self.connection = sqlite3.connect(path, timeout = 60)
+        self.connection.execute('CREATE TABLE IF NOT EXISTS results '
+                                '(key TEXT PRIMARY KEY, result TEXT, last_used REAL)')
+        self.connection.execute('CREATE INDEX IF NOT EXISTS last_used_index ON results (last_used)')
+        self.connection.commit()
+        # upper bound on the number of results, so eviction only runs when the cache may be full
+        self.entries = self.connection.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        '''
+        returns the stored result for a key, or None if it isn't cached.
+        '''
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys):
+        '''
+        returns a dictionary of the stored results for the cached keys and
+        marks them as recently used.
+        '''
+        keys = list(dict.fromkeys(keys))
+        results = {}
+        # stay below SQLite's limit on query parameters
+        for start in range(0, len(keys), 500):
+            batch = keys[start:start+500]
+            rows = self.connection.execute(
+                f'SELECT key, result FROM results WHERE key IN ({",".join("?"*len(batch))})',
+                batch).fetchall()
+            results.update({key: tuple(json.loads(result)) for key, result in rows})
+        now = time.time()
+        self.connection.executemany('UPDATE results SET last_used = ? WHERE key = ?',
+                                    [(now, key) for key in results])
+        self.connection.commit()
+        self.hits += len(results)
+        self.misses += len(keys) - len(results)
+        return results
+
+    def put(self, key, result):
+        '''
+        stores the result for a key.
+        '''
+        self.put_many([(key, result)])
+
+    def put_many(self, items):
+        '''
+        stores a list of (key, result) pairs in one transaction, and evicts
+        the least recently used results if the cache may be over its size cap.
+        '''
+        items = list(items)
+        now = time.time()
+        self.connection.executemany(
+            'INSERT OR REPLACE INTO results (key, result, last_used) VALUES (?, ?, ?)',
+            [(key, json.dumps([float(value) for value in result]), now) for key, result in items])
+        self.connection.commit()
+        # replaced results don't add entries, so this overcounts until the next evict
+        self.entries += len(items)
+        if self.entries > self.max_entries:
+            self.evict()
+
+    def evict(self):
+        '''
+        evicts the least recently used results beyond the size cap.
+        '''
+        self.entries = self.connection.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+        if self.entries > self.max_entries:
+            self.connection.execute(
+                'DELETE FROM results WHERE key IN (SELECT key FROM results '
+                'ORDER BY last_used DESC LIMIT -1 OFFSET ?)', (self.max_entries,))
+            self.connection.commit()
+            self.entries = self.max_entries
+
+    def close(self):
+        # other jobs sharing the cache may have filled it since it was opened
+        self.evict()
+        self.connection.close()
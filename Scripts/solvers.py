@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+Solver backends for the hydrogen plant optimization.
+
+Each backend names the solver PyPSA passes the plant LP to, the SciPy HiGHS
+method the sparse engine uses, and default options tuned for the plant LP.
+Options from the config file are applied on top of the defaults.
+
+"""
+
+import importlib.util
+import shutil
+
+SOLVER_BACKENDS = {
+    'gurobi': {
+        'solver_name': 'gurobi',
+        'solver_options': {'LogToConsole':0, 'OutputFlag':0},
+        # the sparse engine falls back to HiGHS choosing its own method
+        'linprog_method': 'highs',
+        'linprog_options': {},
+        },
+    'highs-simplex': {
+        'solver_name': 'highs',
+        # PyPSA reads the HiGHS status and objective from its console log,
+        # so the log must not be turned off
+        # dual simplex is fastest on the small plant LPs and needs one thread,
+        # leaving the cores to the process pool
+        'solver_options': {'method': 'simplex', 'presolve': 'on', 'parallel': 'off',
+                           'threads': 1},
+        'linprog_method': 'highs-ds',
+        'linprog_options': {'presolve': True},
+        },
+    'highs-ipm': {
+        'solver_name': 'highs',
+        # interior point with crossover to a basic solution, using all cores
+        # for the year-long LPs of serial runs
+        'solver_options': {'method': 'ipm', 'presolve': 'on', 'parallel': 'on',
+                           'threads': 0, 'run_crossover': True,
+                           'ipm_optimality_tolerance': 1e-8},
+        'linprog_method': 'highs-ipm',
+        'linprog_options': {'presolve': True, 'ipm_optimality_tolerance': 1e-8},
+        },
+    }
+
+def solver_settings(name = 'gurobi', options = None):
+    '''
+    returns the settings of a solver backend.
+
+    Parameters
+    ----------
+    name : string
+        backend in SOLVER_BACKENDS. Default 'gurobi'.
+    options : dictionary
+        solver options that replace or add to the backend's default PyPSA
+        solver options. Default is None.
+
+    Returns
+    -------
+    settings : dictionary
+        backend name, PyPSA solver_name and solver_options, and SciPy
+        linprog_method and linprog_options for the sparse engine.
+    '''
+    if name not in SOLVER_BACKENDS:
+        raise NotImplementedError(f'Solver backend {name} not currently supported. '
+                                  f'Choose from {list(SOLVER_BACKENDS)}.')
+    backend = SOLVER_BACKENDS[name]
+    solver_options = dict(backend['solver_options'])
+    solver_options.update(options or {})
+    return {'name': name,
+            'solver_name': backend['solver_name'],
+            'solver_options': solver_options,
+            'linprog_method': backend['linprog_method'],
+            'linprog_options': dict(backend['linprog_options'])}
+
+def backend_available(name, engine = 'pypsa'):
+    '''
+    checks whether a solver backend can be used with an engine on this machine.
+
+    Parameters
+    ----------
+    name : string
+        backend in SOLVER_BACKENDS.
+    engine : string
+        'pypsa' or 'sparse'. Default 'pypsa'.
+
+    Returns
+    -------
+    boolean
+        whether the backend is installed.
+    '''
+    if engine == 'sparse':
+        # SciPy ships HiGHS, so all backends can solve the sparse engine's LPs
+        return importlib.util.find_spec('scipy') is not None
+    solver_name = SOLVER_BACKENDS[name]['solver_name']
+    if solver_name == 'gurobi':
+        return importlib.util.find_spec('gurobipy') is not None
+    if solver_name == 'highs':
+        # PyPSA runs HiGHS through its command line executable
+        return shutil.which('highs') is not None
+    return False
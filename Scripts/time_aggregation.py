@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""
+Time-series aggregation for the hydrogen plant optimization.
+
+Groups consecutive snapshots into segments so the plant LP can be solved on
+fewer, weighted snapshots. Segments keep the chronological order of the year,
+so the hydrogen store and battery state of charge carry over from one segment
+to the next exactly as they do between hours in the full-resolution model.
+
+"""
+
+import heapq
+import numpy as np
+
+def segment_snapshots(features, segments, method = 'adjacent'):
+    '''
+    assigns each snapshot to a segment of consecutive snapshots.
+
+    Parameters
+    ----------
+    features : numpy array
+        2D array of time series to keep the segments similar in, with one row
+        per snapshot, e.g. wind and solar potential.
+    segments : integer
+        number of segments to create.
+    method : string
+        'uniform' to split the year into blocks of equal length, or 'adjacent'
+        to repeatedly merge the two neighbouring segments whose merge adds the
+        least variance (Ward's criterion). Default 'adjacent'.
+
+    Returns
+    -------
+    labels : numpy array
+        segment number of each snapshot, increasing over time.
+    '''
+    features = np.asarray(features, dtype=float)
+    if features.ndim == 1:
+        features = features[:, np.newaxis]
+    snapshots = len(features)
+    segments = min(int(segments), snapshots)
+    if method == 'uniform':
+        return np.arange(snapshots)*segments//snapshots
+    elif method == 'adjacent':
+        return _adjacent_segments(features, segments)
+    else:
+        raise NotImplementedError(f'Time aggregation method {method} not currently supported.')
+
+def _adjacent_segments(features, segments):
+    '''
+    merges neighbouring snapshots into segments by hierarchical clustering
+    constrained to adjacent segments.
+    '''
+    # scale each time series to its range so they count equally
+    spread = np.ptp(features, axis=0)
+    features = (features - features.min(axis=0))/np.where(spread > 0, spread, 1.)
+    snapshots = len(features)
+    sums = features.copy()
+    counts = np.ones(snapshots)
+    # each segment is identified by its first snapshot
+    right = np.arange(1, snapshots+1)
+    right[-1] = -1
+    left = np.arange(-1, snapshots-1)
+    start = np.ones(snapshots, dtype=bool)
+    version = np.zeros(snapshots, dtype=int)
+
+    def merge_cost(a, b):
+        difference = sums[a]/counts[a] - sums[b]/counts[b]
+        return counts[a]*counts[b]/(counts[a]+counts[b])*np.dot(difference, difference)
+
+    heap = [(merge_cost(a, a+1), a, 0, 0) for a in range(snapshots-1)]
+    heapq.heapify(heap)
+    remaining = snapshots
+    while remaining > segments:
+        cost, a, version_a, version_b = heapq.heappop(heap)
+        b = right[a]
+        # skip merges of segments that have changed since they were queued
+        if not start[a] or b < 0 or version[a] != version_a or version[b] != version_b:
+            continue
+        sums[a] += sums[b]
+        counts[a] += counts[b]
+        start[b] = False
+        right[a] = right[b]
+        if right[b] >= 0:
+            left[right[b]] = a
+        version[a] += 1
+        remaining -= 1
+        if left[a] >= 0:
+            heapq.heappush(heap, (merge_cost(left[a], a), left[a], version[left[a]], version[a]))
+        if right[a] >= 0:
+            heapq.heappush(heap, (merge_cost(a, right[a]), a, version[a], version[right[a]]))
+    return np.cumsum(start) - 1
+
+def segment_weights(labels):
+    '''
+    returns the number of snapshots in each segment.
+    '''
+    return np.bincount(labels).astype(float)
+
+def segment_starts(labels):
+    '''
+    returns the position of the first snapshot of each segment.
+    '''
+    return np.flatnonzero(np.r_[True, np.diff(labels) != 0])
+
+def aggregate(values, labels):
+    '''
+    averages a time series over each segment.
+    '''
+    return np.bincount(labels, weights=np.asarray(values, dtype=float))/np.bincount(labels)
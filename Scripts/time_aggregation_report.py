@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+Reports the error in levelized cost of hydrogen from time-aggregated plant
+optimization, compared with full-resolution optimization, on a random sample
+of hexagons.
+
+"""
+
+import geopandas as gpd
+import pandas as pd
+import numpy as np
+import time
+from optimize_hydrogen_plant import demand_schedule, feasible_transport, optimize_hydrogen_plant,\
+    PlantTemplate, time_segments
+from cf_store import load_profiles
+from solvers import solver_settings
+
+if __name__ == "__main__":
+    transport_excel_path = str(snakemake.input.transport_parameters)
+    country_excel_path = str(snakemake.input.country_parameters)
+    demand_excel_path = str(snakemake.input.demand_parameters)
+    country_parameters = pd.read_excel(country_excel_path,
+                                        index_col='Country')
+    demand_parameters = pd.read_excel(demand_excel_path,
+                                      index_col='Demand center',
+                                      ).squeeze("columns")
+    demand_centers = demand_parameters.index
+    aggregation_config = snakemake.config["plant_optimization"]["time_aggregation"]
+    if aggregation_config["method"] == 'none':
+        raise ValueError('Set a time aggregation method in the config file to report its error.')
+
+    weather_year = snakemake.wildcards.weather_year
+    end_weather_year = int(snakemake.wildcards.weather_year)+1
+    start_date = f'{weather_year}-01-01'
+    end_date = f'{end_weather_year}-01-01'
+
+    hexagons = gpd.read_file(str(snakemake.input.hexagons))
+    pv_profile, wind_profile = load_profiles(str(snakemake.input.profiles), hexagons)
+
+    segments = time_segments(pv_profile, wind_profile, aggregation_config)
+    plant_config = snakemake.config["plant_optimization"]
+    solver = solver_settings(plant_config["solver"]["name"], plant_config["solver"]["options"])
+    full_template = PlantTemplate(wind_profile.time, engine = plant_config["engine"], solver = solver)
+    aggregated_template = PlantTemplate(wind_profile.time, segments,
+                                        engine = plant_config["engine"], solver = solver)
+
+    records = []
+    for location in demand_centers:
+        # hexagons without a trucking state have no demand schedule, and no plant
+        # to design, as in the plant optimization
+        feasible = feasible_transport(hexagons, location)
+        candidates = pv_profile.hexagon.data[feasible["trucking"].loc[pv_profile.hexagon.data].values]
+        # same sample of hexagons on every run
+        rng = np.random.default_rng(0)
+        sample = rng.choice(candidates,
+                            size=min(aggregation_config["report_sample"], len(candidates)),
+                            replace=False)
+        for i in sorted(sample):
+            hydrogen_demand_trucking, hydrogen_demand_pipeline =\
+                demand_schedule(demand_parameters.loc[location,'Annual demand [kg/a]'],
+                                start_date,
+                                end_date,
+                                hexagons.loc[i,f'{location} trucking state'],
+                                transport_excel_path)
+            country_series = country_parameters.loc[hexagons.country[i]]
+            for j, hydrogen_demand in [("trucking", hydrogen_demand_trucking),
+                                       ("pipeline", hydrogen_demand_pipeline)]:
+                if not feasible[j][i]:
+                    continue
+                record = {'Demand center': location, 'Hexagon': i, 'Transport': j}
+                for resolution, template in [('full', full_template),
+                                             ('aggregated', aggregated_template)]:
+                    start = time.time()
+                    lcoh = optimize_hydrogen_plant(wind_profile.sel(hexagon = i),
+                                                   pv_profile.sel(hexagon = i),
+                                                   wind_profile.time,
+                                                   hydrogen_demand,
+                                                   hexagons.loc[i,'theo_turbines'],
+                                                   hexagons.loc[i,'theo_pv'],
+                                                   country_series,
+                                                   template = template)[0]
+                    record[f'{resolution} LCOH'] = lcoh
+                    record[f'{resolution} solve time (s)'] = time.time() - start
+                records.append(record)
+
+    report = pd.DataFrame(records)
+    report['LCOH error'] = report['aggregated LCOH'] - report['full LCOH']
+    report['Relative LCOH error'] = report['LCOH error']/report['full LCOH']
+    report['Speedup'] = report['full solve time (s)']/report['aggregated solve time (s)']
+    report.to_csv(str(snakemake.output), index=False)
+
+    print(f"{len(segments)} snapshots aggregated into {segments.max()+1} segments "
+          f"({aggregation_config['method']})")
+    print(f"mean absolute relative LCOH error {report['Relative LCOH error'].abs().mean():.2%}, "
+          f"maximum {report['Relative LCOH error'].abs().max():.2%}")
+    print(f"median speedup {report['Speedup'].median():.1f}x")
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""
+Sources of per-hexagon hourly solar and wind capacity factors other than the
+ERA5 cutout.
+
+'file' reads profiles that were calculated elsewhere from a local NetCDF, CSV
+or Parquet file. 'synthetic' generates seeded profiles with daily, seasonal
+and weather-driven variation, so the plant optimization can be run and timed
+for any set of hexagons without downloading weather data.
+
+Profile files hold a 'pv' and a 'wind' capacity factor for each hexagon and
+hour. NetCDF files have 'pv' and 'wind' variables with dimensions 'hexagon'
+and 'time'. CSV and Parquet files have one row per hexagon and hour with
+columns 'time', 'hexagon', 'pv' and 'wind'.
+
+Every provider covers the hours from the start date up to, but not including,
+the end date, so the plant optimization has the same snapshots whichever
+provider the profiles come from.
+
+"""
+
+import os
+import numpy as np
+import pandas as pd
+import xarray as xr
+from scipy.signal import lfilter
+
+PROVIDERS = ['cutout', 'file', 'synthetic']
+
+def weather_hours(start_date, end_date):
+    '''
+    returns the hourly timestamps from start_date up to, but not including,
+    end_date.
+    '''
+    return pd.date_range(start_date, end_date, freq='H', inclusive='left')
+
+def as_profiles(data, hexagons, start_date, end_date):
+    '''
+    selects the hexagons and time range from a dataset of profiles, and checks
+    that every hexagon is covered.
+    '''
+    times = weather_hours(start_date, end_date)
+    data = data.sel(time=slice(times[0], times[-1]))
+    profiles = []
+    for name in ['pv', 'wind']:
+        profile = data[name].reindex(hexagon=hexagons.index).transpose('hexagon', 'time')
+        missing = int(profile.isnull().any('time').sum())
+        if missing > 0:
+            raise ValueError(f'{name} profiles are missing or incomplete for {missing} hexagons.')
+        profiles.append(profile.astype(np.float32).rename(name))
+    return tuple(profiles)
+
+def file_profiles(path, hexagons, start_date, end_date):
+    '''
+    reads per-hexagon hourly capacity factors from a local file.
+
+    Parameters
+    ----------
+    path : string
+        NetCDF (.nc), CSV (.csv) or Parquet (.parquet) file of profiles.
+    hexagons : geopandas GeoDataFrame
+        hexagons to read profiles for, matched to the file by index.
+    start_date : string
+        first timestamp to read.
+    end_date : string
+        end of the profiles, which is not read.
+
+    Returns
+    -------
+    pv_profile : xarray DataArray
+        per-unit solar potential with dimensions hexagon and time.
+    wind_profile : xarray DataArray
+        per-unit wind potential with dimensions hexagon and time.
+    '''
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.nc':
+        data = xr.open_dataset(path)
+    elif extension in ['.csv', '.parquet']:
+        table = pd.read_csv(path, parse_dates=['time']) if extension == '.csv' else pd.read_parquet(path)
+        data = table.set_index(['hexagon', 'time'])[['pv', 'wind']].to_xarray()
+    else:
+        raise ValueError(f'Profile file {path} must be NetCDF (.nc), CSV (.csv) or Parquet (.parquet).')
+    return as_profiles(data, hexagons, start_date, end_date)
+
+def autoregressive(rng, shape, correlation):
+    '''
+    returns standard normal noise that is autocorrelated along the last axis.
+    '''
+    noise = rng.standard_normal(shape)
+    return lfilter([np.sqrt(1 - correlation**2)], [1, -correlation], noise, axis=-1)
+
+def synthetic_profiles(hexagons, start_date, end_date, seed = 0):
+    '''
+    generates per-hexagon hourly capacity factors with realistic daily and
+    seasonal structure.
+
+    Solar follows the sun's position at each hexagon's centre for a panel at
+    latitude tilt, scaled by a cloudiness that changes from day to day. Wind
+    speeds vary by season, time of day and passing weather systems, and are
+    converted with a generic turbine power curve. Weather is shared in part
+    between all hexagons, as neighbouring sites see the same weather.
+
+    Parameters
+    ----------
+    hexagons : geopandas GeoDataFrame
+        hexagons to generate profiles for.
+    start_date : string
+        first timestamp of the profiles.
+    end_date : string
+        end of the profiles, which is not included.
+    seed : integer
+        random seed, so the same seed gives the same profiles. Default 0.
+
+    Returns
+    -------
+    pv_profile : xarray DataArray
+        per-unit solar potential with dimensions hexagon and time.
+    wind_profile : xarray DataArray
+        per-unit wind potential with dimensions hexagon and time.
+    '''
+    rng = np.random.default_rng(seed)
+    times = weather_hours(start_date, end_date)
+    # fraction of weather shared by all hexagons
+    shared = 0.7
+    # hexagon centres from their bounds, to avoid a geographic CRS warning
+    bounds = hexagons.geometry.bounds
+    longitude = ((bounds.minx + bounds.maxx)/2).to_numpy()[:, None]
+    latitude = np.radians((bounds.miny + bounds.maxy)/2).to_numpy()[:, None]
+    day = times.dayofyear.to_numpy()[None, :]
+    solar_time = (times.hour.to_numpy()[None, :] + longitude/15) % 24
+
+    # solar: sun position, cloudiness changing daily
+    declination = np.radians(23.45)*np.sin(2*np.pi*(284 + day)/365)
+    hour_angle = np.radians(15*(solar_time - 12))
+    sun_height = np.sin(latitude)*np.sin(declination) + np.cos(latitude)*np.cos(declination)*np.cos(hour_angle)
+    # a panel tilted at the latitude sees the sun as if at the equator
+    incidence = np.cos(declination)*np.cos(hour_angle)
+    days = np.unique(times.normalize(), return_inverse=True)[1]
+    weather = np.sqrt(shared)*autoregressive(rng, (1, days.max()+1), 0.6)\
+        + np.sqrt(1 - shared)*autoregressive(rng, (len(hexagons), days.max()+1), 0.6)
+    clearness = 1/(1 + np.exp(-(1.5 + weather)))
+    pv = 0.85*clearness[:, days]*np.where(sun_height > 0, np.clip(incidence, 0, 1), 0)
+
+    # wind: site mean speed, seasonal and daily cycles, weather systems lasting a few days
+    mean_speed = rng.uniform(6, 9, (len(hexagons), 1))
+    seasonal = 1 + 0.15*np.cos(2*np.pi*(day - rng.uniform(0, 365))/365)
+    diurnal = 1 + 0.1*np.cos(2*np.pi*(solar_time - 15)/24)
+    weather = np.sqrt(shared)*autoregressive(rng, (1, len(times)), 0.98)\
+        + np.sqrt(1 - shared)*autoregressive(rng, (len(hexagons), len(times)), 0.9)
+    speed = mean_speed*seasonal*diurnal*np.exp(0.35*weather - 0.35**2/2)
+    # generic turbine: cut in at 3 m/s, rated at 12 m/s, cut out at 25 m/s
+    wind = np.clip((speed**3 - 3**3)/(12**3 - 3**3), 0, 1)
+    wind[speed > 25] = 0
+
+    coords = {'hexagon': hexagons.index, 'time': times}
+    return (xr.DataArray(pv.astype(np.float32), coords=coords, dims=['hexagon', 'time'], name='pv'),
+            xr.DataArray(wind.astype(np.float32), coords=coords, dims=['hexagon', 'time'], name='wind'))
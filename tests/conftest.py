@@ -0,0 +1,15 @@
+# -*- coding: utf-8 -*-
+"""
+Shared setup for the tests: the scripts import each other as flat modules, so
+the Scripts folder is put on the import path, as Snakemake does.
+
+"""
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'Scripts'))
+
+# parameter workbooks of the Namibia case study
+PARAMETERS = os.path.join(ROOT, 'Parameters', 'NA')
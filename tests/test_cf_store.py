@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+Tests that converting a cutout in parallel processes gives the same profiles
+as converting it in one process, for part of the cutout's hours.
+
+The conversion is run against a local stand-in for atlite, whose cutouts
+convert a single weather variable by the indicator matrix, so the tests need
+no weather data.
+
+"""
+
+import sys
+import types
+import multiprocessing
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+import geopandas as gpd
+from scipy import sparse
+from shapely.geometry import box
+from cf_store import load_profiles, stream_profiles
+
+pytestmark = pytest.mark.skipif(multiprocessing.get_context().get_start_method() != 'fork',
+                                reason='worker processes must inherit the stand-in atlite module')
+
+class StandInCutout:
+    '''
+    cutout with the parts of the atlite Cutout interface used by cf_store.
+    Like atlite, selecting from a cutout gives one with no file.
+    '''
+    def __init__(self, path, data = None):
+        self.path = path
+        self.data = xr.load_dataset(path) if data is None else data
+
+    @property
+    def coords(self):
+        return self.data.coords
+
+    def sel(self, **selection):
+        return StandInCutout('unwritten_selection.nc', self.data.sel(**selection))
+
+    def uniform_layout(self):
+        return xr.DataArray(1., coords={'y': self.data.y, 'x': self.data.x}, dims=['y', 'x'])
+
+    def convert(self, variable, matrix, index):
+        values = self.data[variable].values.reshape(self.data.sizes['time'], -1)
+        return xr.DataArray(sparse.csr_matrix(matrix) @ values.T, dims=['dim_0', 'time'],
+                            coords={'dim_0': index, 'time': self.data.time.values})
+
+    def pv(self, panel, orientation, layout, per_unit, matrix, index):
+        return self.convert('influx', matrix, index)
+
+    def wind(self, turbine, layout, per_unit, matrix, index):
+        return self.convert('wnd100m', matrix, index)
+
+@pytest.fixture
+def cutout(tmp_path, monkeypatch):
+    # two days of a weather year and the first day of the next, on a 3 by 2 grid
+    times = pd.date_range('2022-12-30', '2023-01-01 23:00', freq='H')
+    rng = np.random.default_rng(0)
+    data = xr.Dataset({name: (('time', 'y', 'x'), rng.random((len(times), 2, 3)))
+                       for name in ['influx', 'wnd100m']},
+                      coords={'time': times, 'y': [-20.5, -20.], 'x': [15., 15.5, 16.]})
+    path = tmp_path / 'cutout.nc'
+    data.to_netcdf(path)
+    monkeypatch.setitem(sys.modules, 'atlite', types.SimpleNamespace(Cutout=StandInCutout))
+    return StandInCutout(str(path))
+
+def test_parallel_conversion_of_time_range(cutout, tmp_path):
+    hexagons = gpd.GeoDataFrame(geometry=[box(15, -21, 15.5, -20.5), box(15.5, -21, 16, -20.5),
+                                          box(15, -20.5, 16, -20)], crs='EPSG:4326')
+    matrix = sparse.random(len(hexagons), 6, density=0.5, random_state=0, format='csr')
+    time_range = (pd.Timestamp('2022-12-30'), pd.Timestamp('2022-12-31 23:00'))
+    profiles = {}
+    for processes in [1, 2]:
+        folder = str(tmp_path / f'profiles_{processes}')
+        stream_profiles(cutout, hexagons, {folder: ('CSi', 'turbine')}, matrix = matrix,
+                        chunk_hours = 10, chunk_hexagons = 2, processes = processes,
+                        time_range = time_range)
+        profiles[processes] = load_profiles(folder, hexagons)
+
+    pv_profile, wind_profile = profiles[1]
+    assert pv_profile.sizes['time'] == 48
+    assert pd.DatetimeIndex(pv_profile.time.values)[-1] == time_range[1]
+    expected = matrix @ cutout.data['influx'].values[:48].reshape(48, -1).T
+    assert np.allclose(pv_profile.values, expected, atol=1e-6)
+    for profile, parallel_profile in zip(profiles[1], profiles[2]):
+        assert np.array_equal(profile.time.values, parallel_profile.time.values)
+        assert np.array_equal(profile.values, parallel_profile.values)
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+Tests that a tiled cutout resumes from the tiles finished before a failure,
+and that the merged tiles match the cutout prepared in one pass.
+
+Tiles are prepared by a local stand-in for the ERA5 download, which writes a
+weather field that depends only on the grid point and hour, so every tile
+agrees with every other tile and with the single-pass cutout.
+
+"""
+
+import os
+import multiprocessing
+from functools import partial
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+from cutout_tiles import GRID_SPACING, cutout_tiles, completed_tiles, prepare_tiled_cutout
+
+pytestmark = pytest.mark.skipif(multiprocessing.get_context().get_start_method() != 'fork',
+                                reason='worker processes must inherit the stand-in tile function')
+
+BOUNDS = (10.1, -2.2, 12.3, 0.4)
+START_DATE = '2022-01-30'
+END_DATE = '2022-02-02'
+
+def weather(x, y, time):
+    '''
+    returns a cutout of the stand-in weather on the grid points of a box and
+    the hours of a range of days.
+    '''
+    x = np.arange(np.ceil(x.start/GRID_SPACING), np.floor(x.stop/GRID_SPACING) + 1)*GRID_SPACING
+    y = np.arange(np.ceil(y.start/GRID_SPACING), np.floor(y.stop/GRID_SPACING) + 1)*GRID_SPACING
+    times = pd.date_range(time.start, pd.Timestamp(time.stop) + pd.Timedelta(hours=23), freq='H')
+    hours = ((times - pd.Timestamp('2022-01-01'))/pd.Timedelta(hours=1)).to_numpy()
+    influx = np.sin(hours[:, None, None]/7) + x[None, None, :] + 10*y[None, :, None]
+    return xr.Dataset({'influx': (('time', 'y', 'x'), influx, {'feature': 'influx'}),
+                       'height': (('y', 'x'), x[None, :] - y[:, None], {'feature': 'height'})},
+                      coords={'time': times, 'y': y, 'x': x})
+
+def prepare_stand_in_tile(tile, path, log, fail = ()):
+    '''
+    writes the stand-in weather of a tile, failing for the named tiles, and
+    logs the name of each tile prepared.
+    '''
+    with open(log, 'a') as file:
+        file.write(tile['name'] + '\n')
+    if tile['name'] in fail:
+        raise RuntimeError('request failed')
+    weather(tile['x'], tile['y'], tile['time']).to_netcdf(path)
+
+def test_resume_and_merge(tmp_path):
+    path = str(tmp_path / 'cutout.nc')
+    folder = str(tmp_path / 'tiles')
+    names = [tile['name'] for tile in cutout_tiles(*BOUNDS, START_DATE, END_DATE, tile_size = 1)]
+    # 3 by 3 spatial tiles and 2 months
+    assert len(names) == 18
+    failing = set(names[5:])
+
+    first_log = str(tmp_path / 'first_run.txt')
+    with pytest.raises(RuntimeError, match=f'{len(failing)} cutout tiles failed'):
+        prepare_tiled_cutout(path, *BOUNDS, START_DATE, END_DATE,
+                             partial(prepare_stand_in_tile, log = first_log, fail = failing),
+                             tile_size = 1, max_requests = 2, folder = folder)
+    assert completed_tiles(folder) == set(names[:5])
+    assert not os.path.exists(path)
+
+    second_log = str(tmp_path / 'second_run.txt')
+    prepare_tiled_cutout(path, *BOUNDS, START_DATE, END_DATE,
+                         partial(prepare_stand_in_tile, log = second_log),
+                         tile_size = 1, max_requests = 2, folder = folder)
+    with open(second_log) as file:
+        prepared = file.read().split()
+    # only the missing tiles are prepared, each once
+    assert sorted(prepared) == sorted(failing)
+    assert not os.path.exists(folder)
+
+    expected = weather(slice(BOUNDS[0], BOUNDS[2]), slice(BOUNDS[1], BOUNDS[3]),
+                       slice(START_DATE, END_DATE))
+    with xr.open_dataset(path) as merged:
+        for coordinate in ['time', 'y', 'x']:
+            assert np.array_equal(merged[coordinate].values, expected[coordinate].values)
+        for name in ['influx', 'height']:
+            assert np.array_equal(merged[name].transpose(*expected[name].dims).values,
+                                  expected[name].values)
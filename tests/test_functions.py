@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the hydrogen conversion and transport cost functions.
+
+"""
+
+import os
+import numpy as np
+import pytest
+from conftest import PARAMETERS
+from functions import cheapest_trucking_strategy, cheapest_pipeline_strategy,\
+    cheapest_trucking_strategies, cheapest_pipeline_strategies
+
+CONVERSION = os.path.join(PARAMETERS, 'conversion_parameters.xlsx')
+TRANSPORT = os.path.join(PARAMETERS, 'transport_parameters.xlsx')
+PIPELINE = os.path.join(PARAMETERS, 'pipeline_parameters.xlsx')
+
+# costs from the functions before conversion costs were shared between routes,
+# at electricity 0.1, heat 0.05 and interest 0.08, with demand electricity 0.12
+REFERENCE = [
+    ('standard condition', 1e6, 50, 1.0862275800585586, 'NH3', 0.9141112252497463),
+    ('standard condition', 6e7, 300, 0.8797761421213598, 'NH3', 0.09141112252497463),
+    ('500 bar', 1e6, 50, 2.962204139834096, '500 bar', 4.061937944670301),
+    ('500 bar', 6e7, 300, 2.7288999643186234, '500 bar', 2.639422314438276),
+    ('LH2', 1e6, 50, 56.629681778059236, 'LH2', 57.548888408786816),
+    ('LH2', 6e7, 300, 2.940148557822348, 'LH2', 3.0636796958082413),
+    ('NH3', 1e6, 50, 0.4867145192407517, 'NH3', 1.333479536384525),
+    ('NH3', 6e7, 300, 0.5326023101396093, 'NH3', 0.5107794336597533),
+]
+
+@pytest.mark.parametrize('final_state, quantity, distance, trucking_cost, trucking_state, pipeline_cost',
+                         REFERENCE)
+def test_strategies_match_reference(final_state, quantity, distance, trucking_cost, trucking_state,
+                                    pipeline_cost):
+    costs, state = cheapest_trucking_strategy(final_state, quantity, distance, 0.1, 0.05, 0.08,
+                                              CONVERSION, TRANSPORT, 0.12)
+    assert costs == pytest.approx(trucking_cost, rel=1e-12)
+    assert state == trucking_state
+    costs, size = cheapest_pipeline_strategy(final_state, quantity, distance, 0.1, 0.05, 0.08,
+                                             CONVERSION, PIPELINE, 0.12)
+    assert costs == pytest.approx(pipeline_cost, rel=1e-12)
+    assert size == 'Small Pipeline'
+
+FINAL_STATES = ['standard condition', '500 bar', 'LH2', 'NH3']
+
+def random_sites(seed, sites = 40):
+    '''
+    returns random distances, prices and interest rates of production sites,
+    including a site at the demand center.
+    '''
+    rng = np.random.default_rng(seed)
+    distance = rng.uniform(1, 1500, sites)
+    distance[0] = 0.
+    # a few sites share prices, as the hexagons of a country do
+    elec_costs = rng.choice([0.03, 0.08, 0.15], sites)
+    heat_costs = rng.choice([0.02, 0.06], sites)
+    interest = rng.choice([0.05, 0.08, 0.12], sites)
+    return distance, elec_costs, heat_costs, interest
+
+@pytest.mark.parametrize('final_state', FINAL_STATES)
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_trucking_strategies_match_scalar(final_state, seed):
+    distance, elec_costs, heat_costs, interest = random_sites(seed)
+    quantity = np.random.default_rng(seed).uniform(1e5, 1e8)
+    costs, states = cheapest_trucking_strategies(final_state, quantity, distance, elec_costs, heat_costs,
+                                                 interest, CONVERSION, TRANSPORT, 0.1)
+    for k in range(len(distance)):
+        cost, state = cheapest_trucking_strategy(final_state, quantity, distance[k], elec_costs[k],
+                                                 heat_costs[k], interest[k], CONVERSION, TRANSPORT, 0.1)
+        assert costs[k] == pytest.approx(cost, rel=1e-12)
+        assert states[k] == state
+
+@pytest.mark.parametrize('final_state', FINAL_STATES)
+@pytest.mark.parametrize('quantity', [1e6, 6e7, 1e12])
+def test_pipeline_strategies_match_scalar(final_state, quantity):
+    distance, elec_costs, heat_costs, interest = random_sites(3)
+    costs, sizes = cheapest_pipeline_strategies(final_state, quantity, distance, elec_costs, heat_costs,
+                                                interest, CONVERSION, PIPELINE, 0.1)
+    for k in range(len(distance)):
+        cost, size = cheapest_pipeline_strategy(final_state, quantity, distance[k], elec_costs[k],
+                                                heat_costs[k], interest[k], CONVERSION, PIPELINE, 0.1)
+        # no pipeline is big enough for the largest quantity
+        assert costs[k] == pytest.approx(cost, rel=1e-12, nan_ok=True)
+        assert sizes[k] == size
+
+@pytest.mark.parametrize('final_state', FINAL_STATES)
+def test_strategies_without_distance(final_state):
+    # sites without a distance get no cost, and don't affect the other sites
+    distance, elec_costs, heat_costs, interest = random_sites(4, sites = 5)
+    distance[2] = np.nan
+    costs, states = cheapest_trucking_strategies(final_state, 1e7, distance, elec_costs, heat_costs,
+                                                 interest, CONVERSION, TRANSPORT, 0.1)
+    pipeline_costs = cheapest_pipeline_strategies(final_state, 1e7, distance, elec_costs, heat_costs,
+                                                  interest, CONVERSION, PIPELINE, 0.1)[0]
+    assert np.isnan(costs[2]) and states[2] == 'nan' and np.isnan(pipeline_costs[2])
+    for k in [0, 1, 3, 4]:
+        cost, state = cheapest_trucking_strategy(final_state, 1e7, distance[k], elec_costs[k],
+                                                 heat_costs[k], interest[k], CONVERSION, TRANSPORT, 0.1)
+        assert costs[k] == pytest.approx(cost, rel=1e-12)
+        assert states[k] == state
+        cost = cheapest_pipeline_strategy(final_state, 1e7, distance[k], elec_costs[k],
+                                          heat_costs[k], interest[k], CONVERSION, PIPELINE, 0.1)[0]
+        assert pipeline_costs[k] == pytest.approx(cost, rel=1e-12)
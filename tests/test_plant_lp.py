@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+Tests that the sparse plant LP engine gives the same levelized cost of
+hydrogen as the PyPSA engine, on a synthetic 48-hour plant.
+
+"""
+
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from conftest import PARAMETERS, ROOT
+
+pytest.importorskip('pypsa')
+from optimize_hydrogen_plant import PlantTemplate, optimize_hydrogen_plant
+from solvers import solver_settings, backend_available
+
+PLANT_PATH = os.path.join(ROOT, 'Parameters', 'Basic_H2_plant')
+TIMES = pd.date_range('2023-06-01', periods=48, freq='H')
+
+pytestmark = pytest.mark.skipif(not (backend_available('highs-simplex', 'pypsa')
+                                     and backend_available('highs-simplex', 'sparse')),
+                                reason='HiGHS is needed for both plant engines')
+
+def synthetic_plant():
+    '''
+    returns the wind and solar potential, capacity limits and country
+    parameters of a synthetic plant.
+    '''
+    hours = np.arange(len(TIMES))
+    rng = np.random.default_rng(0)
+    pv_potential = np.clip(np.sin(2*np.pi*(hours % 24 - 6)/24), 0, None)*0.8
+    wind_potential = np.clip(0.4 + 0.3*np.sin(2*np.pi*hours/17) + 0.1*rng.standard_normal(len(hours)), 0, 1)
+    country_series = pd.read_excel(os.path.join(PARAMETERS, 'country_parameters.xlsx'),
+                                   index_col='Country').iloc[0]
+    return wind_potential, pv_potential, 500., 2000., country_series
+
+@pytest.mark.parametrize('demand', ['pipeline', 'trucking'])
+def test_sparse_engine_matches_pypsa(demand):
+    wind_potential, pv_potential, wind_max_capacity, pv_max_capacity, country_series = synthetic_plant()
+    # a constant flow for pipelines, or a delivery every 8 hours for trucks
+    if demand == 'pipeline':
+        demand_profile = pd.DataFrame({'Demand': 500.}, index=TIMES)
+    else:
+        demand_profile = pd.DataFrame({'Demand': np.where(np.arange(len(TIMES)) % 8 == 0, 4000., 0.)},
+                                      index=TIMES)
+    # the backend's own options, as the workflow passes them to both engines
+    solver = solver_settings('highs-simplex')
+    lcohs = {}
+    for engine in ['pypsa', 'sparse']:
+        template = PlantTemplate(TIMES, plant_path = PLANT_PATH, engine = engine, solver = solver)
+        lcohs[engine] = optimize_hydrogen_plant(wind_potential, pv_potential, TIMES, demand_profile,
+                                                wind_max_capacity, pv_max_capacity, country_series,
+                                                template = template)[0]
+    assert np.isfinite(lcohs['pypsa'])
+    assert lcohs['sparse'] == pytest.approx(lcohs['pypsa'], rel=1e-6)
@@ -0,0 +1,14 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the solver backend settings.
+
+"""
+
+import pytest
+from solvers import SOLVER_BACKENDS, solver_settings
+
+@pytest.mark.parametrize('backend', [name for name, settings in SOLVER_BACKENDS.items()
+                                     if settings['solver_name'] == 'highs'])
+def test_highs_console_log_stays_on(backend):
+    # PyPSA reads the model status and objective value from the HiGHS console log
+    assert solver_settings(backend)['solver_options'].get('log_to_console', True) not in [False, 'false', 'off']
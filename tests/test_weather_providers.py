@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+"""
+Tests that the capacity factor providers cover the same hours.
+
+"""
+
+import geopandas as gpd
+import numpy as np
+import pytest
+from shapely.geometry import box
+from weather_providers import file_profiles, synthetic_profiles, weather_hours
+
+@pytest.mark.parametrize('weather_year, hours', [(2022, 8760), (2020, 8784)])
+def test_providers_share_snapshots(tmp_path, weather_year, hours):
+    hexagons = gpd.GeoDataFrame(geometry=[box(15, -20, 15.1, -19.9), box(16, -22, 16.1, -21.9)],
+                                crs='EPSG:4326')
+    start_date = f'{weather_year}-01-01'
+    end_date = f'{weather_year+1}-01-01'
+    pv_profile, wind_profile = synthetic_profiles(hexagons, start_date, end_date)
+
+    # a profile file with the first day of the next year, as cutouts have
+    times = weather_hours(start_date, f'{weather_year+1}-01-02')
+    table = pv_profile.reindex(time=times, fill_value=0.).to_dataframe().reset_index()
+    table['wind'] = wind_profile.reindex(time=times, fill_value=0.).values.ravel()
+    path = tmp_path / 'profiles.csv'
+    table.to_csv(path, index=False)
+    file_pv_profile, file_wind_profile = file_profiles(str(path), hexagons, start_date, end_date)
+
+    assert pv_profile.sizes['time'] == hours
+    for profile in [file_pv_profile, file_wind_profile, wind_profile]:
+        assert np.array_equal(profile.time.values, pv_profile.time.values)
+    assert np.allclose(file_pv_profile, pv_profile)